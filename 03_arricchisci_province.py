@@ -7,8 +7,9 @@ e calcolare statistiche territoriali con popolazione
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_store import carica_dati_unificati, salva_dati_unificati
 from province_mapping import (
-    get_provincia_from_city,
+    province_da_citta,
     is_citta_metropolitana,
     PROVINCE_POPOLAZIONE,
     REGIONE_POPOLAZIONE,
@@ -28,7 +29,7 @@ def main():
 
     # Carica dati
     print("\n📂 Caricamento dati...")
-    df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+    df = carica_dati_unificati()
     print(f"   Record totali: {len(df):,}")
 
     # Analizza colonna AdmCity
@@ -36,33 +37,34 @@ def main():
     citta_uniche = df['AdmCity'].dropna().unique()
     print(f"   Città uniche nei dati: {len(citta_uniche):,}")
 
-    # Aggiungi colonna Provincia
+    # Aggiungi colonna Provincia (una risoluzione per città distinta)
     print("\n🔄 Mapping città -> provincia...")
-    df['Provincia'] = df['AdmCity'].apply(get_provincia_from_city)
+    file_non_mappate = RESULTS_DIR / 'citta_non_mappate.csv'
+    province = province_da_citta(df['AdmCity'], file_report=file_non_mappate)
+    # Stringhe come negli altri script (niente categorie non osservate nei groupby)
+    df['Provincia'] = province.astype(object)
 
     # Statistiche mapping
     n_mapped = df['Provincia'].notna().sum()
     pct_mapped = n_mapped / len(df) * 100
     print(f"   Record con provincia identificata: {n_mapped:,} ({pct_mapped:.1f}%)")
 
-    # Città non mappate
-    citta_non_mappate = df[df['Provincia'].isna()]['AdmCity'].dropna().unique()
-    print(f"   Città non mappate: {len(citta_non_mappate)}")
+    # Città non mappate (report ordinato per frequenza)
+    freq_non_mappate = pd.read_csv(file_non_mappate)
+    print(f"   Città non mappate: {len(freq_non_mappate)} (salvate in {file_non_mappate.name})")
 
     # Mostra top città non mappate per frequenza
-    if len(citta_non_mappate) > 0:
-        freq_non_mappate = df[df['Provincia'].isna()].groupby('AdmCity').size().sort_values(ascending=False)
+    if len(freq_non_mappate) > 0:
         print("\n   Top 20 città da mappare (per frequenza):")
-        for city, count in freq_non_mappate.head(20).items():
-            if pd.notna(city):
-                print(f"      - {city}: {count} record")
+        for _, row in freq_non_mappate.head(20).iterrows():
+            print(f"      - {row['AdmCity']}: {row['Record']} record")
 
     # Aggiungi flag città metropolitana
-    df['IsCittaMetropolitana'] = df['Provincia'].apply(lambda x: is_citta_metropolitana(x) if pd.notna(x) else False)
+    df['IsCittaMetropolitana'] = df['Provincia'].isin(CITTA_METROPOLITANE)
 
     # Salva dati arricchiti
     print("\n💾 Salvataggio dati arricchiti...")
-    df.to_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv', index=False)
+    salva_dati_unificati(df)
     print(f"   Salvato: dati_unificati_2017_2025.csv")
 
     # ============================================
@@ -11,6 +11,7 @@ Script per analizzare in dettaglio i programmi scolastici e i corsi Bridge:
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_store import carica_dati_unificati
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -29,7 +30,7 @@ def main():
 
     # Carica dati
     print("\n1. Caricamento dati...")
-    df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+    df = carica_dati_unificati()
     print(f"   Record totali: {len(df):,}")
 
     # Separa tipologie
@@ -15,6 +15,7 @@ Il tasso di conversione ottimale dovrebbe essere vicino al 100% dopo 3 anni.
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_store import carica_dati_unificati
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -33,7 +34,7 @@ def main():
 
     # Carica dati
     print("\n1. Caricamento dati...")
-    df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+    df = carica_dati_unificati()
 
     # Corsisti Scuola Bridge
     corsi = df[df['MbtDesc'] == 'Scuola Bridge'].copy()
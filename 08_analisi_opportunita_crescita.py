@@ -14,6 +14,8 @@ Script per identificare segmenti di crescita facili da aggredire:
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_store import carica_dati_unificati
+from carriere_giocatori import carica_carriere, carriere_regolari, TESSERE_REGOLARI
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -54,7 +56,7 @@ def main():
 
     # Carica dati
     print("\n1. Caricamento dati...")
-    df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+    df = carica_dati_unificati()
     print(f"   Record totali: {len(df):,}")
 
     anno_corrente = df['Anno'].max()
@@ -70,21 +72,13 @@ def main():
 
     # Trova chi ha fatto solo 1-2 anni e poi sparito
     # Escludi tessere scuola
-    tessere_regolari = ['Ordinario Sportivo', 'Agonista', 'Ordinario Amatoriale', 'Non Agonista']
-    df_regolari = df[df['MbtDesc'].isin(tessere_regolari)].copy()
-
-    # Storia per persona
-    storia_giocatori = df_regolari.groupby('MmbCode').agg({
-        'Anno': ['min', 'max', 'count', list],
-        'GareGiocate': 'sum',
-        'Associazione': 'first',
-        'GrpArea': 'first',
-        'Anni': 'last',
-        'MmbSex': 'first',
-        'MmbName': 'first'
-    }).reset_index()
-    storia_giocatori.columns = ['MmbCode', 'AnnoInizio', 'AnnoFine', 'AnniTotali', 'AnniLista',
-                                 'GareTotali', 'Associazione', 'Regione', 'Eta', 'Sesso', 'Nome']
+    df_regolari = df[df['MbtDesc'].isin(TESSERE_REGOLARI)].copy()
+
+    # Storia per persona (carriere ristrette alle tessere regolari)
+    storia_giocatori = carriere_regolari(carica_carriere(df)).rename(columns={
+        'AnniPresenza': 'AnniTotali', 'AssociazioneInizio': 'Associazione',
+        'RegioneInizio': 'Regione', 'EtaUltima': 'Eta', 'NomeInizio': 'Nome'
+    })
 
     # Quasi Agganciati: 1-2 anni, spariti da almeno 2 anni, poche gare
     quasi_agganciati = storia_giocatori[
@@ -131,9 +125,9 @@ def main():
     dormienti = tesserati_ultimo_anno[tesserati_ultimo_anno['GareGiocate'] == 0].copy()
 
     # Aggiungi storia
-    storia_dict = storia_giocatori.set_index('MmbCode')[['AnniTotali', 'GareTotali']].to_dict('index')
-    dormienti['AnniTotali'] = dormienti['MmbCode'].map(lambda x: storia_dict.get(x, {}).get('AnniTotali', 1))
-    dormienti['GareStoriche'] = dormienti['MmbCode'].map(lambda x: storia_dict.get(x, {}).get('GareTotali', 0))
+    storia = storia_giocatori.set_index('MmbCode')
+    dormienti['AnniTotali'] = dormienti['MmbCode'].map(storia['AnniTotali']).fillna(1)
+    dormienti['GareStoriche'] = dormienti['MmbCode'].map(storia['GareTotali']).fillna(0)
 
     print(f"\n   Tesserati {anno_corrente}: {len(tesserati_ultimo_anno):,}")
     print(f"   Dormienti (0 gare): {len(dormienti):,} ({100*len(dormienti)/len(tesserati_ultimo_anno):.1f}%)")
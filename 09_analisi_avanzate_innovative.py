@@ -14,6 +14,10 @@ Script per analisi comportamentali e predittive avanzate:
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_store import carica_dati_unificati
+from carriere_giocatori import carica_carriere
+from retention_associazioni import retention_annuale
+from motore_regole import classifica, punteggio
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -24,6 +28,29 @@ OUTPUT_DIR = BASE_DIR / 'output'
 RESULTS_DIR = OUTPUT_DIR / 'results_avanzate'
 RESULTS_DIR.mkdir(exist_ok=True)
 
+# Early warning circoli: punti per fascia (prima fascia soddisfatta), sommati
+PUNTEGGIO_RISCHIO_CIRCOLI = [
+    # Trend negativo forte
+    ([(3, [('TrendPct', '<', -50)]),
+      (2, [('TrendPct', '<', -30)]),
+      (1, [('TrendPct', '<', -10)])], 0),
+    # Pochi tesserati nell'ultimo anno
+    ([(3, [('TessUltimo', '<', 10)]),
+      (2, [('TessUltimo', '<', 20)]),
+      (1, [('TessUltimo', '<', 30)])], 0),
+    # Eta alta (nessun punto se non nota)
+    ([(2, [('EtaMedia', '>', 75)]),
+      (1, [('EtaMedia', '>', 70)])], 0),
+    # Poca attivita
+    ([(2, [('GareMedie', '<', 10)]),
+      (1, [('GareMedie', '<', 20)])], 0),
+]
+LIVELLI_RISCHIO_CIRCOLI = [
+    ('CRITICO', [('RiskScore', '>=', 7)]),
+    ('ALTO', [('RiskScore', '>=', 5)]),
+    ('MEDIO', [('RiskScore', '>=', 3)]),
+]
+
 
 def main():
     print("=" * 70)
@@ -32,11 +59,12 @@ def main():
 
     # Carica dati
     print("\n1. Caricamento dati...")
-    df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+    df = carica_dati_unificati()
     print(f"   Record totali: {len(df):,}")
 
     anno_corrente = df['Anno'].max()
     col_assoc = 'Associazione' if 'Associazione' in df.columns else 'GrpName'
+    carriere = carica_carriere(df)
 
     # =========================================================================
     # 1. CURVA DI APPRENDIMENTO
@@ -47,8 +75,7 @@ def main():
     print("=" * 70)
 
     # Trova primo anno per ogni giocatore
-    primo_anno = df.groupby('MmbCode')['Anno'].min().reset_index()
-    primo_anno.columns = ['MmbCode', 'AnnoPrimoTessera']
+    primo_anno = carriere[['MmbCode', 'AnnoInizio']].rename(columns={'AnnoInizio': 'AnnoPrimoTessera'})
 
     df_curva = df.merge(primo_anno, on='MmbCode')
     df_curva['AnnoCarriera'] = df_curva['Anno'] - df_curva['AnnoPrimoTessera'] + 1
@@ -138,56 +165,11 @@ def main():
     info_circoli = circoli_anno[circoli_anno['Anno'] == anno_corrente][['Circolo', 'Regione', 'EtaMedia', 'GareMedie']]
     df_trend = df_trend.merge(info_circoli, on='Circolo', how='left')
 
-    # Classifica rischio
-    def calcola_rischio(row):
-        score = 0
-        # Trend negativo forte
-        if row['TrendPct'] < -50:
-            score += 3
-        elif row['TrendPct'] < -30:
-            score += 2
-        elif row['TrendPct'] < -10:
-            score += 1
-
-        # Pochi tesserati
-        tess_ultimo = row[f'Tess_{anni_recenti[-1]}']
-        if tess_ultimo < 10:
-            score += 3
-        elif tess_ultimo < 20:
-            score += 2
-        elif tess_ultimo < 30:
-            score += 1
-
-        # Eta alta
-        if pd.notna(row.get('EtaMedia')):
-            if row['EtaMedia'] > 75:
-                score += 2
-            elif row['EtaMedia'] > 70:
-                score += 1
-
-        # Poca attivita
-        if pd.notna(row.get('GareMedie')):
-            if row['GareMedie'] < 10:
-                score += 2
-            elif row['GareMedie'] < 20:
-                score += 1
-
-        return score
-
-    df_trend['RiskScore'] = df_trend.apply(calcola_rischio, axis=1)
-
-    # Classifica
-    def classifica_rischio(score):
-        if score >= 7:
-            return 'CRITICO'
-        elif score >= 5:
-            return 'ALTO'
-        elif score >= 3:
-            return 'MEDIO'
-        else:
-            return 'BASSO'
-
-    df_trend['LivelioRischio'] = df_trend['RiskScore'].apply(classifica_rischio)
+    # Classifica rischio (punti per fascia, poi livello per soglia di punteggio)
+    col_ultimo = f'Tess_{anni_recenti[-1]}'
+    df_trend['RiskScore'] = punteggio(df_trend.rename(columns={col_ultimo: 'TessUltimo'}),
+                                      PUNTEGGIO_RISCHIO_CIRCOLI)
+    df_trend['LivelioRischio'] = classifica(df_trend, LIVELLI_RISCHIO_CIRCOLI, default='BASSO')
 
     # Solo circoli ancora attivi
     circoli_attivi = df_trend[df_trend['Attivo']].copy()
@@ -231,24 +213,16 @@ def main():
     print(f"   Circoli senza corsi: {len(set(df[col_assoc].unique()) - circoli_con_corsi)}")
 
     # Calcola retention per circoli con/senza corsi
-    def calcola_retention_circolo(gruppo):
-        """Calcola retention media del circolo"""
-        anni = sorted(gruppo['Anno'].unique())
-        if len(anni) < 2:
-            return None
-
-        retention_tot = []
-        for i in range(len(anni) - 1):
-            tess_anno1 = set(gruppo[gruppo['Anno'] == anni[i]]['MmbCode'])
-            tess_anno2 = set(gruppo[gruppo['Anno'] == anni[i+1]]['MmbCode'])
-            if len(tess_anno1) > 0:
-                retention = len(tess_anno1 & tess_anno2) / len(tess_anno1) * 100
-                retention_tot.append(retention)
-
-        return np.mean(retention_tot) if retention_tot else None
+    def calcola_retention_circolo(df):
+        """
+        Retention media di ogni circolo tra anni consecutivi di attività
+        (circoli con almeno 2 anni), in una sola passata su tutti i circoli
+        """
+        retention = retention_annuale(df, col_assoc, passo='consecutivo')
+        return retention.groupby(col_assoc)['TassoRetention'].mean()
 
     # Calcola per ogni circolo
-    retention_per_circolo = df.groupby(col_assoc).apply(calcola_retention_circolo).reset_index()
+    retention_per_circolo = calcola_retention_circolo(df).reset_index()
     retention_per_circolo.columns = ['Circolo', 'RetentionMedia']
     retention_per_circolo = retention_per_circolo.dropna()
 
@@ -295,13 +269,9 @@ def main():
     print("=" * 70)
 
     # Trova giocatori che hanno cambiato circolo
-    circoli_per_giocatore = df.groupby('MmbCode').agg({
-        col_assoc: lambda x: list(x.unique()),
-        'Anno': ['min', 'max', 'count']
-    }).reset_index()
-    circoli_per_giocatore.columns = ['MmbCode', 'Circoli', 'AnnoInizio', 'AnnoFine', 'AnniPresenza']
-
-    circoli_per_giocatore['NumCircoli'] = circoli_per_giocatore['Circoli'].apply(len)
+    # Circoli: id dei circoli frequentati, in ordine di prima frequenza
+    circoli_per_giocatore = carriere[['MmbCode', 'Circoli', 'AnnoInizio', 'AnnoFine',
+                                      'AnniPresenza', 'NumCircoli']]
 
     # Distribuzione
     print("\n   Distribuzione numero circoli frequentati:")
@@ -316,13 +286,11 @@ def main():
 
     # Profilo migranti vs fedeli
     # Aggiungi info dal df principale
-    info_giocatori = df.groupby('MmbCode').agg({
-        'Anni': 'last',
-        'GareGiocate': 'mean',
-        'PuntiTotali': 'mean',
-        'CatLabel': 'last',
-        'MmbSex': 'first'
-    }).reset_index()
+    info_giocatori = carriere[['MmbCode', 'EtaUltima', 'GareMedie', 'PuntiTotMedi',
+                               'CatLabelFine', 'Sesso']].rename(columns={
+        'EtaUltima': 'Anni', 'GareMedie': 'GareGiocate', 'PuntiTotMedi': 'PuntiTotali',
+        'CatLabelFine': 'CatLabel', 'Sesso': 'MmbSex'
+    })
 
     migranti_info = migranti.merge(info_giocatori, on='MmbCode')
     fedeli_info = fedeli.merge(info_giocatori, on='MmbCode')
@@ -351,9 +319,11 @@ def main():
 
     # Circoli che "perdono" vs "guadagnano" giocatori
     # Per ogni giocatore migrante, trova primo e ultimo circolo
+    nomi_circoli = carriere.attrs['circoli']
+
     def get_migration_flow(row):
         if len(row['Circoli']) >= 2:
-            return {'from': row['Circoli'][0], 'to': row['Circoli'][-1]}
+            return {'from': nomi_circoli[row['Circoli'][0]], 'to': nomi_circoli[row['Circoli'][-1]]}
         return None
 
     # Nota: questo e' semplificato, in realta' dovremmo tracciare per anno
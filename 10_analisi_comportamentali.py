@@ -11,6 +11,9 @@ ANALISI COMPORTAMENTALI E TERRITORIALI
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from data_store import carica_dati_unificati
+from carriere_giocatori import carica_carriere
+from motore_regole import classifica
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -21,6 +24,20 @@ OUTPUT_DIR = BASE_DIR / 'output'
 RESULTS_DIR = OUTPUT_DIR / 'results_comportamentali'
 RESULTS_DIR.mkdir(exist_ok=True)
 
+# Cluster comportamentali: vince la prima regola soddisfatta (ordine = priorità)
+REGOLE_CLUSTER = [
+    # Dormiente: quasi zero gare
+    ('Dormiente', [('GareMedie', '<', 1)]),
+    ('Super Agonista', [('GareMedie', '>=', 80), ('CampMedi', '>=', 5000)]),
+    # Nuovo Entusiasta: pochi anni ma molte gare
+    ('Nuovo Entusiasta', [('AnniPresenza', '<=', 2), ('GareMedie', '>=', 40)]),
+    ('Agonista Attivo', [('GareMedie', '>=', 50), ('CampMedi', '>=', 2000)]),
+    ('Regolare Fedele', [('GareMedie', '>=', 30), ('AnniPresenza', '>=', 4)]),
+    ('Sociale', [('GareMedie', '>=', 10), ('GareMedie', '<', 30)]),
+    ('Occasionale', [('GareMedie', '<', 10)]),
+]
+CLUSTER_DEFAULT = 'Regolare'
+
 
 def main():
     print("=" * 70)
@@ -29,11 +46,12 @@ def main():
 
     # Carica dati
     print("\n1. Caricamento dati...")
-    df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+    df = carica_dati_unificati()
     print(f"   Record totali: {len(df):,}")
 
     anno_corrente = df['Anno'].max()
     col_assoc = 'Associazione' if 'Associazione' in df.columns else 'GrpName'
+    carriere = carica_carriere(df)
 
     # =========================================================================
     # 1. CLUSTER COMPORTAMENTALI
@@ -44,17 +62,10 @@ def main():
     print("=" * 70)
 
     # Calcola metriche per giocatore
-    giocatori = df.groupby('MmbCode').agg({
-        'Anno': ['min', 'max', 'count'],
-        'GareGiocate': ['mean', 'sum', 'std'],
-        'PuntiCampionati': ['mean', 'sum'],
-        'PuntiTotali': ['mean', 'sum'],
-        'Anni': 'last',
-        'MmbSex': 'first',
-        'CatLabel': 'last',
-        col_assoc: 'nunique',
-        'IsAgonista': 'max'
-    }).reset_index()
+    giocatori = carriere[['MmbCode', 'AnnoInizio', 'AnnoFine', 'AnniPresenza',
+                          'GareMedie', 'GareTotali', 'GareStd',
+                          'PuntiCampMedi', 'PuntiCampTot', 'PuntiTotMedi', 'PuntiTotTot',
+                          'EtaUltima', 'Sesso', 'CatLabelFine', 'NumCircoli', 'EraAgonista']].copy()
 
     giocatori.columns = ['MmbCode', 'AnnoInizio', 'AnnoFine', 'AnniPresenza',
                          'GareMedie', 'GareTotali', 'GareStd',
@@ -66,83 +77,8 @@ def main():
     giocatori['Costanza'] = 1 - (giocatori['GareStd'] / (giocatori['GareMedie'] + 1))
     giocatori['Costanza'] = giocatori['Costanza'].clip(0, 1)
 
-    # Definisci cluster basati su regole
-    def assegna_cluster(row):
-        gare = row['GareMedie']
-        anni = row['AnniPresenza']
-        camp = row['CampMedi']
-        agonista = row['IsAgonista']
-
-        # Super Agonista: molte gare, molti campionati, agonista
-        if gare >= 80 and camp >= 5000 and agonista:
-            return 'Super Agonista'
-
-        # Agonista Attivo: buone gare, partecipa a campionati
-        if gare >= 50 and camp >= 2000:
-            return 'Agonista Attivo'
-
-        # Regolare Fedele: gare medie, presente da anni
-        if gare >= 30 and anni >= 4:
-            return 'Regolare Fedele'
-
-        # Sociale: poche gare ma presente
-        if gare >= 10 and gare < 30:
-            return 'Sociale'
-
-        # Occasionale: pochissime gare
-        if gare >= 1 and gare < 10:
-            return 'Occasionale'
-
-        # Dormiente: quasi zero gare
-        if gare < 1:
-            return 'Dormiente'
-
-        # Nuovo Entusiasta: pochi anni ma molte gare
-        if anni <= 2 and gare >= 40:
-            return 'Nuovo Entusiasta'
-
-        return 'Altro'
-
-    giocatori['Cluster'] = giocatori.apply(assegna_cluster, axis=1)
-
-    # Ricalcola cluster con priorità corretta
-    def assegna_cluster_v2(row):
-        gare = row['GareMedie']
-        anni = row['AnniPresenza']
-        camp = row['CampMedi']
-        agonista = row['IsAgonista']
-
-        # Dormiente: quasi zero gare
-        if gare < 1:
-            return 'Dormiente'
-
-        # Super Agonista
-        if gare >= 80 and camp >= 5000:
-            return 'Super Agonista'
-
-        # Nuovo Entusiasta: pochi anni ma molte gare
-        if anni <= 2 and gare >= 40:
-            return 'Nuovo Entusiasta'
-
-        # Agonista Attivo
-        if gare >= 50 and camp >= 2000:
-            return 'Agonista Attivo'
-
-        # Regolare Fedele
-        if gare >= 30 and anni >= 4:
-            return 'Regolare Fedele'
-
-        # Sociale
-        if gare >= 10 and gare < 30:
-            return 'Sociale'
-
-        # Occasionale
-        if gare < 10:
-            return 'Occasionale'
-
-        return 'Regolare'
-
-    giocatori['Cluster'] = giocatori.apply(assegna_cluster_v2, axis=1)
+    # Cluster: prima regola soddisfatta di REGOLE_CLUSTER
+    giocatori['Cluster'] = classifica(giocatori, REGOLE_CLUSTER, default=CLUSTER_DEFAULT)
 
     # Statistiche cluster
     cluster_stats = giocatori.groupby('Cluster').agg({
@@ -260,13 +196,7 @@ def main():
     print("\n   ANALISI CAMBIO CIRCOLO NELLA STESSA PROVINCIA:")
 
     # Trova giocatori che hanno cambiato circolo
-    giocatori_circoli = df.groupby('MmbCode').agg({
-        col_assoc: list,
-        'Provincia': list
-    }).reset_index()
-
-    giocatori_circoli['NumCircoli'] = giocatori_circoli[col_assoc].apply(lambda x: len(set(x)))
-    giocatori_circoli['NumProvince'] = giocatori_circoli['Provincia'].apply(lambda x: len(set([p for p in x if pd.notna(p)])))
+    giocatori_circoli = carriere[['MmbCode', 'NumCircoli', 'NumProvince']]
 
     # Chi ha cambiato circolo ma restando nella stessa provincia
     cambio_stesso_posto = giocatori_circoli[(giocatori_circoli['NumCircoli'] > 1) & (giocatori_circoli['NumProvince'] == 1)]
@@ -2,104 +2,144 @@
 """
 Script per l'unificazione dei dati di tesseramento FIGB 2017-2025
 Combina i dati storici con i nuovi dati 2025
+
+Ingestione incrementale: ogni foglio sorgente ha un'impronta (hash + mtime)
+e viene riletto da Excel solo se cambiato; gli altri anni arrivano dalle
+partizioni in output/partizioni. Usa --completo per ricostruire tutto.
+I fogli da rileggere sono letti in parallelo e in streaming (excel_reader).
 """
 
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
 # Percorsi
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import (
+    salva_dati_unificati, FILE_UNIFICATO_CSV, FILE_UNIFICATO_FEATHER, PYARROW_AVAILABLE,
+    carica_manifest, salva_manifest, impronte_fogli, chiave_foglio,
+    partizione_valida, registra_partizione, leggi_partizione
+)
+from excel_reader import leggi_fogli_parallelo, stampa_tempi
 DATA_DIR = BASE_DIR
 OUTPUT_DIR = BASE_DIR / 'output'
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-print("=" * 80)
-print("UNIFICAZIONE DATI TESSERAMENTO FIGB 2017-2025")
-print("=" * 80)
-
-# Caricamento dati storici 2017-2024
-print("\n1. Caricamento dati storici (2017-2024)...")
 excel_storico = DATA_DIR / 'Dati dal 17.xlsx'
-xls = pd.ExcelFile(excel_storico)
-
-dfs = {}
-for year in range(2017, 2025):
-    sheet_name = str(year)
-    df = pd.read_excel(excel_storico, sheet_name=sheet_name)
-    df['Anno'] = year
-    dfs[year] = df
-    print(f"   Anno {year}: {len(df):,} tesserati")
-
-# Caricamento dati 2025
-print("\n2. Caricamento dati 2025...")
 excel_2025 = DATA_DIR / '2025 Dopo Natale.xlsx'
-df_2025 = pd.read_excel(excel_2025, sheet_name='Foglio1')
-df_2025['Anno'] = 2025
-dfs[2025] = df_2025
-print(f"   Anno 2025: {len(df_2025):,} tesserati")
-
-# Unione di tutti i dataframe
-print("\n3. Unificazione dataset...")
-df_all = pd.concat(dfs.values(), ignore_index=True)
-print(f"   Totale record: {len(df_all):,}")
-print(f"   Giocatori unici: {df_all['MmbCode'].nunique():,}")
-
-# Creazione fasce d'età
-print("\n4. Creazione variabili derivate...")
-df_all['FasciaEta'] = pd.cut(df_all['Anni'],
-                             bins=[0, 18, 30, 40, 50, 60, 70, 80, 90, 120],
-                             labels=['<18', '18-30', '30-40', '40-50', '50-60', '60-70', '70-80', '80-90', '90+'])
-
-# Creazione fasce di punti
-df_all['FasciaPunti'] = pd.cut(df_all['PuntiTotali'],
-                               bins=[-1, 0, 500, 2000, 5000, 10000, 20000, 50000, 500000],
-                               labels=['0', '1-500', '501-2000', '2001-5000', '5001-10000',
-                                      '10001-20000', '20001-50000', '50000+'])
-
-# Identificazione tipologia tesserato
-df_all['IsScuolaBridge'] = df_all['MbtDesc'].str.contains('Scuola Bridge', case=False, na=False)
-df_all['IsAgonista'] = df_all['MbtDesc'].str.contains('Agonista', case=False, na=False)
-
-# Statistiche riepilogative
-print("\n5. Statistiche riepilogative per anno:")
-print("-" * 60)
-yearly_stats = df_all.groupby('Anno').agg({
-    'MmbCode': 'count',
-    'GareGiocate': 'sum',
-    'Anni': 'mean'
-}).round(1)
-yearly_stats.columns = ['Tesserati', 'Gare Totali', 'Età Media']
-print(yearly_stats)
-
-# Variazione anno su anno
-print("\n6. Variazioni anno su anno:")
-print("-" * 60)
-for i, year in enumerate(range(2018, 2026)):
-    prev = yearly_stats.loc[year-1, 'Tesserati']
-    curr = yearly_stats.loc[year, 'Tesserati']
-    var = ((curr - prev) / prev) * 100
-    emoji = "📈" if var > 0 else "📉"
-    print(f"   {year-1} → {year}: {var:+.1f}% {emoji} ({int(curr - prev):+,})")
-
-# Salvataggio
-output_file = OUTPUT_DIR / 'dati_unificati_2017_2025.csv'
-df_all.to_csv(output_file, index=False)
-print(f"\n✓ Dataset unificato salvato in: {output_file}")
-
-# Nota: Parquet rimosso per problemi di tipi misti nelle colonne
-
-# Statistiche finali
-print("\n" + "=" * 80)
-print("RIEPILOGO FINALE")
-print("=" * 80)
-print(f"Periodo: 2017-2025 ({len(dfs)} anni)")
-print(f"Totale tesseramenti: {len(df_all):,}")
-print(f"Giocatori unici: {df_all['MmbCode'].nunique():,}")
-print(f"Circoli unici: {df_all['MmbGroup'].nunique():,}")
-print(f"Regioni: {df_all['GrpArea'].nunique()}")
-print(f"Età media: {df_all['Anni'].mean():.1f} anni")
-print(f"Tesserati Scuola Bridge: {df_all['IsScuolaBridge'].sum():,}")
-print("=" * 80)
+
+# (anno, file sorgente, foglio)
+FONTI = [(year, excel_storico, str(year)) for year in range(2017, 2025)]
+FONTI.append((2025, excel_2025, 'Foglio1'))
+
+
+def main():
+    print("=" * 80)
+    print("UNIFICAZIONE DATI TESSERAMENTO FIGB 2017-2025")
+    print("=" * 80)
+
+    # Modalità: incrementale (default) o ricostruzione completa con --completo
+    ricostruzione_completa = '--completo' in sys.argv
+
+    # Impronte dei fogli sorgente (hash + mtime)
+    print("\n1. Verifica impronte fogli sorgente...")
+    manifest = carica_manifest()
+    impronte = {}
+    for file_excel in dict.fromkeys(f for _, f, _ in FONTI):
+        fogli = [foglio for _, f, foglio in FONTI if f == file_excel]
+        for foglio, impronta in impronte_fogli(file_excel, fogli, manifest).items():
+            impronte[chiave_foglio(file_excel, foglio)] = impronta
+
+    da_rileggere = []
+    for year, file_excel, foglio in FONTI:
+        chiave = chiave_foglio(file_excel, foglio)
+        if ricostruzione_completa or not partizione_valida(year, chiave, impronte[chiave], manifest):
+            da_rileggere.append((file_excel, foglio, year))
+    print(f"   Fogli da rileggere: {len(da_rileggere)} su {len(FONTI)}")
+
+    # Lettura parallela in streaming dei soli fogli cambiati
+    print("\n2. Lettura fogli Excel (parallela, read-only)...")
+    tempi, dati_in_memoria = leggi_fogli_parallelo(da_rileggere)
+    stampa_tempi(tempi)
+    for file_excel, foglio, year in da_rileggere:
+        chiave = chiave_foglio(file_excel, foglio)
+        registra_partizione(year, chiave, impronte[chiave], manifest)
+    salva_manifest(manifest)
+
+    riletti = {year for _, _, year in da_rileggere}
+    dfs = {}
+    for year, file_excel, foglio in FONTI:
+        df = dati_in_memoria[year] if year in dati_in_memoria else leggi_partizione(year)
+        dfs[year] = df
+        origine = f"letto da {file_excel.name}" if year in riletti else "partizione in cache"
+        print(f"   Anno {year}: {len(df):,} tesserati ({origine})")
+
+    # Unione di tutti i dataframe
+    print("\n3. Unificazione dataset...")
+    df_all = pd.concat(dfs.values(), ignore_index=True)
+    print(f"   Totale record: {len(df_all):,}")
+    print(f"   Giocatori unici: {df_all['MmbCode'].nunique():,}")
+
+    # Creazione fasce d'età
+    print("\n4. Creazione variabili derivate...")
+    df_all['FasciaEta'] = pd.cut(df_all['Anni'],
+                                 bins=[0, 18, 30, 40, 50, 60, 70, 80, 90, 120],
+                                 labels=['<18', '18-30', '30-40', '40-50', '50-60', '60-70', '70-80', '80-90', '90+'])
+
+    # Creazione fasce di punti
+    df_all['FasciaPunti'] = pd.cut(df_all['PuntiTotali'],
+                                   bins=[-1, 0, 500, 2000, 5000, 10000, 20000, 50000, 500000],
+                                   labels=['0', '1-500', '501-2000', '2001-5000', '5001-10000',
+                                          '10001-20000', '20001-50000', '50000+'])
+
+    # Identificazione tipologia tesserato
+    df_all['IsScuolaBridge'] = df_all['MbtDesc'].str.contains('Scuola Bridge', case=False, na=False)
+    df_all['IsAgonista'] = df_all['MbtDesc'].str.contains('Agonista', case=False, na=False)
+
+    # Statistiche riepilogative
+    print("\n5. Statistiche riepilogative per anno:")
+    print("-" * 60)
+    yearly_stats = df_all.groupby('Anno').agg({
+        'MmbCode': 'count',
+        'GareGiocate': 'sum',
+        'Anni': 'mean'
+    }).round(1)
+    yearly_stats.columns = ['Tesserati', 'Gare Totali', 'Età Media']
+    print(yearly_stats)
+
+    # Variazione anno su anno
+    print("\n6. Variazioni anno su anno:")
+    print("-" * 60)
+    for i, year in enumerate(range(2018, 2026)):
+        prev = yearly_stats.loc[year-1, 'Tesserati']
+        curr = yearly_stats.loc[year, 'Tesserati']
+        var = ((curr - prev) / prev) * 100
+        emoji = "📈" if var > 0 else "📉"
+        print(f"   {year-1} → {year}: {var:+.1f}% {emoji} ({int(curr - prev):+,})")
+
+    # Salvataggio (CSV + archivio colonnare con schema normalizzato)
+    salva_dati_unificati(df_all)
+    print(f"\n✓ Dataset unificato salvato in: {FILE_UNIFICATO_CSV}")
+    if PYARROW_AVAILABLE:
+        print(f"✓ Archivio colonnare salvato in: {FILE_UNIFICATO_FEATHER}")
+
+    # Statistiche finali
+    print("\n" + "=" * 80)
+    print("RIEPILOGO FINALE")
+    print("=" * 80)
+    print(f"Periodo: 2017-2025 ({len(dfs)} anni)")
+    print(f"Totale tesseramenti: {len(df_all):,}")
+    print(f"Giocatori unici: {df_all['MmbCode'].nunique():,}")
+    print(f"Circoli unici: {df_all['MmbGroup'].nunique():,}")
+    print(f"Regioni: {df_all['GrpArea'].nunique()}")
+    print(f"Età media: {df_all['Anni'].mean():.1f} anni")
+    print(f"Tesserati Scuola Bridge: {df_all['IsScuolaBridge'].sum():,}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
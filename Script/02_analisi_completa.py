@@ -8,11 +8,12 @@ import pandas as pd
 import numpy as np
 import json
 from config import (
-    OUTPUT_DIR, RESULTS_DIR, FILE_UNIFICATO_CSV,
+    OUTPUT_DIR, RESULTS_DIR,
     FASCE_ETA_BINS, FASCE_ETA_LABELS,
     FASCE_PUNTI_BINS, FASCE_PUNTI_LABELS,
     ANNI_ANALISI
 )
+from data_store import carica_dati_unificati
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -22,7 +23,7 @@ print("=" * 80)
 
 # Caricamento dati
 print("\nCaricamento dati unificati...")
-df = pd.read_csv(FILE_UNIFICATO_CSV)
+df = carica_dati_unificati()
 print(f"Record totali: {len(df):,}")
 
 # Creazione fasce
@@ -9,9 +9,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+import sys
 from datetime import datetime
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 import warnings
 warnings.filterwarnings('ignore')
@@ -24,6 +23,12 @@ plt.rcParams['axes.titlesize'] = 14
 
 # Directory
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
+from carriere_giocatori import carica_carriere, CATEGORIA_ORDINE
+from cluster_churn import clusterizza, sweep_k, FEATURES_CHURN, N_CLUSTER
+from motore_regole import classifica
+from transizioni_categorie import tensore_transizioni, matrice
 OUTPUT_DIR = BASE_DIR / 'output'
 CHARTS_DIR = OUTPUT_DIR / 'charts_churn'
 RESULTS_DIR = OUTPUT_DIR / 'results_churn'
@@ -44,21 +49,11 @@ print("=" * 100)
 # ============================================================================
 print("\n[1/8] Caricamento dati...")
 
-df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+df = carica_dati_unificati()
 print(f"   Record totali: {len(df):,}")
 print(f"   Giocatori unici: {df['MmbCode'].nunique():,}")
 
-# Mapping categorie con ordine gerarchico dettagliato
-CATEGORIA_ORDER = {
-    'NC': 0,
-    '4F': 1, '4Q': 2, '4C': 3, '4P': 4,
-    '3F': 5, '3Q': 6, '3C': 7, '3P': 8,
-    '2F': 9, '2Q': 10, '2C': 11, '2P': 12,
-    '1F': 13, '1Q': 14, '1C': 15, '1P': 16,
-    'HJ': 17, 'HQ': 18, 'HK': 19, 'HA': 20,
-    'MS': 21, 'LM': 22, 'GM': 23
-}
-
+# Nomi estesi delle categorie (ordine gerarchico: CATEGORIA_ORDINE in carriere_giocatori)
 CATEGORIA_NOME = {
     'NC': 'Non Classificato',
     '4F': 'Quarta Fiori', '4Q': 'Quarta Quadri', '4C': 'Quarta Cuori', '4P': 'Quarta Picche',
@@ -93,7 +88,7 @@ MACROREGIONI = {
     'FIB': 'Nazionale'  # Federazione Italiana Bridge
 }
 
-df['CatOrder'] = df['CatLabel'].map(CATEGORIA_ORDER)
+df['CatOrder'] = df['CatLabel'].map(CATEGORIA_ORDINE)
 df['CatNome'] = df['CatLabel'].map(CATEGORIA_NOME)
 df['LivelliMacro'] = df['CatLabel'].map(LIVELLO_MACRO)
 df['Macroregione'] = df['GrpArea'].map(MACROREGIONI).fillna('Altro')
@@ -104,27 +99,11 @@ df['Macroregione'] = df['GrpArea'].map(MACROREGIONI).fillna('Altro')
 print("\n[2/8] Identificazione giocatori che hanno abbandonato...")
 
 # Per ogni giocatore, trova primo e ultimo anno di presenza
-giocatori_storia = df.groupby('MmbCode').agg({
-    'Anno': ['min', 'max', 'count'],
-    'Anni': 'last',
-    'MmbSex': 'last',
-    'GareGiocate': ['mean', 'sum', 'std'],
-    'PuntiCampionati': ['mean', 'sum'],
-    'PuntiTotali': ['mean', 'sum'],
-    'CatOrder': ['first', 'last', 'max'],
-    'CatLabel': ['first', 'last'],
-    'IsScuolaBridge': 'any',
-    'IsAgonista': 'any',
-    'GrpArea': 'last',
-    'GrpName': 'last',
-    'MbtDesc': 'last'
-}).reset_index()
-
-giocatori_storia.columns = ['MmbCode', 'AnnoInizio', 'AnnoFine', 'AnniPresenza',
-                            'EtaUltima', 'Sesso', 'GareMedie', 'GareTotali', 'GareStd',
-                            'PuntiCampMedi', 'PuntiCampTot', 'PuntiTotMedi', 'PuntiTotTot',
-                            'CatInizio', 'CatFine', 'CatMax', 'CatLabelInizio', 'CatLabelFine',
-                            'EraScuolaBridge', 'EraAgonista', 'Regione', 'Circolo', 'TipoTessera']
+giocatori_storia = carica_carriere(df)[['MmbCode', 'AnnoInizio', 'AnnoFine', 'AnniPresenza',
+                                       'EtaUltima', 'Sesso', 'GareMedie', 'GareTotali', 'GareStd',
+                                       'PuntiCampMedi', 'PuntiCampTot', 'PuntiTotMedi', 'PuntiTotTot',
+                                       'CatInizio', 'CatFine', 'CatMax', 'CatLabelInizio', 'CatLabelFine',
+                                       'EraScuolaBridge', 'EraAgonista', 'Regione', 'Circolo', 'TipoTessera']].copy()
 
 # Calcola metriche derivate
 giocatori_storia['Churned'] = giocatori_storia['AnnoFine'] < 2025
@@ -149,57 +128,50 @@ print(f"   Giocatori attivi 2025: {len(attivi):,} ({len(attivi)/len(giocatori_st
 print("\n[3/8] Clustering dei giocatori churned...")
 
 # Prepara features per clustering
-features_cluster = ['AnniPresenza', 'GareMedie', 'PuntiTotMedi', 'RatioChamp',
-                   'Progressione', 'EtaUltima', 'AnniDaChurn']
+features_cluster = FEATURES_CHURN
 
 # Rimuovi NaN
 churned_clean = churned.dropna(subset=features_cluster)
-X = churned_clean[features_cluster].values
 
-# Standardizza
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+# Standardizzazione + K-Means con modello in cache (--rifai-cluster forza il riadattamento)
+n_clusters = N_CLUSTER
+etichette, X_scaled, info_cluster = clusterizza(churned_clean, features_cluster, n_clusters,
+                                                forza='--rifai-cluster' in sys.argv)
+churned_clean['Cluster'] = etichette
+print(f"   Modello {info_cluster['metodo']}: {info_cluster['esito']}"
+      f" ({info_cluster['nuovi']:,} giocatori non presenti all'ultimo adattamento)")
 
-# K-Means clustering
-n_clusters = 5
-kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-churned_clean['Cluster'] = kmeans.fit_predict(X_scaled)
+if '--sweep-k' in sys.argv:
+    sweep = sweep_k(X_scaled)
+    sweep.to_csv(RESULTS_DIR / 'cluster_churn_sweep_k.csv', index=False)
+    print("\n   Confronto k (inerzia / silhouette):")
+    print(sweep.round(3).to_string(index=False))
 
 # Analisi clusters
-cluster_profiles = []
-for i in range(n_clusters):
-    cluster_data = churned_clean[churned_clean['Cluster'] == i]
-    profile = {
-        'Cluster': i,
-        'Numerosita': len(cluster_data),
-        'Percentuale': len(cluster_data) / len(churned_clean) * 100,
-        'AnniPresenzaMedi': cluster_data['AnniPresenza'].mean(),
-        'GareMedie': cluster_data['GareMedie'].mean(),
-        'EtaMedia': cluster_data['EtaUltima'].mean(),
-        'AnniDaChurn': cluster_data['AnniDaChurn'].mean(),
-        'RatioChamp': cluster_data['RatioChamp'].mean(),
-        'Progressione': cluster_data['Progressione'].mean(),
-        'PctScuolaBridge': cluster_data['EraScuolaBridge'].mean() * 100,
-        'PctAgonisti': cluster_data['EraAgonista'].mean() * 100
-    }
-    cluster_profiles.append(profile)
-
-cluster_df = pd.DataFrame(cluster_profiles)
-
-# Assegna nomi descrittivi ai cluster
-def nome_cluster(row):
-    if row['EtaMedia'] > 82 and row['AnniDaChurn'] > 3:
-        return "Anziani (prob. decesso/infermita)"
-    elif row['AnniPresenzaMedi'] < 2 and row['GareMedie'] < 10:
-        return "Abbandono precoce (mai ingaggiati)"
-    elif row['GareMedie'] > 30 and row['AnniPresenzaMedi'] > 3:
-        return "Giocatori attivi persi (recuperabili)"
-    elif row['PctScuolaBridge'] > 50:
-        return "Ex Scuola Bridge (non convertiti)"
-    else:
-        return "Giocatori occasionali"
-
-cluster_df['NomeCluster'] = cluster_df.apply(nome_cluster, axis=1)
+cluster_df = churned_clean.groupby('Cluster').agg(
+    Numerosita=('MmbCode', 'size'),
+    AnniPresenzaMedi=('AnniPresenza', 'mean'),
+    GareMedie=('GareMedie', 'mean'),
+    EtaMedia=('EtaUltima', 'mean'),
+    AnniDaChurn=('AnniDaChurn', 'mean'),
+    RatioChamp=('RatioChamp', 'mean'),
+    Progressione=('Progressione', 'mean'),
+    PctScuolaBridge=('EraScuolaBridge', 'mean'),
+    PctAgonisti=('EraAgonista', 'mean'),
+).reindex(range(n_clusters))
+cluster_df['Numerosita'] = cluster_df['Numerosita'].fillna(0).astype(int)
+cluster_df.insert(1, 'Percentuale', cluster_df['Numerosita'] / len(churned_clean) * 100)
+cluster_df[['PctScuolaBridge', 'PctAgonisti']] *= 100
+cluster_df = cluster_df.rename_axis('Cluster').reset_index()
+
+# Assegna nomi descrittivi ai cluster (prima regola soddisfatta)
+REGOLE_NOME_CLUSTER = [
+    ("Anziani (prob. decesso/infermita)", [('EtaMedia', '>', 82), ('AnniDaChurn', '>', 3)]),
+    ("Abbandono precoce (mai ingaggiati)", [('AnniPresenzaMedi', '<', 2), ('GareMedie', '<', 10)]),
+    ("Giocatori attivi persi (recuperabili)", [('GareMedie', '>', 30), ('AnniPresenzaMedi', '>', 3)]),
+    ("Ex Scuola Bridge (non convertiti)", [('PctScuolaBridge', '>', 50)]),
+]
+cluster_df['NomeCluster'] = classifica(cluster_df, REGOLE_NOME_CLUSTER, default="Giocatori occasionali")
 cluster_df = cluster_df.sort_values('Numerosita', ascending=False)
 
 print("\nPROFILI CLUSTER CHURN:")
@@ -256,11 +228,11 @@ ax3.legend(loc='upper right')
 # Recuperabilita
 ax4 = axes[1, 1]
 # Stima recuperabilita per cluster
-cluster_df['Recuperabilita'] = cluster_df.apply(
-    lambda r: 'Alta' if r['NomeCluster'] == 'Giocatori attivi persi (recuperabili)' else
-              'Media' if r['NomeCluster'] in ['Giocatori occasionali', 'Ex Scuola Bridge (non convertiti)'] else
-              'Bassa', axis=1
-)
+cluster_df['Recuperabilita'] = cluster_df['NomeCluster'].map({
+    'Giocatori attivi persi (recuperabili)': 'Alta',
+    'Giocatori occasionali': 'Media',
+    'Ex Scuola Bridge (non convertiti)': 'Media',
+}).fillna('Bassa')
 recup_counts = cluster_df.groupby('Recuperabilita')['Numerosita'].sum()
 colors_recup = {'Alta': '#28A745', 'Media': '#FFC107', 'Bassa': '#DC3545'}
 ax4.pie(recup_counts.values, labels=recup_counts.index, autopct='%1.1f%%',
@@ -406,7 +378,7 @@ camp_per_cat = df.groupby('CatLabel').agg({
 
 camp_per_cat.columns = ['Categoria', 'GareMedie', 'PuntiCampMedi', 'PuntiTotMedi', 'Giocatori']
 camp_per_cat['RatioCamp'] = camp_per_cat['PuntiCampMedi'] / (camp_per_cat['PuntiTotMedi'] + 1)
-camp_per_cat['CatOrder'] = camp_per_cat['Categoria'].map(CATEGORIA_ORDER)
+camp_per_cat['CatOrder'] = camp_per_cat['Categoria'].map(CATEGORIA_ORDINE)
 camp_per_cat['CatNome'] = camp_per_cat['Categoria'].map(CATEGORIA_NOME)
 camp_per_cat['Livello'] = camp_per_cat['Categoria'].map(LIVELLO_MACRO)
 camp_per_cat = camp_per_cat.sort_values('CatOrder')
@@ -472,25 +444,13 @@ plt.close()
 # Analisi transizioni tra sottocategorie
 print("\n   Analisi transizioni sottocategorie...")
 
-transizioni_sub = []
-for anno in range(2018, 2026):
-    df_prev = df[df['Anno'] == anno - 1][['MmbCode', 'CatLabel']].rename(columns={'CatLabel': 'CatPrev'})
-    df_curr = df[df['Anno'] == anno][['MmbCode', 'CatLabel']].rename(columns={'CatLabel': 'CatCurr'})
-    merged = df_prev.merge(df_curr, on='MmbCode')
-    for _, row in merged.iterrows():
-        transizioni_sub.append({
-            'Anno': anno,
-            'Da': row['CatPrev'],
-            'A': row['CatCurr']
-        })
-
-trans_df = pd.DataFrame(transizioni_sub)
-trans_matrix = pd.crosstab(trans_df['Da'], trans_df['A'], normalize='index') * 100
+tensore_sub = tensore_transizioni(df, 'CatLabel', anni=range(2017, 2025))
+trans_matrix = matrice(tensore_sub, normalizza=True, solo_osservate=True) * 100
 
 # Heatmap transizioni sottocategorie
 fig, ax = plt.subplots(figsize=(16, 14))
 # Ordina righe e colonne
-ordered_cats = sorted(trans_matrix.index, key=lambda x: CATEGORIA_ORDER.get(x, 99))
+ordered_cats = sorted(trans_matrix.index, key=lambda x: CATEGORIA_ORDINE.get(x, 99))
 trans_matrix = trans_matrix.reindex(index=ordered_cats, columns=ordered_cats, fill_value=0)
 
 sns.heatmap(trans_matrix, annot=True, fmt='.1f', cmap='YlOrRd', ax=ax,
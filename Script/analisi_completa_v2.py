@@ -12,6 +12,7 @@ import matplotlib.patches as mpatches
 from matplotlib.gridspec import GridSpec
 import seaborn as sns
 from pathlib import Path
+import sys
 from datetime import datetime
 import json
 import warnings
@@ -26,6 +27,10 @@ plt.rcParams['axes.labelsize'] = 12
 
 # Directory
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
+from retention_associazioni import presente_anno_successivo
+from transizioni_categorie import tensore_transizioni, matrice, transizione_anni
 DATA_DIR = BASE_DIR / 'Dati'
 OUTPUT_DIR = BASE_DIR / 'output'
 CHARTS_DIR = OUTPUT_DIR / 'charts_v2'
@@ -59,7 +64,7 @@ print("=" * 100)
 # ============================================================================
 print("\n[1/10] Caricamento dati...")
 
-df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+df = carica_dati_unificati()
 print(f"   Record totali: {len(df):,}")
 print(f"   Giocatori unici: {df['MmbCode'].nunique():,}")
 print(f"   Anni: {df['Anno'].min()}-{df['Anno'].max()}")
@@ -134,20 +139,16 @@ livello_dist['%'] = (livello_dist['Tesserati'] / livello_dist['Tesserati'].sum()
 
 # Analisi progressione categorie (chi sale di categoria anno dopo anno)
 print("   Analisi progressione categorie...")
+tensore_ordine = tensore_transizioni(df, 'CatOrdine', anni=range(2017, 2025))
 progressione_data = []
 
 for anno in range(2017, 2025):
-    df_anno = df[df['Anno'] == anno][['MmbCode', 'CatLabel', 'CatOrdine']].copy()
-    df_anno_succ = df[df['Anno'] == anno + 1][['MmbCode', 'CatLabel', 'CatOrdine']].copy()
-
-    merged = df_anno.merge(df_anno_succ, on='MmbCode', suffixes=('_pre', '_post'))
-    merged['Progressione'] = merged['CatOrdine_post'] - merged['CatOrdine_pre']
-
-    # Chi è salito, sceso, rimasto uguale
-    saliti = (merged['Progressione'] > 0).sum()
-    scesi = (merged['Progressione'] < 0).sum()
-    stabili = (merged['Progressione'] == 0).sum()
-    totale = len(merged)
+    # Categorie in ordine crescente: sopra la diagonale chi sale, sotto chi scende
+    conteggi = matrice(tensore_ordine, anno=anno).to_numpy()
+    saliti = np.triu(conteggi, 1).sum()
+    scesi = np.tril(conteggi, -1).sum()
+    stabili = np.trace(conteggi)
+    totale = conteggi.sum()
 
     progressione_data.append({
         'Anno': f"{anno}->{anno+1}",
@@ -164,11 +165,8 @@ progressione_df = pd.DataFrame(progressione_data)
 
 # Matrice di transizione categorie (da livello a livello)
 print("   Creazione matrice transizione...")
-df_2024 = df[df['Anno'] == 2024][['MmbCode', 'Livello']].copy()
-df_2025_liv = df[df['Anno'] == 2025][['MmbCode', 'Livello']].copy()
-merged_liv = df_2024.merge(df_2025_liv, on='MmbCode', suffixes=('_2024', '_2025'))
-
-transizione = pd.crosstab(merged_liv['Livello_2024'], merged_liv['Livello_2025'], normalize='index') * 100
+transizione = transizione_anni(df, 2024, 2025, col='Livello', normalizza=True) * 100
+transizione = transizione.rename_axis(index='Livello_2024', columns='Livello_2025')
 transizione = transizione.round(1)
 
 # ============================================================================
@@ -210,38 +208,41 @@ circoli_confronto['Status'] = pd.cut(
 
 # Analisi conversione Scuola Bridge per circolo
 print("   Analisi conversione Scuola Bridge per circolo...")
-sb_conversione = []
-
-for anno in range(2017, 2025):
-    sb_anno = df[(df['Anno'] == anno) & (df['IsScuolaBridge'] == True)]['MmbCode'].unique()
-    anno_succ = df[df['Anno'] == anno + 1]
-
-    for circolo in df[df['Anno'] == anno]['MmbGroup'].unique():
-        sb_circolo = df[(df['Anno'] == anno) & (df['MmbGroup'] == circolo) & (df['IsScuolaBridge'] == True)]
-        if len(sb_circolo) < 5:
-            continue
-
-        sb_codes = sb_circolo['MmbCode'].unique()
-
-        # Quanti sono rimasti l'anno dopo
-        ritesserati = anno_succ[anno_succ['MmbCode'].isin(sb_codes)]
-        rimasti_sb = ritesserati[ritesserati['IsScuolaBridge'] == True]
-        convertiti = ritesserati[ritesserati['IsScuolaBridge'] == False]
-        persi = len(sb_codes) - len(ritesserati['MmbCode'].unique())
-
-        sb_conversione.append({
-            'Anno': anno,
-            'Circolo': circolo,
-            'NomeCircolo': sb_circolo['GrpName'].iloc[0],
-            'Regione': sb_circolo['Regione'].iloc[0],
-            'AllievoSB': len(sb_codes),
-            'RimastiSB': len(rimasti_sb['MmbCode'].unique()),
-            'Convertiti': len(convertiti['MmbCode'].unique()),
-            'Persi': persi,
-            'GareMedie': sb_circolo['GareGiocate'].mean()
-        })
-
-sb_conv_df = pd.DataFrame(sb_conversione)
+# Tutte le coppie (anno, circolo) -> anno successivo in una passata: l'esito
+# di ogni allievo è un test di appartenenza di (giocatore, anno+1)
+sb_righe = df[df['Anno'].between(2017, 2024) & (df['IsScuolaBridge'] == True) & df['MmbGroup'].notna()]
+chiavi_circolo = ['Anno', 'MmbGroup']
+sb_circoli = sb_righe.groupby(chiavi_circolo, sort=False)
+
+allievi = sb_righe[chiavi_circolo + ['MmbCode']].drop_duplicates()
+codici, _ = pd.factorize(pd.concat([allievi['MmbCode'], df['MmbCode']], ignore_index=True))
+codici_allievi, codici_df = codici[:len(allievi)], codici[len(allievi):]
+anni_df = df['Anno'].to_numpy()
+validi_df = codici_df >= 0
+for esito, maschera in [('Ritesserato', validi_df),
+                        ('RimastoSB', validi_df & (df['IsScuolaBridge'] == True).to_numpy()),
+                        ('Convertito', validi_df & (df['IsScuolaBridge'] == False).to_numpy())]:
+    allievi[esito] = presente_anno_successivo(codici_allievi, allievi['Anno'], codici_df[maschera], anni_df[maschera])
+
+esiti = allievi.groupby(chiavi_circolo, sort=False).agg(
+    AllievoSB=('MmbCode', 'size'),
+    RimastiSB=('RimastoSB', 'sum'),
+    Convertiti=('Convertito', 'sum'),
+    Ritesserati=('Ritesserato', 'sum')
+)
+prima_riga = sb_righe.drop_duplicates(chiavi_circolo).set_index(chiavi_circolo)
+
+sb_conv_df = pd.DataFrame({
+    'NomeCircolo': prima_riga['GrpName'],
+    'Regione': prima_riga['Regione'],
+    'AllievoSB': esiti['AllievoSB'],
+    'RimastiSB': esiti['RimastiSB'],
+    'Convertiti': esiti['Convertiti'],
+    'Persi': esiti['AllievoSB'] - esiti['Ritesserati'],
+    'GareMedie': sb_circoli['GareGiocate'].mean()
+})
+# Circoli con almeno 5 righe Scuola Bridge nell'anno
+sb_conv_df = sb_conv_df[sb_circoli.size() >= 5].rename_axis(['Anno', 'Circolo']).reset_index()
 
 # Aggregazione per circolo
 circoli_conversione = sb_conv_df.groupby(['Circolo', 'NomeCircolo', 'Regione']).agg({
@@ -11,6 +11,7 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import seaborn as sns
 from pathlib import Path
+import sys
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -37,6 +38,8 @@ COLORS = {
 
 # Directory
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
 OUTPUT_DIR = BASE_DIR / 'output'
 RESULTS_DIR = OUTPUT_DIR / 'results'
 CHARTS_DIR = OUTPUT_DIR / 'charts'
@@ -52,7 +55,7 @@ print("=" * 100)
 # CARICAMENTO E PREPARAZIONE DATI
 # =============================================================================
 print("\n[1/10] CARICAMENTO DATI...")
-df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+df = carica_dati_unificati()
 print(f"    Record totali: {len(df):,}")
 print(f"    Giocatori unici: {df['MmbCode'].nunique():,}")
 
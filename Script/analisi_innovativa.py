@@ -9,6 +9,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+import sys
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
@@ -18,6 +19,8 @@ plt.rcParams['figure.figsize'] = (14, 10)
 plt.rcParams['font.size'] = 11
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
 OUTPUT_DIR = BASE_DIR / 'output'
 CHARTS_DIR = OUTPUT_DIR / 'charts_innovativi'
 RESULTS_DIR = OUTPUT_DIR / 'results_innovativi'
@@ -31,7 +34,7 @@ print("=" * 100)
 
 # Caricamento
 print("\n[1/7] Caricamento dati...")
-df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+df = carica_dati_unificati()
 
 # ============================================================================
 # GRAFICO CIRCOLI MIGLIORATO
@@ -7,8 +7,11 @@ Logica corretta: chi gioca tanto NON è a rischio!
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import sys
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
 OUTPUT_DIR = BASE_DIR / 'output'
 
 print("=" * 80)
@@ -17,9 +20,7 @@ print("=" * 80)
 
 # Carica dati
 print("\n[1/5] Caricamento dati...")
-df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
-df['MmbCode'] = df['MmbCode'].str.strip()
-df['MmbName'] = df['MmbName'].str.strip()
+df = carica_dati_unificati()
 
 # Aggregazione per giocatore
 print("\n[2/5] Calcolo metriche per giocatore...")
@@ -20,9 +20,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 from pathlib import Path
+import sys
 
 # Configurazione percorsi
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
+from indice_tesserati import IndiceTesserati, conta
 DATA_FILE = BASE_DIR / "output" / "dati_unificati_2017_2025.csv"
 OUTPUT_DIR = BASE_DIR / "output"
 
@@ -30,7 +34,7 @@ OUTPUT_DIR = BASE_DIR / "output"
 def carica_dati():
     """Carica il dataset unificato."""
     print(f"Caricamento dati da: {DATA_FILE}")
-    df = pd.read_csv(DATA_FILE)
+    df = carica_dati_unificati()
     print(f"Dataset caricato: {len(df):,} righe")
     return df
 
@@ -70,54 +74,54 @@ def analisi_transizioni_annuali(df):
     print("="*80)
 
     risultati = []
+    # Insiemi di tesserati come bitmap: le coorti sono operazioni bit a bit
+    indice = IndiceTesserati(df, dimensioni=['MbtDesc'])
 
     for year in range(2017, 2025):
         next_year = year + 1
 
         # Giocatori Scuola Bridge nell'anno corrente
-        sb_year = set(df[(df['Anno'] == year) & (df['MbtDesc'] == 'Scuola Bridge')]['MmbCode'])
+        sb_year = indice.insieme(year, MbtDesc='Scuola Bridge')
+        n_sb = conta(sb_year)
 
-        if len(sb_year) == 0:
+        if n_sb == 0:
             continue
 
-        # Tutti i tesserati anno successivo
-        df_next = df[df['Anno'] == next_year]
-        tesserati_next = set(df_next['MmbCode'])
-
-        # Chi si ritessera?
-        ritesserati = sb_year.intersection(tesserati_next)
+        # Chi si ritessera (tutti i tesserati anno successivo)?
+        ritesserati = sb_year & indice.insieme(next_year)
 
         # Di questi, chi rimane Scuola Bridge?
-        sb_next = set(df_next[df_next['MbtDesc'] == 'Scuola Bridge']['MmbCode'])
-        progressione = sb_year.intersection(sb_next)
+        progressione = sb_year & indice.insieme(next_year, MbtDesc='Scuola Bridge')
 
         # Chi passa ad altra categoria?
-        completamento = ritesserati - progressione
+        completamento = ritesserati & ~progressione
 
         # Chi non si ritessera (vero churn)?
-        churn_reale = sb_year - ritesserati
+        churn_reale = sb_year & ~ritesserati
+
+        n_prog, n_comp, n_churn = conta(progressione), conta(completamento), conta(churn_reale)
 
         risultati.append({
             'Anno': f"{year}->{next_year}",
-            'Scuola Bridge': len(sb_year),
-            'Progressione': len(progressione),
-            'Progressione %': len(progressione)/len(sb_year)*100,
-            'Completamento': len(completamento),
-            'Completamento %': len(completamento)/len(sb_year)*100,
-            'Churn Reale': len(churn_reale),
-            'Churn Reale %': len(churn_reale)/len(sb_year)*100,
-            'Successo Totale': len(progressione) + len(completamento),
-            'Successo %': (len(progressione) + len(completamento))/len(sb_year)*100
+            'Scuola Bridge': n_sb,
+            'Progressione': n_prog,
+            'Progressione %': n_prog/n_sb*100,
+            'Completamento': n_comp,
+            'Completamento %': n_comp/n_sb*100,
+            'Churn Reale': n_churn,
+            'Churn Reale %': n_churn/n_sb*100,
+            'Successo Totale': n_prog + n_comp,
+            'Successo %': (n_prog + n_comp)/n_sb*100
         })
 
         print(f"\n{year} -> {next_year}:")
-        print(f"  Scuola Bridge: {len(sb_year):,}")
+        print(f"  Scuola Bridge: {n_sb:,}")
         print(f"  ----------------------------------------")
-        print(f"  PROGRESSIONE (rimane SB):      {len(progressione):>5,} ({len(progressione)/len(sb_year)*100:>5.1f}%) [POSITIVO]")
-        print(f"  COMPLETAMENTO (passa altro):   {len(completamento):>5,} ({len(completamento)/len(sb_year)*100:>5.1f}%) [POSITIVO]")
-        print(f"  CHURN REALE (non ritessera):   {len(churn_reale):>5,} ({len(churn_reale)/len(sb_year)*100:>5.1f}%) [NEGATIVO]")
+        print(f"  PROGRESSIONE (rimane SB):      {n_prog:>5,} ({n_prog/n_sb*100:>5.1f}%) [POSITIVO]")
+        print(f"  COMPLETAMENTO (passa altro):   {n_comp:>5,} ({n_comp/n_sb*100:>5.1f}%) [POSITIVO]")
+        print(f"  CHURN REALE (non ritessera):   {n_churn:>5,} ({n_churn/n_sb*100:>5.1f}%) [NEGATIVO]")
         print(f"  ----------------------------------------")
-        print(f"  TASSO SUCCESSO:                {len(progressione)+len(completamento):>5,} ({(len(progressione)+len(completamento))/len(sb_year)*100:>5.1f}%)")
+        print(f"  TASSO SUCCESSO:                {n_prog+n_comp:>5,} ({(n_prog+n_comp)/n_sb*100:>5.1f}%)")
 
     return pd.DataFrame(risultati)
 
@@ -3,10 +3,13 @@
 Configurazione centralizzata per tutti gli script di analisi FIGB
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Directory base del progetto
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
 
 # Directory dei dati
 DATA_DIR = BASE_DIR
@@ -29,6 +32,7 @@ FILE_2025 = DATA_DIR / '2025 Dopo Natale.xlsx'
 
 # File output
 FILE_UNIFICATO_CSV = OUTPUT_DIR / 'dati_unificati_2017_2025.csv'
+FILE_UNIFICATO_FEATHER = OUTPUT_DIR / 'dati_unificati_2017_2025.feather'
 
 # Configurazione analisi
 ANNI_ANALISI = list(range(2017, 2026))
@@ -7,6 +7,7 @@ Versione corretta con tutte le analisi
 import pandas as pd
 import json
 from pathlib import Path
+import sys
 from datetime import datetime
 from fpdf import FPDF
 import requests
@@ -32,6 +33,8 @@ def call_gemini(prompt):
 
 # Directory
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
 OUTPUT_DIR = BASE_DIR / 'output'
 CHARTS_DIR = OUTPUT_DIR / 'charts_v2'
 CHARTS_CHURN = OUTPUT_DIR / 'charts_churn'
@@ -549,7 +552,7 @@ pdf.add_highlight(f"BEST PRACTICE: Correlazione gare-retention = {metriche['scuo
 pdf.add_page()
 pdf.chapter_title('5.2 BAS - Bridge a Scuola (Istituti Scolastici)', 2)
 # Calcola metriche BAS
-df_temp = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+df_temp = carica_dati_unificati(colonne=['MmbCode', 'Anno', 'MbtDesc'])
 bas_df = df_temp[df_temp['MbtDesc'].isin(['Ist.Scolastici', 'Studente CAS', 'CAS Giovanile'])]
 bas_2025 = bas_df[bas_df['Anno'] == 2025]['MmbCode'].nunique()
 bas_totale = bas_df['MmbCode'].nunique()
@@ -12,9 +12,15 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
+import os
+import sys
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
 OUTPUT_DIR = BASE_DIR / 'output'
 CHARTS_DIR = OUTPUT_DIR / 'charts_predittivi'
 RESULTS_DIR = OUTPUT_DIR / 'results_predittivi'
@@ -35,8 +41,7 @@ print("=" * 100)
 # ============================================================================
 print("\n[1/6] Caricamento dati storici...")
 
-df = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
-df['MmbCode'] = df['MmbCode'].str.strip()
+df = carica_dati_unificati()
 
 # Aggregazione per giocatore
 giocatori = df.groupby('MmbCode').agg({
@@ -166,31 +171,6 @@ FATTORE_ENGAGEMENT = {
     '30+ gare': 0.3    # Super attivi: bassissimo rischio
 }
 
-def calcola_probabilita_uscita(row, anno_simulazione):
-    """Calcola probabilità che un giocatore esca nell'anno"""
-    eta_attuale = row['Eta2025'] + (anno_simulazione - 2025) if pd.notna(row['Eta2025']) else 65
-    fascia_eta = fascia_eta_num(eta_attuale)
-
-    # Tasso base per età
-    p_churn = TASSO_CHURN_BASE.get(fascia_eta, 0.12)
-
-    # Fattore anzianità
-    anzianita = row['AnniPresenza'] + (anno_simulazione - 2025)
-    fascia_anz = fascia_anzianita(anzianita)
-    p_churn *= FATTORE_ANZIANITA.get(fascia_anz, 1.0)
-
-    # Fattore engagement
-    fascia_g = fascia_gare(row['GareMedie'])
-    p_churn *= FATTORE_ENGAGEMENT.get(fascia_g, 1.0)
-
-    # Mortalità
-    p_morte = MORTALITA_ANNUA.get(fascia_eta, 0.02)
-
-    # Probabilità totale uscita = churn + morte (eventi indipendenti)
-    p_uscita = p_churn + p_morte - (p_churn * p_morte)
-
-    return min(p_uscita, 0.95)  # Cap al 95%
-
 def fascia_eta_num(eta):
     if eta < 30: return '<30'
     elif eta < 40: return '30-39'
@@ -200,69 +180,190 @@ def fascia_eta_num(eta):
     elif eta < 80: return '70-79'
     else: return '80+'
 
-# Simulazione Monte Carlo (1 run deterministica + varianza)
-np.random.seed(42)
-
-proiezioni = []
-proiezioni_scenari = {'ottimistico': [], 'base': [], 'pessimistico': []}
-
-# Stato iniziale
-popolazione = attivi_2025.copy()
-popolazione['AnnoUscita'] = None
-
-for anno in range(2025, 2036):
-    n_inizio = len(popolazione[popolazione['AnnoUscita'].isna()])
-
-    if anno > 2025:
-        # Calcola chi esce
-        attivi = popolazione[popolazione['AnnoUscita'].isna()].copy()
-
-        for idx in attivi.index:
-            p_uscita = calcola_probabilita_uscita(popolazione.loc[idx], anno)
-            if np.random.random() < p_uscita:
-                popolazione.loc[idx, 'AnnoUscita'] = anno
-
-        # Aggiungi nuovi reclutati
-        nuovi = pd.DataFrame({
-            'MmbCode': [f'NEW_{anno}_{i}' for i in range(NUOVI_RECLUTATI_ANNO)],
-            'AnnoInizio': anno,
-            'AnnoFine': anno,
-            'AnniPresenza': 1,
-            'GareMedie': np.random.normal(12, 5, NUOVI_RECLUTATI_ANNO).clip(1, 50),
-            'Eta2025': np.random.normal(ETA_MEDIA_NUOVI, 12, NUOVI_RECLUTATI_ANNO).clip(18, 85),
-            'Categoria': 'NC',
-            'Agonista': False,
-            'Attivo2025': False,
-            'Churned': False,
-            'FasciaEta': '50-59',
-            'FasciaAnzianita': '0-1 anni',
-            'FasciaGare': '10-19 gare',
-            'AnnoUscita': None
-        })
-        popolazione = pd.concat([popolazione, nuovi], ignore_index=True)
-
-    n_fine = len(popolazione[popolazione['AnnoUscita'].isna()])
-    n_usciti = n_inizio - n_fine + (NUOVI_RECLUTATI_ANNO if anno > 2025 else 0) - n_fine + n_inizio
-    n_usciti = n_inizio - (n_fine - (NUOVI_RECLUTATI_ANNO if anno > 2025 else 0))
-
-    # Calcola statistiche
-    attivi_anno = popolazione[popolazione['AnnoUscita'].isna()]
-    eta_media = attivi_anno['Eta2025'].mean() + (anno - 2025)
-
-    proiezioni.append({
-        'Anno': anno,
-        'Tesserati': n_fine,
-        'EtaMedia': eta_media,
-        'Nuovi': NUOVI_RECLUTATI_ANNO if anno > 2025 else 0,
-        'Usciti': n_inizio - n_fine + (NUOVI_RECLUTATI_ANNO if anno > 2025 else 0)
-    })
-
-    # Scenari
-    proiezioni_scenari['base'].append(n_fine)
-    proiezioni_scenari['ottimistico'].append(int(n_fine * 1.1))  # +10% retention
-    proiezioni_scenari['pessimistico'].append(int(n_fine * 0.9))  # -10% retention
-
+# ----------------------------------------------------------------------------
+# Motore di simulazione vettoriale
+# ----------------------------------------------------------------------------
+# Le fasce sono indici interi (np.searchsorted sugli stessi limiti delle
+# funzioni fascia_*), la probabilità di uscita è una tabella
+# [fascia età, fascia anzianità, fascia gare] e ogni anno le uscite di tutte
+# le repliche di un lotto sono un'unica estrazione vettoriale.
+N_REPLICHE = 2000
+DIMENSIONE_LOTTO = 250   # repliche simulate insieme (limita la memoria)
+SEED = 42
+PERCENTILI = [5, 25, 50, 75, 95]
+
+FASCE_ETA_SIM = ['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+']
+FASCE_ANZIANITA_SIM = ['0-1 anni', '2 anni', '3 anni', '4-5 anni', '6+ anni']
+FASCE_GARE_SIM = ['<5 gare', '5-9 gare', '10-19 gare', '20-29 gare', '30+ gare']
+LIMITI_ETA = np.array([30, 40, 50, 60, 70, 80])        # eta < limite
+LIMITI_ANZIANITA = np.array([1, 2, 3, 5])              # anni <= limite
+LIMITI_GARE = np.array([5, 10, 20, 30])                # gare < limite (NaN -> 30+)
+ETA_MANCANTE = 65
+
+
+def tabella_probabilita_uscita():
+    """Probabilità di uscita (churn + morte, cap 95%) per ogni combinazione di fasce"""
+    p_churn = (
+        np.array([TASSO_CHURN_BASE[f] for f in FASCE_ETA_SIM])[:, None, None]
+        * np.array([FATTORE_ANZIANITA[f] for f in FASCE_ANZIANITA_SIM])[None, :, None]
+        * np.array([FATTORE_ENGAGEMENT[f] for f in FASCE_GARE_SIM])[None, None, :]
+    )
+    p_morte = np.array([MORTALITA_ANNUA[f] for f in FASCE_ETA_SIM])[:, None, None]
+    # Eventi indipendenti
+    p_uscita = p_churn + p_morte - (p_churn * p_morte)
+    return np.minimum(p_uscita, 0.95)
+
+
+def indici_fasce(eta, anzianita, gare):
+    """Indici di fascia (età, anzianità, gare) per array di qualsiasi forma"""
+    eta = np.where(np.isnan(eta), ETA_MANCANTE, eta)
+    return (
+        np.searchsorted(LIMITI_ETA, eta, side='right'),
+        np.searchsorted(LIMITI_ANZIANITA, anzianita, side='left'),
+        np.searchsorted(LIMITI_GARE, gare, side='right'),
+    )
+
+
+def simula_lotto(eta_2025, anni_presenza, gare_medie, n_repliche, rng,
+                 anni=range(2025, 2036), nuovi_anno=NUOVI_RECLUTATI_ANNO):
+    """
+    Simula un lotto di repliche.
+    I tesserati 2025 sono raggruppati in strati con la stessa traiettoria di
+    probabilità (età, anzianità, fascia gare): per ogni strato le uscite
+    dell'anno sono una binomiale sugli attivi, equivalente in distribuzione
+    alle estrazioni individuali. I reclutati di ogni anno sono estratti per
+    replica (età e gare) ed entrano con anzianità 1.
+    Restituisce array (repliche x anni): tesserati, età media, usciti, e per i
+    rischi strutturali le quote di attivi finali per età equivalente 2025.
+    """
+    tabella = tabella_probabilita_uscita()
+    anni = list(anni)
+    anno_base = anni[0]
+    n_nuovi = nuovi_anno * (len(anni) - 1)
+
+    # Tesserati 2025: strati condivisi, attivi per strato e replica
+    _, _, fascia_gare_base = indici_fasce(eta_2025, anni_presenza, gare_medie)
+    # Dal primo anno simulato in poi un'anzianità 2025 >= 5 è sempre nella fascia 6+
+    anz_strati = np.minimum(anni_presenza, LIMITI_ANZIANITA[-1])
+    strati = pd.DataFrame({'eta': eta_2025, 'anz': anz_strati, 'fg': fascia_gare_base, 'gare': gare_medie})
+    strati = strati.groupby(['eta', 'anz', 'fg'], dropna=False).agg(n=('fg', 'size'), gare=('gare', 'first'))
+    strati = strati.reset_index()
+    eta_strato = strati['eta'].to_numpy(dtype=float)
+    anz_strato = strati['anz'].to_numpy(dtype=float)
+    gare_strato = strati['gare'].to_numpy(dtype=float)
+    eta_base = np.where(np.isnan(eta_strato), 0.0, eta_strato)
+    ha_eta_base = (~np.isnan(eta_strato)).astype(np.int64)
+    attivi_base = np.tile(strati['n'].to_numpy(dtype=np.int64), (n_repliche, 1))
+
+    # Reclutati: età equivalente al 2025 e fascia gare per replica. I limiti
+    # di età sono interi, quindi la fascia dipende solo dalla parte intera
+    # dell'età (tabella di lookup); l'anzianità è la stessa per tutta la coorte.
+    eta_nuovi = np.zeros((n_repliche, n_nuovi))
+    eta_int_nuovi = np.zeros((n_repliche, n_nuovi), dtype=np.int64)
+    fg_nuovi = np.zeros((n_repliche, n_nuovi), dtype=np.int64)
+    attivo_nuovi = np.zeros((n_repliche, n_nuovi), dtype=bool)
+    eta_min = int(np.floor(18 - len(anni)))
+    lookup_eta = np.searchsorted(LIMITI_ETA, np.arange(eta_min, 86 + len(anni)), side='right')
+    n_anz, n_gare = tabella.shape[1], tabella.shape[2]
+
+    tesserati = np.zeros((n_repliche, len(anni)), dtype=np.int64)
+    eta_media = np.zeros((n_repliche, len(anni)))
+    usciti = np.zeros((n_repliche, len(anni)), dtype=np.int64)
+
+    for k, anno in enumerate(anni):
+        delta = anno - anno_base
+        if anno > anno_base:
+            # Uscite dei tesserati 2025: una binomiale per strato e replica
+            p_base = tabella[indici_fasce(eta_strato + delta, anz_strato + delta, gare_strato)]
+            esce = rng.binomial(attivi_base, p_base)
+            attivi_base -= esce
+            usciti[:, k] = esce.sum(axis=1)
+
+            # Uscite dei reclutati negli anni precedenti
+            precedenti = nuovi_anno * (k - 1)
+            if precedenti:
+                # Anzianità per colonna: 1 + anni dall'ingresso della coorte
+                anzianita = 1 + (k - 1 - np.arange(precedenti) // nuovi_anno)
+                i_anz = np.searchsorted(LIMITI_ANZIANITA, anzianita, side='left')
+                i_eta = lookup_eta[eta_int_nuovi[:, :precedenti] + delta - eta_min]
+                p_nuovi = tabella.ravel()[(i_eta * n_anz + i_anz) * n_gare + fg_nuovi[:, :precedenti]]
+                esce = attivo_nuovi[:, :precedenti] & (
+                    rng.random((n_repliche, precedenti), dtype=np.float32) < p_nuovi)
+                attivo_nuovi[:, :precedenti] &= ~esce
+                usciti[:, k] += esce.sum(axis=1)
+
+            # Nuovi reclutati dell'anno
+            nuovi = slice(precedenti, precedenti + nuovi_anno)
+            gare_ingresso = rng.normal(12, 5, (n_repliche, nuovi_anno)).clip(1, 50)
+            fg_nuovi[:, nuovi] = np.searchsorted(LIMITI_GARE, gare_ingresso, side='right')
+            eta_ingresso = rng.normal(ETA_MEDIA_NUOVI, 12, (n_repliche, nuovi_anno)).clip(18, 85)
+            eta_nuovi[:, nuovi] = eta_ingresso - delta
+            eta_int_nuovi[:, nuovi] = np.floor(eta_ingresso).astype(np.int64) - delta
+            attivo_nuovi[:, nuovi] = True
+
+        # Età media degli attivi con età nota (i reclutati hanno sempre l'età)
+        somma_eta = attivi_base @ eta_base + (attivo_nuovi * eta_nuovi).sum(axis=1)
+        n_con_eta = attivi_base @ ha_eta_base + attivo_nuovi.sum(axis=1)
+        tesserati[:, k] = attivi_base.sum(axis=1) + attivo_nuovi.sum(axis=1)
+        eta_media[:, k] = somma_eta / n_con_eta + delta
+
+    quote = {}
+    for nome, soglia, sopra in [('over_70_2025', 70, True), ('over_70_2030', 65, True),
+                                ('over_70_2035', 60, True), ('under_40_2025', 40, False)]:
+        cond_base = (eta_strato >= soglia) if sopra else (eta_strato < soglia)
+        cond_nuovi = (eta_nuovi >= soglia) if sopra else (eta_nuovi < soglia)
+        quote[nome] = (attivi_base @ cond_base.astype(np.int64) + (attivo_nuovi & cond_nuovi).sum(axis=1)) \
+            / tesserati[:, -1] * 100
+    return tesserati, eta_media, usciti, quote
+
+
+def simula_repliche(attivi, n_repliche=N_REPLICHE, dimensione_lotto=DIMENSIONE_LOTTO, seed=SEED):
+    """Esegue tutte le repliche a lotti, con stream casuali indipendenti per lotto (riproducibili)"""
+    eta_2025 = attivi['Eta2025'].to_numpy(dtype=float)
+    anni_presenza = attivi['AnniPresenza'].to_numpy(dtype=float)
+    gare_medie = attivi['GareMedie'].to_numpy(dtype=float)
+
+    lotti = [min(dimensione_lotto, n_repliche - i) for i in range(0, n_repliche, dimensione_lotto)]
+    streams = np.random.SeedSequence(seed).spawn(len(lotti))
+    # I generatori numpy rilasciano il GIL: i lotti girano in parallelo su thread
+    with ThreadPoolExecutor(max_workers=min(len(lotti), os.cpu_count() or 1)) as pool:
+        risultati = list(pool.map(
+            lambda lotto: simula_lotto(eta_2025, anni_presenza, gare_medie, lotto[0],
+                                       np.random.default_rng(lotto[1])),
+            zip(lotti, streams)
+        ))
+    tesserati = np.vstack([r[0] for r in risultati])
+    eta_media = np.vstack([r[1] for r in risultati])
+    usciti = np.vstack([r[2] for r in risultati])
+    quote = {k: np.concatenate([r[3][k] for r in risultati]) for k in risultati[0][3]}
+    return tesserati, eta_media, usciti, quote
+
+
+t0 = time.perf_counter()
+sim_tesserati, sim_eta, sim_usciti, sim_quote = simula_repliche(attivi_2025)
+print(f"   {N_REPLICHE:,} repliche simulate in {time.perf_counter() - t0:.1f}s")
+
+anni_sim = list(range(2025, 2036))
+proiezioni = {
+    'Anno': anni_sim,
+    'Tesserati': np.rint(np.median(sim_tesserati, axis=0)).astype(int),
+    'EtaMedia': np.median(sim_eta, axis=0),
+    'Nuovi': [NUOVI_RECLUTATI_ANNO if anno > 2025 else 0 for anno in anni_sim],
+    'Usciti': np.rint(np.median(sim_usciti, axis=0)).astype(int),
+}
+# Bande percentili
+for nome, valori in [('Tesserati', sim_tesserati), ('EtaMedia', sim_eta), ('Usciti', sim_usciti)]:
+    for p in PERCENTILI:
+        if p != 50:
+            proiezioni[f'{nome}_P{p}'] = np.percentile(valori, p, axis=0)
 proiezioni_df = pd.DataFrame(proiezioni)
+
+# Scenari = bande 5-95% della distribuzione simulata
+proiezioni_scenari = {
+    'base': proiezioni_df['Tesserati'].tolist(),
+    'ottimistico': np.rint(proiezioni_df['Tesserati_P95']).astype(int).tolist(),
+    'pessimistico': np.rint(proiezioni_df['Tesserati_P5']).astype(int).tolist(),
+}
 print(f"   Simulazione completata")
 
 # ============================================================================
@@ -270,14 +371,13 @@ print(f"   Simulazione completata")
 # ============================================================================
 print("\n[5/6] Analisi rischi strutturali...")
 
-# Rischio invecchiamento
-attivi_oggi = popolazione[popolazione['AnnoUscita'].isna()]
-over_70_oggi = len(attivi_oggi[attivi_oggi['Eta2025'] >= 70]) / len(attivi_oggi) * 100
-over_70_2030 = len(attivi_oggi[attivi_oggi['Eta2025'] >= 65]) / len(attivi_oggi) * 100  # +5 anni
-over_70_2035 = len(attivi_oggi[attivi_oggi['Eta2025'] >= 60]) / len(attivi_oggi) * 100  # +10 anni
+# Rischio invecchiamento (mediana sulle repliche degli attivi a fine simulazione)
+over_70_oggi = np.median(sim_quote['over_70_2025'])
+over_70_2030 = np.median(sim_quote['over_70_2030'])  # +5 anni
+over_70_2035 = np.median(sim_quote['over_70_2035'])  # +10 anni
 
 # Rischio concentrazione
-under_40_oggi = len(attivi_oggi[attivi_oggi['Eta2025'] < 40]) / len(attivi_oggi) * 100
+under_40_oggi = np.median(sim_quote['under_40_2025'])
 
 rischi = {
     'over_70_2025': round(over_70_oggi, 1),
@@ -312,13 +412,15 @@ fig.suptitle('MODELLO PREDITTIVO FIGB 2025-2035', fontsize=18, fontweight='bold'
 ax1 = axes[0, 0]
 anni = proiezioni_df['Anno']
 ax1.fill_between(anni, proiezioni_scenari['pessimistico'], proiezioni_scenari['ottimistico'],
-                  alpha=0.3, color='#4A90D9', label='Range scenari')
+                  alpha=0.3, color='#4A90D9', label='Intervallo 5-95%')
+ax1.fill_between(anni, proiezioni_df['Tesserati_P25'], proiezioni_df['Tesserati_P75'],
+                  alpha=0.3, color='#1E3A5F', label='Intervallo 25-75%')
 ax1.plot(anni, proiezioni_scenari['base'], 'o-', color='#1E3A5F', linewidth=3,
-         markersize=10, label='Scenario base')
+         markersize=10, label='Mediana')
 ax1.plot(anni, proiezioni_scenari['ottimistico'], '--', color='#28A745', linewidth=2,
-         alpha=0.7, label='Ottimistico (+10%)')
+         alpha=0.7, label='Ottimistico (95° percentile)')
 ax1.plot(anni, proiezioni_scenari['pessimistico'], '--', color='#DC3545', linewidth=2,
-         alpha=0.7, label='Pessimistico (-10%)')
+         alpha=0.7, label='Pessimistico (5° percentile)')
 
 # Annotazioni
 for i, (a, t) in enumerate(zip(anni, proiezioni_scenari['base'])):
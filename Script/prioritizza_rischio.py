@@ -6,8 +6,12 @@ Crea lista actionable con nomi e priorità
 
 import pandas as pd
 from pathlib import Path
+import sys
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from data_store import carica_dati_unificati
+from motore_regole import classifica, punteggio
 OUTPUT_DIR = BASE_DIR / 'output'
 
 print("=" * 80)
@@ -17,11 +21,10 @@ print("=" * 80)
 # Carica dati
 print("\n[1/4] Caricamento dati...")
 rischio = pd.read_csv(OUTPUT_DIR / 'results_innovativi' / 'giocatori_attivi_a_rischio.csv')
-dati = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
+dati = carica_dati_unificati()
 
 # Pulisci MmbCode (rimuovi spazi)
 rischio['MmbCode'] = rischio['MmbCode'].str.strip()
-dati['MmbCode'] = dati['MmbCode'].str.strip()
 
 print(f"   Giocatori a rischio: {len(rischio):,}")
 
@@ -41,66 +44,43 @@ print(f"   Match trovati: {rischio_completo['MmbName'].notna().sum():,}")
 # Calcola priorità
 print("\n[3/4] Calcolo priorità...")
 
-def calcola_priorita(row):
-    """
-    Priorità basata su:
-    1. Età giovane (MASSIMA priorità - futuro della federazione)
-    2. Rischio critico vs attenzione
-    3. Più gare giocate (più investimento, più da perdere)
-    4. Categoria (agonisti valgono di più)
-    """
-    score = 0
-
-    # ETÀ - giovani hanno massima priorità (inversamente proporzionale)
-    eta = row['Eta'] if pd.notna(row['Eta']) else 70
-    if eta < 30:
-        score += 100  # Under 30 = priorità massima
-    elif eta < 40:
-        score += 80   # Under 40 = alta
-    elif eta < 50:
-        score += 60   # Under 50 = media-alta
-    elif eta < 60:
-        score += 40   # Under 60 = media
-    elif eta < 70:
-        score += 20   # Under 70 = bassa
-    else:
-        score += 10   # Over 70 = minima
-
+# Priorità basata su:
+# 1. Età giovane (MASSIMA priorità - futuro della federazione)
+# 2. Rischio critico vs attenzione
+# 3. Più gare giocate (più investimento, più da perdere)
+# 4. Categoria (agonisti valgono di più)
+PUNTEGGIO_PRIORITA = [
+    # ETÀ - giovani hanno massima priorità (età sconosciuta = over 70)
+    ([(100, [('Eta', '<', 30)]),   # Under 30 = priorità massima
+      (80, [('Eta', '<', 40)]),    # Under 40 = alta
+      (60, [('Eta', '<', 50)]),    # Under 50 = media-alta
+      (40, [('Eta', '<', 60)]),    # Under 60 = media
+      (20, [('Eta', '<', 70)])],   # Under 70 = bassa
+     10),                          # Over 70 = minima
     # RISCHIO CRITICO vale di più
-    if row['RischioChurn'] == 'CRITICO':
-        score += 30
-    else:
-        score += 15
-
-    # GARE - chi gioca di più è più investito
-    gare = row['GareMedie'] if pd.notna(row['GareMedie']) else 0
-    score += min(gare * 2, 20)  # max 20 punti
-
+    ([(30, [('RischioChurn', '==', 'CRITICO')])], 15),
+]
+PUNTEGGIO_CATEGORIA = [
     # CATEGORIA - agonisti priorità
-    cat = str(row.get('CatLabel', 'NC'))
-    if cat.startswith(('1', 'H', 'M', 'G', 'L')):  # Prima, Honor, Master
-        score += 15
-    elif cat.startswith(('2', '3')):  # Seconda, Terza
-        score += 10
-    elif cat.startswith('4'):  # Quarta
-        score += 5
+    ([(15, [('CatLabel', 'inizia', ['1', 'H', 'M', 'G', 'L'])]),  # Prima, Honor, Master
+      (10, [('CatLabel', 'inizia', ['2', '3'])]),                 # Seconda, Terza
+      (5, [('CatLabel', 'inizia', ['4'])])], 0),                  # Quarta
+]
 
-    return score
+LIVELLI_PRIORITA = [
+    ('1-URGENTE', [('PunteggioPriorita', '>=', 100)]),
+    ('2-ALTA', [('PunteggioPriorita', '>=', 70)]),
+    ('3-MEDIA', [('PunteggioPriorita', '>=', 50)]),
+]
 
-rischio_completo['PunteggioPriorita'] = rischio_completo.apply(calcola_priorita, axis=1)
+# GARE - chi gioca di più è più investito (max 20 punti), sommate tra rischio
+# e categoria come nella versione riga per riga (stesso arrotondamento)
+gare_punti = (rischio_completo['GareMedie'].fillna(0) * 2).clip(upper=20)
+rischio_completo['PunteggioPriorita'] = (punteggio(rischio_completo, PUNTEGGIO_PRIORITA) + gare_punti
+                                         + punteggio(rischio_completo, PUNTEGGIO_CATEGORIA))
 
 # Assegna livello priorità
-def livello_priorita(score):
-    if score >= 100:
-        return '1-URGENTE'
-    elif score >= 70:
-        return '2-ALTA'
-    elif score >= 50:
-        return '3-MEDIA'
-    else:
-        return '4-BASSA'
-
-rischio_completo['LivelloPriorita'] = rischio_completo['PunteggioPriorita'].apply(livello_priorita)
+rischio_completo['LivelloPriorita'] = classifica(rischio_completo, LIVELLI_PRIORITA, default='4-BASSA')
 
 # Ordina per priorità
 rischio_completo = rischio_completo.sort_values('PunteggioPriorita', ascending=False)
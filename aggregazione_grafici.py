@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Aggregazione lato server per il costruttore di grafici della dashboard
+
+Il grafico riceve già aggregata una tabella di dimensione limitata:
+- assi numerici con troppi valori distinti raggruppati in intervalli
+- asse X e colore limitati alle categorie più numerose, le restanti unite
+  in un'unica voce "Altri" (conteggi sommati, medie ricalcolate sul totale)
+
+I gruppi sono calcolati con bincount sui codici interi delle categorie, senza
+groupby sulle righe.
+"""
+
+import numpy as np
+import pandas as pd
+
+MAX_CATEGORIE_X = 25
+MAX_CATEGORIE_COLORE = 8
+N_INTERVALLI = 20
+ETICHETTA_ALTRI = 'Altri'
+
+
+def _codifica(serie, n_intervalli):
+    """
+    Codici interi (-1 = mancante) ed etichette ordinate di un asse.
+    Gli assi numerici con più di n_intervalli valori diventano intervalli
+    interi di pari ampiezza ("30-34").
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        valori = serie.to_numpy(dtype=float)
+        distinti = np.unique(valori[~np.isnan(valori)])
+        if len(distinti) > n_intervalli:
+            minimo = np.floor(distinti[0])
+            passo = max(np.ceil((np.ceil(distinti[-1]) - minimo + 1) / n_intervalli), 1)
+            codici = np.where(np.isnan(valori), -1, (valori - minimo) // passo).astype(np.int64)
+            n = int(codici.max()) + 1
+            etichette = np.array([f"{int(minimo + i * passo)}-{int(minimo + (i + 1) * passo - 1)}"
+                                  for i in range(n)], dtype=object)
+            return codici, etichette
+    codici, etichette = pd.factorize(serie, sort=True)
+    return codici.astype(np.int64), np.asarray(etichette, dtype=object)
+
+
+def _limita(codici, etichette, massimo):
+    """
+    Tiene le massimo - 1 categorie più numerose (in ordine di numerosità) e
+    unisce le altre in ETICHETTA_ALTRI. Sotto il limite non cambia nulla.
+    """
+    if len(etichette) <= massimo:
+        return codici, etichette
+    conteggi = np.bincount(codici[codici >= 0], minlength=len(etichette))
+    tenute = np.argsort(-conteggi, kind='stable')[:massimo - 1]
+    nuovi = np.full(len(etichette) + 1, massimo - 1, dtype=np.int64)
+    nuovi[tenute] = np.arange(len(tenute))
+    nuovi[-1] = -1  # i mancanti restano mancanti
+    etichette = np.append(etichette[tenute].astype(str), ETICHETTA_ALTRI).astype(object)
+    return nuovi[codici], etichette
+
+
+def aggrega_grafico(df, x, y='Conteggio', colore=None,
+                    max_x=MAX_CATEGORIE_X, max_colore=MAX_CATEGORIE_COLORE,
+                    n_intervalli=N_INTERVALLI):
+    """
+    Tabella per un grafico a barre: numero di righe (y='Conteggio') o media
+    di y per categoria di x (e di colore). Le righe con x o colore mancanti
+    sono escluse, come in groupby; un colore numerico continuo è diviso in
+    max_colore intervalli. Colonne: x, [colore], valore; il valore si chiama
+    come y, o "y (media)" se y è anche l'asse X o il colore (es. Anni).
+    """
+    cx, ex = _limita(*_codifica(df[x], n_intervalli), max_x)
+    if colore:
+        cc, ec = _limita(*_codifica(df[colore], max_colore), max_colore)
+    else:
+        cc, ec = np.zeros(len(df), dtype=np.int64), np.array([None], dtype=object)
+
+    validi = (cx >= 0) & (cc >= 0)
+    n_gruppi = len(ex) * len(ec)
+    chiave = cx[validi] * len(ec) + cc[validi]
+    righe = np.bincount(chiave, minlength=n_gruppi)
+
+    if y == 'Conteggio':
+        valori = righe.astype(float)
+    else:
+        misura = pd.to_numeric(df[y], errors='coerce').to_numpy(dtype=float)[validi]
+        presenti = ~np.isnan(misura)
+        somma = np.bincount(chiave[presenti], weights=misura[presenti], minlength=n_gruppi)
+        n = np.bincount(chiave[presenti], minlength=n_gruppi)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            valori = np.where(n > 0, somma / np.maximum(n, 1), np.nan)
+
+    gruppi = np.flatnonzero(righe > 0)
+    risultato = pd.DataFrame({x: ex[gruppi // len(ec)]})
+    if colore:
+        risultato[colore] = ec[gruppi % len(ec)]
+    colonna = f'{y} (media)' if y in (x, colore) else y
+    risultato[colonna] = valori[gruppi].astype(np.int64) if y == 'Conteggio' else valori[gruppi].round(2)
+    return risultato.infer_objects()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+API HTTP locale con gli aggregati della dashboard (per il front-end React)
+
+Un solo processo serve tutti gli utenti: dataset, cubo dei filtri e
+artefatti della pipeline sono caricati una volta e tenuti in memoria, e le
+risposte già calcolate restano in una cache LRU condivisa tra i thread.
+Ogni risposta ha un ETag ricavato da risorsa, filtri, formato, codifica e
+versione delle sorgenti (date di modifica), quindi una richiesta con If-None-Match valida
+riceve 304 senza ricalcolare nulla; un file rigenerato dalla pipeline
+cambia la versione e invalida da solo le risposte vecchie.
+
+Formati: JSON compatto a colonne ({"colonne": [...], "righe": [[...]]}) o
+Arrow IPC stream (?formato=arrow o Accept: application/vnd.apache.arrow.stream,
+se pyarrow è installato); gzip se il client lo accetta.
+
+Risorse:
+    /api/risorse                 elenco delle risorse
+    /api/trend                   tesserati, associazioni e medie per anno
+    /api/regionale               aggregati per regione
+    /api/tessere                 aggregati per anno e tipo tessera
+    /api/retention?per=GrpArea   retention anno su anno per regione o associazione
+    /api/churn/cluster           profili dei cluster di churn (pipeline)
+    /api/churn/macroregioni      churn per macroregione (pipeline)
+    /api/artefatti/<nome>        qualunque artefatto di artefatti_dashboard.ARTEFATTI
+
+Filtri (come la sidebar): anni=2019,2020  regioni=LOM,LAZ  eta=18-60
+macro_categoria=NC  tipo_tessera=Agonista
+
+Uso:
+    python api_dashboard.py                 # http://127.0.0.1:8502
+    python api_dashboard.py --porta 9000 --host 0.0.0.0
+"""
+
+import gzip
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from artefatti_dashboard import ARTEFATTI, mtime, leggi_artefatto, versione_dataset
+from cubo_filtri import costruisci_cubo, seleziona, impronta_filtri, aggrega, righe_filtrate
+from data_store import carica_dati_unificati
+from retention_associazioni import retention_annuale
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    PYARROW_AVAILABLE = False
+
+HOST = '127.0.0.1'
+PORTA = 8502
+MAX_RISPOSTE = 512           # voci della cache LRU delle risposte
+MIN_BYTE_GZIP = 1024         # sotto questa dimensione non conviene comprimere
+TIPO_ARROW = 'application/vnd.apache.arrow.stream'
+
+
+class ErroreRichiesta(Exception):
+    """Richiesta non valida (400) o risorsa assente (404/503)"""
+
+    def __init__(self, codice, messaggio):
+        super().__init__(messaggio)
+        self.codice = codice
+
+
+# ============================================================================
+# SORGENTI
+# ============================================================================
+# Versione, dataset e cubo pubblicati insieme: chi legge un'istantanea non
+# vede mai il cubo nuovo con il dataset vecchio
+Istantanea = namedtuple('Istantanea', ['versione', 'df', 'cubo', 'col_assoc'])
+
+
+class Sorgenti:
+    """Dataset unificato e cubo dei filtri, ricaricati solo se l'archivio cambia"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.corrente = None
+
+    def aggiorna(self):
+        """Istantanea aggiornata: dataset e cubo ricaricati se l'archivio è cambiato"""
+        versione = versione_dataset()
+        if versione is None:
+            raise ErroreRichiesta(503, "dataset unificato non disponibile: esegui la pipeline")
+        corrente = self.corrente
+        if corrente is None or corrente.versione != versione:
+            with self._lock:
+                corrente = self.corrente
+                if corrente is None or corrente.versione != versione:
+                    df = carica_dati_unificati()
+                    col_assoc = 'Associazione' if 'Associazione' in df.columns else 'GrpName'
+                    corrente = Istantanea(versione, df, costruisci_cubo(df, col_assoc), col_assoc)
+                    self.corrente = corrente
+        return corrente
+
+
+def _filtri(parametri):
+    """Argomenti di seleziona() dai parametri della query (None = filtro non attivo)"""
+    def elenco(nome):
+        valore = parametri.get(nome)
+        return [v for v in valore.split(',') if v] if valore else None
+
+    try:
+        anni = elenco('anni')
+        filtri = {
+            'anni': [int(a) for a in anni] if anni else None,
+            'regioni': elenco('regioni'),
+            'eta': None,
+            'macro_categoria': parametri.get('macro_categoria') or None,
+            'tipo_tessera': parametri.get('tipo_tessera') or None,
+        }
+        if parametri.get('eta'):
+            minimo, massimo = parametri['eta'].split('-')
+            filtri['eta'] = (float(minimo), float(massimo))
+    except ValueError:
+        raise ErroreRichiesta(400, "filtri non validi (es. anni=2019,2020&eta=18-60)")
+    return filtri
+
+
+# ============================================================================
+# RISORSE
+# ============================================================================
+def _aggregato(per):
+    def calcola(dati, parametri):
+        selezione = seleziona(dati.cubo, **_filtri(parametri))
+        return aggrega(dati.cubo, selezione, per=per)
+    return calcola
+
+
+def _retention(dati, parametri):
+    per = parametri.get('per', 'GrpArea')
+    if per not in ('GrpArea', 'Associazione'):
+        raise ErroreRichiesta(400, "per deve essere GrpArea o Associazione")
+    col_gruppo = dati.col_assoc if per == 'Associazione' else per
+    selezione = seleziona(dati.cubo, **_filtri(parametri))
+    righe = righe_filtrate(dati.df[['Anno', 'MmbCode', col_gruppo]], dati.cubo, selezione)
+    return retention_annuale(righe, col_gruppo).rename(columns={col_gruppo: per})
+
+
+def _artefatto(nome):
+    def calcola(dati, parametri):
+        return leggi_artefatto(ARTEFATTI[nome])
+    return calcola
+
+
+# percorso -> (calcolo, artefatto di origine o None se dal dataset con filtri);
+# il calcolo riceve l'Istantanea delle sorgenti (None per gli artefatti)
+RISORSE = {
+    'trend': (_aggregato(['Anno']), None),
+    'regionale': (_aggregato(['GrpArea']), None),
+    'tessere': (_aggregato(['Anno', 'TipoTessera']), None),
+    'retention': (_retention, None),
+    'churn/cluster': (_artefatto('cluster_churn'), 'cluster_churn'),
+    'churn/macroregioni': (_artefatto('churn_macro'), 'churn_macro'),
+}
+RISORSE.update({f'artefatti/{nome}': (_artefatto(nome), nome) for nome in ARTEFATTI})
+
+
+# ============================================================================
+# SERIALIZZAZIONE E CACHE
+# ============================================================================
+def _json_compatto(risultato):
+    """Tabelle come colonne + righe (niente chiavi ripetute), JSON così com'è"""
+    if isinstance(risultato, pd.DataFrame):
+        tabella = json.loads(risultato.to_json(orient='split', index=False, date_format='iso'))
+        risultato = {'colonne': tabella['columns'], 'righe': tabella['data']}
+    return json.dumps(risultato, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _arrow(risultato):
+    """Arrow IPC stream della tabella"""
+    if not isinstance(risultato, pd.DataFrame):
+        raise ErroreRichiesta(400, "formato arrow disponibile solo per le tabelle")
+    tabella = pa.Table.from_pandas(risultato.infer_objects(), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabella.schema) as scrittore:
+        scrittore.write_table(tabella)
+    return sink.getvalue().to_pybytes()
+
+
+class CacheRisposte:
+    """LRU thread-safe: (versione, formato) -> (tipo, corpo, corpo gzip)"""
+
+    def __init__(self, max_voci=MAX_RISPOSTE):
+        self._voci = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_voci = max_voci
+
+    def get(self, chiave):
+        with self._lock:
+            voce = self._voci.get(chiave)
+            if voce is not None:
+                self._voci.move_to_end(chiave)
+            return voce
+
+    def put(self, chiave, voce):
+        with self._lock:
+            self._voci[chiave] = voce
+            self._voci.move_to_end(chiave)
+            while len(self._voci) > self.max_voci:
+                self._voci.popitem(last=False)
+
+
+class ServizioAggregati:
+    """Calcolo, versione e cache delle risposte"""
+
+    def __init__(self):
+        self.sorgenti = Sorgenti()
+        self.cache = CacheRisposte()
+
+    def _versione(self, risorsa, parametri, dati, formato):
+        """Impronta di risorsa, parametri, formato e versione della sorgente"""
+        _, nome_artefatto = RISORSE[risorsa]
+        if nome_artefatto is None:
+            sorgente = dati.versione
+            chiave_parametri = (impronta_filtri(**_filtri(parametri)), parametri.get('per'))
+        else:
+            sorgente = mtime(ARTEFATTI[nome_artefatto])
+            if sorgente is None:
+                raise ErroreRichiesta(404, f"artefatto non ancora generato: {nome_artefatto}")
+            chiave_parametri = None
+        stato = repr((risorsa, chiave_parametri, sorgente, formato))
+        return hashlib.blake2b(stato.encode(), digest_size=12).hexdigest()
+
+    def prepara(self, risorsa, parametri, formato):
+        """
+        (versione, istantanea) della risposta senza calcolarla: basta per
+        l'ETag e quindi per rispondere 304 a una rivalidazione.
+        """
+        if risorsa not in RISORSE:
+            raise ErroreRichiesta(404, f"risorsa sconosciuta: {risorsa}")
+        if formato == 'arrow' and not PYARROW_AVAILABLE:
+            raise ErroreRichiesta(400, "formato arrow non disponibile (pyarrow non installato)")
+
+        # Una sola istantanea per richiesta: ETag e risultato dalla stessa versione
+        _, nome_artefatto = RISORSE[risorsa]
+        dati = self.sorgenti.aggiorna() if nome_artefatto is None else None
+        return self._versione(risorsa, parametri, dati, formato), dati
+
+    @staticmethod
+    def etag(versione, codifica):
+        """ETag della rappresentazione: versione più codifica negoziata (gzip o identity)"""
+        return f'"{versione}-{codifica}"'
+
+    def risposta(self, risorsa, parametri, formato, versione, dati):
+        """(tipo, corpo, corpo gzip) della risorsa, dalla cache se possibile"""
+        chiave = (versione, formato)
+        voce = self.cache.get(chiave)
+        if voce is None:
+            calcolo, _ = RISORSE[risorsa]
+            risultato = calcolo(dati, parametri)
+            if formato == 'arrow':
+                tipo, corpo = TIPO_ARROW, _arrow(risultato)
+            else:
+                tipo, corpo = 'application/json; charset=utf-8', _json_compatto(risultato)
+            compresso = gzip.compress(corpo, compresslevel=6) if len(corpo) >= MIN_BYTE_GZIP else None
+            voce = (tipo, corpo, compresso)
+            self.cache.put(chiave, voce)
+        return voce
+
+    def riscalda(self):
+        """Precalcola le risposte senza filtri di tutte le risorse disponibili"""
+        pronte = 0
+        for risorsa in RISORSE:
+            try:
+                self.risposta(risorsa, {}, 'json', *self.prepara(risorsa, {}, 'json'))
+                pronte += 1
+            except Exception:
+                pass
+        return pronte
+
+
+# ============================================================================
+# SERVER HTTP
+# ============================================================================
+class GestoreRichieste(BaseHTTPRequestHandler):
+    """GET /api/<risorsa>?<filtri> con ETag, gzip e CORS per il front-end"""
+
+    servizio = None
+    protocol_version = 'HTTP/1.1'
+
+    def _invia(self, codice, tipo=None, corpo=b'', intestazioni=()):
+        self.send_response(codice)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for nome, valore in intestazioni:
+            self.send_header(nome, valore)
+        if tipo:
+            self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if corpo and self.command != 'HEAD':
+            self.wfile.write(corpo)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parametri = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        percorso = url.path.rstrip('/')
+        try:
+            if percorso == '/api/risorse':
+                corpo = _json_compatto({'risorse': sorted(RISORSE), 'arrow': PYARROW_AVAILABLE})
+                self._invia(200, 'application/json; charset=utf-8', corpo)
+                return
+            if not percorso.startswith('/api/'):
+                raise ErroreRichiesta(404, "percorso sconosciuto")
+
+            formato = parametri.pop('formato', None)
+            if formato is None:
+                formato = 'arrow' if TIPO_ARROW in self.headers.get('Accept', '') else 'json'
+            risorsa = percorso[len('/api/'):]
+            codifica = 'gzip' if 'gzip' in self.headers.get('Accept-Encoding', '') else 'identity'
+
+            # ETag (formato e codifica inclusi) prima del calcolo: una rivalidazione
+            # valida riceve 304 anche se la risposta non è più in cache
+            versione, dati = self.servizio.prepara(risorsa, parametri, formato)
+            etag = self.servizio.etag(versione, codifica)
+            intestazioni = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept, Accept-Encoding')]
+            if etag in self.headers.get('If-None-Match', ''):
+                self._invia(304, intestazioni=intestazioni)
+                return
+
+            tipo, corpo, compresso = self.servizio.risposta(risorsa, parametri, formato, versione, dati)
+            if compresso is not None and codifica == 'gzip':
+                intestazioni.append(('Content-Encoding', 'gzip'))
+                corpo = compresso
+            self._invia(200, tipo, corpo, intestazioni)
+        except ErroreRichiesta as errore:
+            self._invia(errore.codice, 'application/json; charset=utf-8', _json_compatto({'errore': str(errore)}))
+        except Exception as errore:
+            # Es. artefatto letto mentre la pipeline lo riscrive: risposta 500, connessione salva
+            corpo = _json_compatto({'errore': f"errore interno: {type(errore).__name__}: {errore}"})
+            self._invia(500, 'application/json; charset=utf-8', corpo)
+
+    do_HEAD = do_GET
+
+    def log_message(self, formato, *argomenti):
+        pass
+
+
+def avvia(host=HOST, porta=PORTA):
+    """Riscalda la cache e serve le richieste (un thread per connessione)"""
+    servizio = ServizioAggregati()
+    t0 = time.perf_counter()
+    pronte = servizio.riscalda()
+    print(f"   Cache riscaldata: {pronte}/{len(RISORSE)} risorse in {time.perf_counter() - t0:.1f}s")
+
+    GestoreRichieste.servizio = servizio
+    server = ThreadingHTTPServer((host, porta), GestoreRichieste)
+    server.daemon_threads = True
+    print(f"   API in ascolto su http://{host}:{porta}/api/risorse")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    print("=" * 60)
+    print("API AGGREGATI DASHBOARD FIGB")
+    print("=" * 60)
+
+    host, porta = HOST, PORTA
+    if '--host' in sys.argv:
+        host = sys.argv[sys.argv.index('--host') + 1]
+    if '--porta' in sys.argv:
+        porta = int(sys.argv[sys.argv.index('--porta') + 1])
+    avvia(host, porta)
+
+
+if __name__ == '__main__':
+    main()
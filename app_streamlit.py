@@ -10,8 +10,26 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import json
-from pathlib import Path
+from data_store import carica_dati_unificati
+from artefatti_dashboard import (
+    RESULTS_OPP, RESULTS_REC, RESULTS_AVZ, RESULTS_ATT, RESULTS_COMP, RESULTS_PRIO,
+    DECEDUTI_FILE, ARTEFATTI, mtime, leggi_artefatto, versione_dataset
+)
+from scoring_recuperabilita import (
+    PESI, SOGLIE_PRIORITA, COLONNE_COMPONENTI, COMPONENTI,
+    score_finale, classifica_priorita
+)
+from retention_associazioni import retention_annuale
+from indice_tesserati import IndiceTesserati, conta
+from ricerca_giocatori import IndiceRicerca
+from aggregazione_grafici import aggrega_grafico, MAX_CATEGORIE_X, ETICHETTA_ALTRI
+from cubo_filtri import (
+    MACRO_CATEGORIE, TIPI_TESSERA, CATEGORIA_TO_MACRO, costruisci_cubo, seleziona, aggrega, totali,
+    righe_filtrate, impronta_filtri
+)
+from transizioni_categorie import (
+    FILE_TRANSIZIONI, carica_transizioni, tensore_passo, aggrega_categorie, matrice
+)
 
 # Import mapping province (per analisi territoriale)
 try:
@@ -35,66 +53,401 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Paths
-BASE_DIR = Path(__file__).parent
-OUTPUT_DIR = BASE_DIR / 'output'
-RESULTS_DIR = OUTPUT_DIR / 'results_v2'
-RESULTS_CHURN = OUTPUT_DIR / 'results_churn'
-RESULTS_INNOV = OUTPUT_DIR / 'results_innovativi'
-RESULTS_PRED = OUTPUT_DIR / 'results_predittivi'
-
 # ============================================================================
 # CARICAMENTO DATI
 # ============================================================================
+# Ogni file è letto alla prima richiesta e tenuto in cache con la sua data di
+# modifica nella chiave: l'avvio paga solo ciò che serve alla pagina mostrata
+# e un file rigenerato dalla pipeline viene riletto al rerun successivo.
+# Le risorse pesanti (dataset, cubo, indici) tengono una sola versione
+# (max_entries=1): la nuova sostituisce la vecchia invece di accumularsi.
+@st.cache_data(show_spinner=False)
+def _leggi_artefatto(percorso, versione):
+    """Legge un CSV o un JSON (versione: data di modifica, solo chiave di cache)"""
+    return leggi_artefatto(percorso)
+
+def artefatto(nome):
+    """Artefatto dichiarato in ARTEFATTI, None se il file non esiste"""
+    percorso = ARTEFATTI[nome]
+    versione = mtime(percorso)
+    return None if versione is None else _leggi_artefatto(percorso, versione)
+
+@st.cache_resource(max_entries=1)
+def load_df(versione):
+    """
+    Dataset unificato, riletto solo se l'archivio cambia.
+    cache_resource: nessuna copia a ogni rerun, la dashboard non lo modifica.
+    """
+    return carica_dati_unificati()
+
+@st.cache_resource(max_entries=1)
+def load_cubo(col_assoc, versione):
+    """
+    Cubo di aggregazione per i filtri globali, costruito una volta sola.
+    cache_resource: il cubo è in sola lettura, nessuna copia a ogni rerun.
+    """
+    return costruisci_cubo(load_df(versione), col_assoc)
+
+@st.cache_resource(max_entries=1)
+def load_indice(versione):
+    """
+    Indice bitmap dei tesserati per anno, tipo tessera e regione (sola lettura):
+    conteggi distinti e coorti senza passare dalle righe.
+    """
+    return IndiceTesserati(load_df(versione), dimensioni=['MbtDesc', 'GrpArea'])
+
+@st.cache_resource(max_entries=1)
+def load_ricerca(col_assoc, versione):
+    """Indice di ricerca dei giocatori (nomi, codici, carriera), costruito una volta sola"""
+    return IndiceRicerca(load_df(versione), col_assoc)
+
+@st.cache_resource(max_entries=1)
+def load_transizioni(versione, versione_file):
+    """
+    Tensore precalcolato delle transizioni (passo, anno, regione, da, a):
+    ogni vista è una somma su poche celle, senza toccare le righe.
+    """
+    return carica_transizioni(load_df(versione))
+
+@st.cache_resource(max_entries=1)
+def load_deceduti(versione, versione_df):
+    """
+    Registro dei deceduti: tabella Excel e bitmap sugli id dell'indice
+    tesserati. La data di modifica è nella chiave: il file viene riletto
+    solo quando cambia, non a ogni rerun.
+    """
+    if versione is None:
+        return None
+    tabella = pd.read_excel(DECEDUTI_FILE)
+    tabella['MmbCode'] = tabella['MmbCode'].astype(str).str.strip()
+    indice = load_indice(versione_df)
+    ids = indice.ids(tabella['MmbCode'])
+    # I codici assenti dal dataset restano in un piccolo array a parte
+    return {'tabella': tabella, 'indice': indice, 'bitmap': indice.bitmap(ids[ids >= 0]),
+            'esterni': tabella['MmbCode'].to_numpy()[ids < 0]}
+
+def escludi_deceduti(candidati, registro, col_codice='MmbCode'):
+    """
+    Toglie i deceduti da una lista di candidati (test sulla bitmap del
+    registro, senza ricostruire insiemi). Restituisce (lista, numero esclusi).
+    """
+    if registro is None or len(candidati) == 0:
+        return candidati, 0
+    codici = candidati[col_codice].astype(str).str.strip()
+    indice = registro['indice']
+    deceduti = indice.contiene(registro['bitmap'], codici)
+    if len(registro['esterni']) > 0:
+        ignoti = indice.ids(codici) < 0
+        deceduti[ignoti] = np.isin(codici.to_numpy()[ignoti], registro['esterni'])
+    return candidati[~deceduti], int(deceduti.sum())
+
 @st.cache_data
-def load_data():
-    """Carica tutti i dati necessari"""
-    data = {}
+def load_recuperabilita(versione, versione_deceduti, versione_df):
+    """
+    Carica l'output di 04_modello_recuperabilita e lo prepara per il what-if:
+    componenti positive come matrice (n x 5), health penalty ed età come
+    vettori, province/regioni codificate come interi per le aggregazioni.
+    I deceduti sono esclusi subito. Le versioni (date di modifica) sono solo
+    chiavi di cache.
+    """
+    df_rec = artefatto('recuperabili')
+    df_rec, _ = escludi_deceduti(df_rec, load_deceduti(versione_deceduti, versione_df))
+    df_rec = df_rec.reset_index(drop=True)
+
+    rec = {'df': df_rec}
+    rec['matrice'] = np.column_stack([
+        df_rec[COLONNE_COMPONENTI[c]].to_numpy(dtype=float) for c in COMPONENTI
+    ])
+    rec['health'] = df_rec['HealthPenalty'].to_numpy(dtype=float)
+    rec['eta'] = df_rec['EtaAttuale'].to_numpy(dtype=float)
+
+    # Aggregati indipendenti dai pesi (calcolati una volta sola)
+    for livello, col in [('prov', 'Provincia'), ('reg', 'Regione')]:
+        if col not in df_rec.columns:
+            continue
+        codici, etichette = pd.factorize(df_rec[col])
+        validi = codici >= 0
+        n = len(etichette)
+        conteggi = np.bincount(codici[validi], minlength=n)
+        base = pd.DataFrame({col: etichette, 'NumRecuperabili': conteggi})
+        for nome, sorgente in [('EtaMedia', 'EtaAttuale'), ('RischioSaluteMedio', 'HealthPenalty'),
+                               ('GareMedie', 'GareMedie')]:
+            valori = df_rec[sorgente].to_numpy(dtype=float)[validi]
+            non_nulli = ~np.isnan(valori)
+            somma = np.bincount(codici[validi][non_nulli], weights=valori[non_nulli], minlength=n)
+            base[nome] = somma / np.bincount(codici[validi][non_nulli], minlength=n)
+        rec[f'codici_{livello}'] = codici
+        rec[f'base_{livello}'] = base
+    return rec
+
+
+def ricalcola_recuperabilita(rec, pesi, soglie):
+    """
+    Ricalcola score, priorità e aggregati per provincia/regione con nuovi pesi e
+    soglie, partendo dalle componenti già in memoria (solo operazioni vettoriali).
+    """
+    score = score_finale(rec['matrice'], rec['health'], pesi)
+    priorita = classifica_priorita(score, rec['health'], rec['eta'], soglie)
+    alta = np.isin(priorita, ['1-URGENTE', '2-ALTA'])
+
+    df_rec = rec['df'].copy()
+    df_rec['RecoverabilityScore'] = score
+    df_rec['Priorita'] = priorita
+    df_rec = df_rec.sort_values('RecoverabilityScore', ascending=False)
+
+    aggregati = {}
+    for livello in ['prov', 'reg']:
+        if f'codici_{livello}' not in rec:
+            continue
+        codici = rec[f'codici_{livello}']
+        validi = codici >= 0
+        base = rec[f'base_{livello}'].copy()
+        n = len(base)
+        base['ScoreMedio'] = np.bincount(codici[validi], weights=score[validi], minlength=n) / base['NumRecuperabili']
+        base['AltaPriorita'] = np.bincount(codici[validi], weights=alta[validi], minlength=n)
+        aggregati[livello] = base.sort_values('NumRecuperabili', ascending=False, kind='stable')
+
+    summary = {
+        'totale_churned': len(df_rec),
+        'urgenti': int((priorita == '1-URGENTE').sum()),
+        'alta_priorita': int((priorita == '2-ALTA').sum()),
+        'score_medio': float(score.mean()) if len(score) else 0.0,
+        'eta_media': float(np.nanmean(rec['eta'])) if len(score) else 0.0,
+    }
+    return df_rec, aggregati.get('prov'), aggregati.get('reg'), summary
 
-    # Dati principali
-    data['df'] = pd.read_csv(OUTPUT_DIR / 'dati_unificati_2017_2025.csv')
-    data['df']['MmbCode'] = data['df']['MmbCode'].str.strip()
-    data['df']['MmbName'] = data['df']['MmbName'].str.strip()
 
-    # Metriche
-    with open(RESULTS_DIR / 'metriche_complete_v2.json', 'r') as f:
-        data['metriche'] = json.load(f)
+# ============================================================================
+# CALCOLI DI PAGINA (memoizzati per stato dei filtri)
+# ============================================================================
+# Funzioni pure di (impronta dei filtri e versione del dataset, parametri
+# di pagina): i rerun che cambiano solo la presentazione, o che tornano a
+# combinazioni di filtri già viste, non ricalcolano nulla. La cache è
+# condivisa tra le sessioni e limitata a MAX_VOCI_PAGINA voci per
+# funzione (LRU).
+MAX_VOCI_PAGINA = 32
+
+FASCE_ETA_PIRAMIDE = ['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+']
+
+
+def _fascia_eta_piramide(anni):
+    return pd.cut(anni, bins=[0, 30, 40, 50, 60, 70, 80, 150], labels=FASCE_ETA_PIRAMIDE)
+
+
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_trend_temporale(impronta, _cubo, _df, _selezione):
+    """Serie annuali (dal cubo) e tesserati per macro-categoria per anno"""
+    per_anno = aggrega(_cubo, _selezione, per=['Anno'])
+    df_cat = righe_filtrate(_df[['Anno', 'CatLabel']], _cubo, _selezione)
+
+    def macro_categoria(cat):
+        if pd.isna(cat):
+            return 'NC'
+        cat = str(cat)
+        if cat.startswith('1'):
+            return '1a Categoria'
+        elif cat.startswith('2'):
+            return '2a Categoria'
+        elif cat.startswith('3'):
+            return '3a Categoria'
+        elif cat.startswith('4'):
+            return '4a Categoria'
+        elif cat in ['NC', 'Ordinario Sportivo']:
+            return 'Non Classificati'
+        elif cat.startswith('H') or cat in ['GM', 'LM', 'MS']:
+            return 'Onorarie/Speciali'
+        else:
+            return 'Altro'
+
+    df_cat = df_cat.assign(MacroCategoria=df_cat['CatLabel'].apply(macro_categoria))
+    cat_trend = df_cat.groupby(['Anno', 'MacroCategoria']).size().reset_index(name='Count')
+    return per_anno, cat_trend
+
+
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_piramide_categorie(impronta, anno_sel, fascia_sel, _cubo, _df, _selezione):
+    """Conteggi per CatLabel dell'anno scelto, eventualmente per una fascia d'età"""
+    df_anno = righe_filtrate(_df[['CatLabel', 'Anni']], _cubo, _selezione & seleziona(_cubo, anni=[anno_sel]))
+    if fascia_sel != 'Tutte':
+        df_anno = df_anno[_fascia_eta_piramide(df_anno['Anni']) == fascia_sel]
+    return df_anno['CatLabel'].value_counts()
+
+
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_diagnosi_fasce(impronta, anno_sel, _cubo, _df, _selezione):
+    """Quota di NC e di categorie alte per fascia d'età nell'anno scelto"""
+    df_diag = righe_filtrate(_df[['CatLabel', 'Anni']], _cubo, _selezione & seleziona(_cubo, anni=[anno_sel])).copy()
+    df_diag['FasciaEta'] = _fascia_eta_piramide(df_diag['Anni'])
+
+    def calc_macro(cat):
+        if pd.isna(cat) or cat in ['NC', 'Ordinario Sportivo']:
+            return 'NC'
+        cat = str(cat)
+        if cat.startswith('1'):
+            return '1a'
+        elif cat.startswith('H') or cat in ['MS', 'LM', 'GM']:
+            return 'Top'
+        else:
+            return 'Medio'
+
+    df_diag['Livello'] = df_diag['CatLabel'].apply(calc_macro)
+
+    # Analisi per fascia
+    analisi_fasce = []
+    for fascia in FASCE_ETA_PIRAMIDE:
+        df_f = df_diag[df_diag['FasciaEta'] == fascia]
+        tot = len(df_f)
+        if tot == 0:
+            continue
+
+        nc = (df_f['Livello'] == 'NC').sum()
+        top = (df_f['Livello'].isin(['1a', 'Top'])).sum()
+
+        nc_pct = nc / tot * 100
+        top_pct = top / tot * 100
+
+        # Diagnosi
+        if nc_pct > 40:
+            stato = "🟢 Sana"
+            problema = "Nessuno"
+        elif nc_pct > 30:
+            stato = "🟡 Compressa"
+            problema = "Ricambio lento"
+        else:
+            stato = "🔴 Invertita"
+            problema = "No ricambio"
+
+        analisi_fasce.append({
+            'Fascia': fascia,
+            'Giocatori': tot,
+            'NC%': nc_pct,
+            'Top%': top_pct,
+            'Stato': stato,
+            'Problema': problema
+        })
+
+    return pd.DataFrame(analisi_fasce)
+
+
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_regioni(impronta, _cubo, _selezione):
+    """Tesserati, gare medie ed età media per regione (dal cubo)"""
+    regioni_df = aggrega(_cubo, _selezione, per=['GrpArea'])[['GrpArea', 'Giocatori', 'MediaGareGiocate', 'MediaAnni']]
+    regioni_df.columns = ['Codice', 'Tesserati', 'Gare Medie', 'Età Media']
+    regioni_df['Regione'] = regioni_df['Codice'].map(NOMI_REGIONI_COMPLETI).fillna(regioni_df['Codice'])
+    regioni_df['Macroregione'] = regioni_df['Codice'].map(REGIONE_TO_MACRO).fillna('Altro')
+    return regioni_df
+
+
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_associazioni(impronta, anni, col_assoc, _cubo, _df, _selezione):
+    """
+    Retention/churn medi anno su anno per associazione (None se non calcolabili)
+    e tabella di esplorazione delle associazioni.
+    """
+    df_filtered = righe_filtrate(_df[['Anno', 'MmbCode', 'GrpArea', 'GareGiocate', 'Anni', col_assoc]], _cubo, _selezione)
+
+    assoc_retention = None
+    retention_df = None
+    if len(df_filtered) > 0 and len(anni) >= 2:
+        # Retention anno su anno (tutte le coppie anno -> anno+1 in una passata)
+        retention_df = retention_annuale(df_filtered, col_assoc)
+        retention_df = retention_df[retention_df['Tesserati'] >= 5].rename(columns={col_assoc: 'Associazione'})
+
+    if retention_df is not None and len(retention_df) > 0:
+        # Aggrega per associazione (media retention)
+        assoc_retention = retention_df.groupby('Associazione').agg({
+            'Tesserati': 'mean',
+            'TassoRetention': 'mean'
+        }).reset_index()
+        assoc_retention.columns = ['Associazione', 'TesseratiMedi', 'TassoRetention']
+        assoc_retention['TassoChurn'] = 100 - assoc_retention['TassoRetention']
+        assoc_retention['TassoRetention'] = assoc_retention['TassoRetention'].round(1)
+        assoc_retention['TassoChurn'] = assoc_retention['TassoChurn'].round(1)
+        assoc_retention['TesseratiMedi'] = assoc_retention['TesseratiMedi'].round(0).astype(int)
+
+        # Aggiungi regione
+        regione_map = df_filtered.groupby(col_assoc)['GrpArea'].first().to_dict()
+        assoc_retention['Regione'] = assoc_retention['Associazione'].map(regione_map)
+
+    associazioni_df = df_filtered.groupby([col_assoc, 'GrpArea']).agg({
+        'MmbCode': 'nunique',
+        'GareGiocate': 'mean',
+        'Anni': 'mean'
+    }).reset_index()
+    associazioni_df.columns = ['Associazione', 'Regione', 'Tesserati', 'Gare Medie', 'Età Media']
+    associazioni_df['Gare Medie'] = associazioni_df['Gare Medie'].round(1)
+    associazioni_df['Età Media'] = associazioni_df['Età Media'].round(1)
+    associazioni_df = associazioni_df.sort_values('Tesserati', ascending=False)
+    return assoc_retention, associazioni_df
+
+
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_classifica_agonismo(impronta, anno, _df_filtered, n_top=20):
+    """
+    Agonisti dell'anno: aggregati per regione, PuntiCampionati di ogni regione
+    ordinati decrescenti con somme cumulate (vedi media_top_x) e i primi
+    n_top giocatori della classifica nazionale.
+    """
+    df_anno = _df_filtered[(_df_filtered['Anno'] == anno) & (_df_filtered['MbtDesc'] == 'Agonista')]
+
+    regioni = df_anno.groupby('GrpArea').agg({
+        'MmbCode': 'nunique',
+        'PuntiCampionati': ['sum', 'mean']
+    }).reset_index()
+    regioni.columns = ['Codice', 'Agonisti', 'PuntiTotali', 'PuntiMedi']
+
+    # Punti non nulli ordinati per regione (nell'ordine di regioni) e decrescenti
+    codici = pd.Categorical(df_anno['GrpArea'], categories=regioni['Codice']).codes
+    punti = df_anno['PuntiCampionati'].to_numpy(dtype=float)
+    validi = (codici >= 0) & ~np.isnan(punti)
+    codici, punti = codici[validi], punti[validi]
+    punti = punti[np.lexsort((-punti, codici))]
+    conteggi = np.bincount(codici, minlength=len(regioni))
+
+    agonisti = df_anno.groupby(['MmbCode', 'MmbName', 'GrpArea']).agg({
+        'PuntiCampionati': 'sum',
+        'GareGiocate': 'sum',
+        'Anni': 'first'
+    }).reset_index().nlargest(n_top, 'PuntiCampionati')
 
-    # Regioni
-    data['regioni'] = pd.read_csv(RESULTS_DIR / 'regioni_summary.csv')
+    return {
+        'regioni': regioni,
+        'puntatori': np.concatenate([[0], np.cumsum(conteggi)]),
+        'cumulate': np.concatenate([[0.0], np.cumsum(punti)]),
+        'agonisti': agonisti,
+    }
 
-    # Associazioni
-    data['associazioni_v'] = pd.read_csv(RESULTS_DIR / 'circoli_virtuosi.csv')
-    data['associazioni_c'] = pd.read_csv(RESULTS_DIR / 'circoli_critici.csv')
 
-    # Churn
-    data['cluster_churn'] = pd.read_csv(RESULTS_CHURN / 'cluster_churn_profili.csv')
-    data['soglie'] = pd.read_csv(RESULTS_CHURN / 'soglie_critiche_churn.csv')
-    data['churn_macro'] = pd.read_csv(RESULTS_CHURN / 'churn_per_macroregione.csv')
+def media_top_x(classifica, x):
+    """
+    Media dei migliori x PuntiCampionati di ogni regione ("Tutti" = media di
+    tutti): differenza di due somme cumulate, senza riordinare nulla.
+    Le regioni senza punti valgono 0 (NaN con "Tutti"), come nlargest/mean.
+    """
+    puntatori, cumulate = classifica['puntatori'], classifica['cumulate']
+    n = np.diff(puntatori)
+    k = n if x == "Tutti" else np.minimum(n, x)
+    somme = cumulate[puntatori[:-1] + k] - cumulate[puntatori[:-1]]
+    vuote = np.nan if x == "Tutti" else 0.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(k > 0, somme / np.maximum(k, 1), vuote)
 
-    # Rischio reale
-    if (RESULTS_INNOV / 'giocatori_rischio_REALE.csv').exists():
-        data['rischio'] = pd.read_csv(RESULTS_INNOV / 'giocatori_rischio_REALE.csv')
 
-    # Predittivo
-    if RESULTS_PRED.exists():
-        data['proiezioni'] = pd.read_csv(RESULTS_PRED / 'proiezioni_2025_2035.csv')
-        with open(RESULTS_PRED / 'rischi_strutturali.json', 'r') as f:
-            data['rischi_pred'] = json.load(f)
+@st.cache_data(max_entries=MAX_VOCI_PAGINA)
+def calcola_grafico(impronta, x, y, colore, max_x, _df_filtered):
+    """Tabella compatta del costruttore di grafici (top-N + Altri, intervalli)"""
+    return aggrega_grafico(_df_filtered, x, y, colore, max_x=max_x)
 
-    return data
 
 # Carica dati
-data = load_data()
-df = data['df']
-metriche = data['metriche']
+versione_df = versione_dataset()
+df = load_df(versione_df)
+metriche = artefatto('metriche')
 
-# Carica deceduti (se disponibile)
-deceduti_file = BASE_DIR / 'Deceduti.xlsx'
-deceduti_df = None
-if deceduti_file.exists():
-    deceduti_df = pd.read_excel(deceduti_file)
-    deceduti_df['MmbCode'] = deceduti_df['MmbCode'].str.strip()
+# Registro deceduti (se disponibile), riletto solo se il file cambia
+registro_deceduti = load_deceduti(mtime(DECEDUTI_FILE), versione_df)
+deceduti_df = registro_deceduti['tabella'] if registro_deceduti is not None else None
 
 # ============================================================================
 # SIDEBAR - FILTRI
@@ -106,7 +459,7 @@ st.sidebar.markdown("---")
 pagina = st.sidebar.selectbox(
     "📊 Sezione",
     ["📊 Executive Summary", "🏠 Overview", "📈 Trend Temporale", "🗺️ Analisi Regionale",
-     "📍 Analisi Territoriale", "🏆 Mappa Agonismo", "🏢 Analisi Associazioni",
+     "📍 Analisi Territoriale", "🏆 Mappa Agonismo", "🔀 Transizioni Categorie", "🏢 Analisi Associazioni",
      "🎓 Bridge a Scuola", "⚠️ Giocatori a Rischio", "🔄 Bridgisti Recuperabili",
      "🔮 Modello Predittivo", "🌱 Opportunità Crescita", "🔬 Analisi Avanzate",
      "🎯 Attività per Età/Sesso", "🧩 Cluster e Territori", "🎖️ Priorità Intervento", "🔍 Esplora Dati"]
@@ -186,57 +539,43 @@ eta_min, eta_max = st.sidebar.slider(
     (18, 100)
 )
 
-# Filtro Macrocategoria
-MACRO_CATEGORIE = {
-    'Master/GM': ['GM', 'LM', 'MS'],
-    'Honor': ['HK', 'HA', 'HQ', 'HJ'],
-    '1a Categoria': ['1P', '1F', '1C', '1Q'],
-    '2a Categoria': ['2P', '2F', '2C', '2Q'],
-    '3a Categoria': ['3P', '3F', '3C', '3Q'],
-    '4a Categoria': ['4P', '4F', '4C', '4Q'],
-    'NC': ['NC', 'Ordinario Sportivo']
-}
+# Filtro Macrocategoria (MACRO_CATEGORIE in cubo_filtri)
 macro_cat_options = ["Tutte"] + list(MACRO_CATEGORIE.keys())
 macro_cat_sel = st.sidebar.selectbox("Macrocategoria", macro_cat_options, index=0)
 
-# Filtro Tipo Tessera (include BAS)
-TIPI_TESSERA = {
-    'Agonista': ['Agonista'],
-    'Scuola Bridge': ['Scuola Bridge'],
-    'BAS (Bridge a Scuola)': ['Ist.Scolastici', 'Studente CAS', 'CAS Giovanile'],
-    'Ordinario Sportivo': ['Ordinario Sportivo'],
-    'Ordinario Amatoriale': ['Ordinario Amatoriale'],
-    'Non Agonista': ['Non Agonista'],
-    'Altro': ['Aderente', 'Normale', 'Promozionale', 'Estero']
-}
+# Filtro Tipo Tessera, include BAS (TIPI_TESSERA in cubo_filtri)
 tipo_tessera_options = ["Tutti"] + list(TIPI_TESSERA.keys())
 tipo_tessera_sel = st.sidebar.selectbox("Tipo Tessera", tipo_tessera_options, index=0)
 
-# Applica filtri
-df_filtered = df[
-    (df['Anno'].isin(anni_selezionati)) &
-    (df['GrpArea'].isin(regioni_selezionate)) &
-    (df['Anni'] >= eta_min) &
-    (df['Anni'] <= eta_max)
-]
-
-# Applica filtro macrocategoria
-if macro_cat_sel != "Tutte":
-    cat_valide = MACRO_CATEGORIE[macro_cat_sel]
-    df_filtered = df_filtered[df_filtered['CatLabel'].isin(cat_valide)]
-
-# Applica filtro tipo tessera
-if tipo_tessera_sel != "Tutti":
-    tipi_validi = TIPI_TESSERA[tipo_tessera_sel]
-    df_filtered = df_filtered[df_filtered['MbtDesc'].isin(tipi_validi)]
+# Applica filtri: maschera sulle celle del cubo, non sulle righe
+# Usa colonna Associazione se esiste, altrimenti GrpName
+col_assoc = 'Associazione' if 'Associazione' in df.columns else 'GrpName'
+cubo = load_cubo(col_assoc, versione_df)
+indice = load_indice(versione_df)
+filtri = dict(
+    anni=anni_selezionati,
+    regioni=regioni_selezionate,
+    eta=(eta_min, eta_max),
+    macro_categoria=None if macro_cat_sel == "Tutte" else macro_cat_sel,
+    tipo_tessera=None if tipo_tessera_sel == "Tutti" else tipo_tessera_sel
+)
+selezione = seleziona(cubo, **filtri)
+# Chiave delle cache di pagina: le funzioni calcola_* ricevono cubo, righe e
+# selezione come argomenti non hashati (prefisso _), quindi la chiave include
+# anche la versione del dataset (un archivio rigenerato invalida le voci)
+impronta = f"{impronta_filtri(**filtri)}|{versione_df}"
+totali_filtro = totali(cubo, selezione)
+
+# Righe grezze solo per le pagine con dettaglio per giocatore/associazione;
+# le altre usano gli aggregati del cubo
+PAGINE_DETTAGLIO = ["📍 Analisi Territoriale", "🏆 Mappa Agonismo", "🔍 Esplora Dati"]
+df_filtered = righe_filtrate(df, cubo, selezione) if pagina in PAGINE_DETTAGLIO else None
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 📊 Dati Filtrati")
-st.sidebar.metric("Record", f"{len(df_filtered):,}")
-st.sidebar.metric("Giocatori", f"{df_filtered['MmbCode'].nunique():,}")
-# Usa colonna Associazione se esiste, altrimenti GrpName
-col_assoc = 'Associazione' if 'Associazione' in df_filtered.columns else 'GrpName'
-st.sidebar.metric("Associazioni", f"{df_filtered[col_assoc].nunique():,}")
+st.sidebar.metric("Record", f"{totali_filtro['Record']:,}")
+st.sidebar.metric("Giocatori", f"{totali_filtro['Giocatori']:,}")
+st.sidebar.metric("Associazioni", f"{totali_filtro['Associazioni']:,}")
 
 # Riepilogo filtri attivi
 with st.sidebar.expander("🔍 Filtri attivi"):
@@ -263,12 +602,11 @@ if pagina == "📊 Executive Summary":
 
     # Calcoli KPI
     df_2025 = df[df['Anno'] == 2025]
-    df_2019 = df[df['Anno'] == 2019]
     df_2017 = df[df['Anno'] == 2017]
 
-    tess_2025 = df_2025['MmbCode'].nunique()
-    tess_2019 = df_2019['MmbCode'].nunique()
-    tess_2017 = df_2017['MmbCode'].nunique()
+    tess_2025 = conta(indice.insieme(2025))
+    tess_2019 = conta(indice.insieme(2019))
+    tess_2017 = conta(indice.insieme(2017))
 
     var_vs_2019 = (tess_2025 - tess_2019) / tess_2019 * 100
     var_vs_2017 = (tess_2025 - tess_2017) / tess_2017 * 100
@@ -376,17 +714,13 @@ if pagina == "📊 Executive Summary":
     st.header("3️⃣ Opportunità di Recupero Identificate")
 
     # Carica dati opportunità se disponibili
-    RESULTS_OPP = OUTPUT_DIR / 'results_opportunita'
-    RESULTS_PRIORITA = OUTPUT_DIR / 'results_priorita'
-
     opp_data = []
 
     # Quasi Agganciati
-    if (RESULTS_OPP / 'quasi_agganciati.csv').exists():
-        qa = pd.read_csv(RESULTS_OPP / 'quasi_agganciati.csv')
+    qa = artefatto('quasi_agganciati')
+    if qa is not None:
         # Filtra deceduti se disponibile
-        if deceduti_df is not None:
-            qa = qa[~qa['MmbCode'].str.strip().isin(set(deceduti_df['MmbCode'].str.strip()))]
+        qa, _ = escludi_deceduti(qa, registro_deceduti)
         opp_data.append({
             'Opportunità': '🎯 Quasi Agganciati',
             'Target': f"{len(qa):,} persone",
@@ -397,10 +731,9 @@ if pagina == "📊 Executive Summary":
         })
 
     # Persi COVID
-    if (RESULTS_OPP / 'persi_covid.csv').exists():
-        pc = pd.read_csv(RESULTS_OPP / 'persi_covid.csv')
-        if deceduti_df is not None:
-            pc = pc[~pc['MmbCode'].str.strip().isin(set(deceduti_df['MmbCode'].str.strip()))]
+    pc = artefatto('persi_covid')
+    if pc is not None:
+        pc, _ = escludi_deceduti(pc, registro_deceduti)
         alta_prio = len(pc[pc['Recuperabile'] == 'Alta Priorità']) if 'Recuperabile' in pc.columns else int(len(pc)*0.2)
         opp_data.append({
             'Opportunità': '😷 Persi COVID Recuperabili',
@@ -642,14 +975,16 @@ elif pagina == "🏠 Overview":
     # Metriche principali (dinamiche in base ai filtri)
     col1, col2, col3, col4 = st.columns(4)
 
-    # Calcola metriche sui dati filtrati
+    # Calcola metriche sui dati filtrati (dal cubo)
     # Tesserati dell'ultimo anno nel range selezionato
-    ultimo_anno = df_filtered['Anno'].max()
-    tesserati_ultimo_anno = df_filtered[df_filtered['Anno'] == ultimo_anno]['MmbCode'].nunique()
-    tesserati_totali_periodo = df_filtered['MmbCode'].nunique()
-    eta_media_filtrata = df_filtered['Anni'].mean()
-    under_40_pct = (df_filtered['Anni'] < 40).sum() / len(df_filtered) * 100 if len(df_filtered) > 0 else 0
-    gare_medie = df_filtered['GareGiocate'].mean()
+    per_anno = aggrega(cubo, selezione, per=['Anno'])
+    per_eta = aggrega(cubo, selezione, per=['Anni'])
+    ultimo_anno = per_anno['Anno'].max()
+    tesserati_ultimo_anno = int(per_anno.loc[per_anno['Anno'] == ultimo_anno, 'Giocatori'].sum())
+    tesserati_totali_periodo = totali_filtro['Giocatori']
+    eta_media_filtrata = totali_filtro['MediaAnni']
+    under_40_pct = per_eta.loc[per_eta['Anni'] < 40, 'Record'].sum() / totali_filtro['Record'] * 100 if totali_filtro['Record'] > 0 else 0
+    gare_medie = totali_filtro['MediaGareGiocate']
 
     with col1:
         st.metric(
@@ -687,8 +1022,7 @@ elif pagina == "🏠 Overview":
 
     with col1:
         st.subheader("📈 Trend Tesserati")
-        trend = df.groupby('Anno')['MmbCode'].nunique().reset_index()
-        trend.columns = ['Anno', 'Tesserati']
+        trend = indice.conta_per_anno().rename_axis('Anno').reset_index()
         fig = px.line(trend, x='Anno', y='Tesserati', markers=True)
         fig.update_layout(height=350)
         fig.update_xaxes(dtick=1)
@@ -696,26 +1030,21 @@ elif pagina == "🏠 Overview":
 
     with col2:
         st.subheader("👥 Piramide Età 2025")
-        # Usa solo dati 2025 (rispettando altri filtri globali)
-        df_2025 = df_filtered[df_filtered['Anno'] == 2025].copy()
-        if len(df_2025) > 0:
-            df_2025['FasciaEta'] = pd.cut(df_2025['Anni'],
-                                           bins=[0, 30, 40, 50, 60, 70, 80, 100],
-                                           labels=['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+'])
+        # Usa solo dati 2025 (rispettando altri filtri globali): celle del cubo per età e tipo
+        celle_2025 = aggrega(cubo, selezione & seleziona(cubo, anni=[2025]), per=['Anni', 'TipoTessera'])
+        if len(celle_2025) > 0:
+            celle_2025['FasciaEta'] = pd.cut(celle_2025['Anni'].astype(float),
+                                              bins=[0, 30, 40, 50, 60, 70, 80, 100],
+                                              labels=['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+'])
 
             # Categorizza per tipo: Scuola Bridge, Bridge a Scuola, Altri
-            def categorizza_tipo(mbt):
-                if mbt == 'Scuola Bridge':
-                    return 'Scuola Bridge'
-                elif mbt in ['Ist.Scolastici', 'Studente CAS', 'CAS Giovanile']:
-                    return 'Bridge a Scuola'
-                else:
-                    return 'Altri'
-
-            df_2025['TipoTessera'] = df_2025['MbtDesc'].apply(categorizza_tipo)
+            celle_2025['TipoTessera'] = celle_2025['TipoTessera'].map({
+                'Scuola Bridge': 'Scuola Bridge',
+                'BAS (Bridge a Scuola)': 'Bridge a Scuola'
+            }).fillna('Altri')
 
             # Aggrega per fascia età e tipo
-            eta_tipo = df_2025.groupby(['FasciaEta', 'TipoTessera']).size().reset_index(name='Count')
+            eta_tipo = celle_2025.groupby(['FasciaEta', 'TipoTessera'], observed=True)['Record'].sum().reset_index(name='Count')
 
             fig = px.bar(eta_tipo, x='FasciaEta', y='Count', color='TipoTessera',
                          barmode='stack',
@@ -770,8 +1099,8 @@ elif pagina == "📈 Trend Temporale":
 
     # Trend tesserati
     st.subheader("Evoluzione Tesserati")
-    trend = df_filtered.groupby('Anno')['MmbCode'].nunique().reset_index()
-    trend.columns = ['Anno', 'Tesserati']
+    per_anno, cat_trend = calcola_trend_temporale(impronta, cubo, df, selezione)
+    trend = per_anno[['Anno', 'Giocatori']].rename(columns={'Giocatori': 'Tesserati'})
 
     fig = px.area(trend, x='Anno', y='Tesserati',
                   title="Numero Tesserati per Anno")
@@ -785,31 +1114,6 @@ elif pagina == "📈 Trend Temporale":
 
     with col1:
         st.subheader("Distribuzione Categorie")
-        # Raggruppa categorie in macro-classi
-        df_cat = df_filtered.copy()
-
-        def macro_categoria(cat):
-            if pd.isna(cat):
-                return 'NC'
-            cat = str(cat)
-            if cat.startswith('1'):
-                return '1a Categoria'
-            elif cat.startswith('2'):
-                return '2a Categoria'
-            elif cat.startswith('3'):
-                return '3a Categoria'
-            elif cat.startswith('4'):
-                return '4a Categoria'
-            elif cat in ['NC', 'Ordinario Sportivo']:
-                return 'Non Classificati'
-            elif cat.startswith('H') or cat in ['GM', 'LM', 'MS']:
-                return 'Onorarie/Speciali'
-            else:
-                return 'Altro'
-
-        df_cat['MacroCategoria'] = df_cat['CatLabel'].apply(macro_categoria)
-        cat_trend = df_cat.groupby(['Anno', 'MacroCategoria']).size().reset_index(name='Count')
-
         # Ordine logico
         cat_order = ['Non Classificati', '1a Categoria', '2a Categoria', '3a Categoria', '4a Categoria', 'Onorarie/Speciali', 'Altro']
         cat_trend['MacroCategoria'] = pd.Categorical(cat_trend['MacroCategoria'], categories=cat_order, ordered=True)
@@ -831,7 +1135,7 @@ elif pagina == "📈 Trend Temporale":
 
     with col2:
         st.subheader("Età Media nel Tempo")
-        eta_trend = df_filtered.groupby('Anno')['Anni'].mean().reset_index()
+        eta_trend = per_anno[['Anno', 'MediaAnni']].rename(columns={'MediaAnni': 'Anni'})
         fig = px.line(eta_trend, x='Anno', y='Anni', markers=True,
                       title="Evoluzione Età Media")
         fig.add_hline(y=70, line_dash="dash", line_color="red",
@@ -841,7 +1145,7 @@ elif pagina == "📈 Trend Temporale":
 
     # Gare medie
     st.subheader("Partecipazione Gare")
-    gare_trend = df_filtered.groupby('Anno')['GareGiocate'].mean().reset_index()
+    gare_trend = per_anno[['Anno', 'MediaGareGiocate']].rename(columns={'MediaGareGiocate': 'GareGiocate'})
     fig = px.bar(gare_trend, x='Anno', y='GareGiocate',
                  title="Gare Medie per Anno", color='GareGiocate',
                  color_continuous_scale='Viridis')
@@ -876,25 +1180,15 @@ elif pagina == "📈 Trend Temporale":
     col_filtro1, col_filtro2 = st.columns(2)
 
     with col_filtro1:
-        anni_disponibili = sorted(df_filtered['Anno'].unique())
+        anni_disponibili = sorted(per_anno['Anno'].tolist())
         anno_sel = st.select_slider("Seleziona anno:", options=anni_disponibili, value=anni_disponibili[-1])
 
     with col_filtro2:
         fasce_eta = ['Tutte', '<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+']
         fascia_sel = st.selectbox("Filtra per classe d'età:", fasce_eta)
 
-    # Filtra per anno selezionato
-    df_anno = df_filtered[df_filtered['Anno'] == anno_sel].copy()
-
-    # Applica filtro età se selezionato
-    if fascia_sel != 'Tutte':
-        df_anno['FasciaEta'] = pd.cut(df_anno['Anni'],
-                                       bins=[0, 30, 40, 50, 60, 70, 80, 150],
-                                       labels=['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+'])
-        df_anno = df_anno[df_anno['FasciaEta'] == fascia_sel]
-
-    # Conta per categoria
-    cat_counts = df_anno['CatLabel'].value_counts()
+    # Conta per categoria (anno selezionato ed eventuale classe d'età)
+    cat_counts = calcola_piramide_categorie(impronta, anno_sel, fascia_sel, cubo, df, selezione)
 
     # Prepara dati per il grafico (solo categorie con giocatori)
     piramide_data = []
@@ -1011,59 +1305,7 @@ elif pagina == "📈 Trend Temporale":
         st.subheader("🔬 Diagnosi Strutturale per Fascia d'Età")
 
         # Calcola statistiche per tutte le fasce
-        df_diag = df_filtered[df_filtered['Anno'] == anno_sel].copy()
-        df_diag['FasciaEta'] = pd.cut(df_diag['Anni'],
-                                       bins=[0, 30, 40, 50, 60, 70, 80, 150],
-                                       labels=['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+'])
-
-        def calc_macro(cat):
-            if pd.isna(cat) or cat in ['NC', 'Ordinario Sportivo']:
-                return 'NC'
-            cat = str(cat)
-            if cat.startswith('1'):
-                return '1a'
-            elif cat.startswith('H') or cat in ['MS', 'LM', 'GM']:
-                return 'Top'
-            else:
-                return 'Medio'
-
-        df_diag['Livello'] = df_diag['CatLabel'].apply(calc_macro)
-
-        # Analisi per fascia
-        analisi_fasce = []
-        for fascia in ['<30', '30-39', '40-49', '50-59', '60-69', '70-79', '80+']:
-            df_f = df_diag[df_diag['FasciaEta'] == fascia]
-            tot = len(df_f)
-            if tot == 0:
-                continue
-
-            nc = (df_f['Livello'] == 'NC').sum()
-            top = (df_f['Livello'].isin(['1a', 'Top'])).sum()
-
-            nc_pct = nc / tot * 100
-            top_pct = top / tot * 100
-
-            # Diagnosi
-            if nc_pct > 40:
-                stato = "🟢 Sana"
-                problema = "Nessuno"
-            elif nc_pct > 30:
-                stato = "🟡 Compressa"
-                problema = "Ricambio lento"
-            else:
-                stato = "🔴 Invertita"
-                problema = "No ricambio"
-
-            analisi_fasce.append({
-                'Fascia': fascia,
-                'Giocatori': tot,
-                'NC%': nc_pct,
-                'Top%': top_pct,
-                'Stato': stato,
-                'Problema': problema
-            })
-
-        analisi_df = pd.DataFrame(analisi_fasce)
+        analisi_df = calcola_diagnosi_fasce(impronta, anno_sel, cubo, df, selezione)
 
         # Visualizzazione tabella
         st.dataframe(
@@ -1162,14 +1404,7 @@ elif pagina == "🗺️ Analisi Regionale":
         st.info(f"📍 Visualizzazione filtrata: **{macro_sel}** ({len(regioni_selezionate)} regioni)")
 
     # Calcola dati per regione
-    regioni_df = df_filtered.groupby('GrpArea').agg({
-        'MmbCode': 'nunique',
-        'GareGiocate': 'mean',
-        'Anni': 'mean'
-    }).reset_index()
-    regioni_df.columns = ['Codice', 'Tesserati', 'Gare Medie', 'Età Media']
-    regioni_df['Regione'] = regioni_df['Codice'].map(NOMI_REGIONI_COMPLETI).fillna(regioni_df['Codice'])
-    regioni_df['Macroregione'] = regioni_df['Codice'].map(REGIONE_TO_MACRO).fillna('Altro')
+    regioni_df = calcola_regioni(impronta, cubo, selezione)
 
     # Statistiche per macroregione
     st.subheader("📊 Riepilogo per Macroregione")
@@ -1223,7 +1458,7 @@ elif pagina == "🗺️ Analisi Regionale":
     st.markdown("---")
     st.subheader("⚠️ Churn per Macroregione")
 
-    churn_macro = data['churn_macro']
+    churn_macro = artefatto('churn_macro')
     churn_macro = churn_macro[~churn_macro['Macroregione'].isin(['Altro', 'Nazionale', ''])]
 
     col1, col2 = st.columns([2, 1])
@@ -1973,29 +2208,11 @@ elif pagina == "🏆 Mappa Agonismo":
     with col_filtri2:
         top_x = st.selectbox("Top X giocatori per media", [10, 20, 50, 100, 200, 500, "Tutti"], index=6)
 
-    # Usa dati già filtrati dalla sidebar + filtro anno e tessera Agonista
-    df_anno = df_filtered[(df_filtered['Anno'] == anno_mappa) & (df_filtered['MbtDesc'] == 'Agonista')]
-
-    # Funzione per calcolare media top X per regione
-    def calcola_media_top_x(group, x):
-        if x == "Tutti":
-            return group['PuntiCampionati'].mean()
-        top = group.nlargest(min(x, len(group)), 'PuntiCampionati')
-        return top['PuntiCampionati'].mean() if len(top) > 0 else 0
-
-    # Aggrega per regione
-    mappa_data = df_anno.groupby('GrpArea').agg({
-        'MmbCode': 'nunique',
-        'PuntiCampionati': ['sum', 'mean']
-    }).reset_index()
-    mappa_data.columns = ['Codice', 'Agonisti', 'PuntiTotali', 'PuntiMedi']
-
-    # Calcola media Top X
-    media_top_x = df_anno.groupby('GrpArea').apply(
-        lambda g: calcola_media_top_x(g, top_x)
-    ).reset_index()
-    media_top_x.columns = ['Codice', 'MediaTopX']
-    mappa_data = mappa_data.merge(media_top_x, on='Codice')
+    # Classifica degli agonisti dell'anno (dati filtrati dalla sidebar), calcolata
+    # una volta per anno e filtri: cambiare Top X è solo una lettura
+    classifica = calcola_classifica_agonismo(impronta, anno_mappa, df_filtered)
+    mappa_data = classifica['regioni'].copy()
+    mappa_data['MediaTopX'] = media_top_x(classifica, top_x)
 
     mappa_data['Regione'] = mappa_data['Codice'].map(REGIONI_GEOJSON)
     mappa_data = mappa_data.dropna(subset=['Regione'])
@@ -2101,13 +2318,8 @@ elif pagina == "🏆 Mappa Agonismo":
     st.markdown("---")
     st.subheader("🥇 Top 20 Agonisti per Punti Campionati")
 
-    top_agonisti = df_anno.groupby(['MmbCode', 'MmbName', 'GrpArea']).agg({
-        'PuntiCampionati': 'sum',
-        'GareGiocate': 'sum',
-        'Anni': 'first'
-    }).reset_index()
+    top_agonisti = classifica['agonisti'].copy()
     top_agonisti['Regione'] = top_agonisti['GrpArea'].map(REGIONI_GEOJSON)
-    top_agonisti = top_agonisti.nlargest(20, 'PuntiCampionati')
     top_agonisti = top_agonisti[['MmbName', 'Regione', 'PuntiCampionati', 'GareGiocate', 'Anni']]
     top_agonisti.columns = ['Nome', 'Regione', 'Punti Campionati', 'Gare', 'Età']
 
@@ -2116,6 +2328,110 @@ elif pagina == "🏆 Mappa Agonismo":
         use_container_width=True
     )
 
+# ============================================================================
+# PAGINA: TRANSIZIONI CATEGORIE
+# ============================================================================
+elif pagina == "🔀 Transizioni Categorie":
+    st.title("🔀 Transizioni tra Categorie")
+    st.markdown("Come si spostano tra le categorie i giocatori tesserati in entrambi gli anni confrontati")
+
+    transizioni = load_transizioni(versione_df, mtime(FILE_TRANSIZIONI))
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        confronto = st.radio("Confronto", ["Anni consecutivi del periodo", "Coppia di anni"])
+    with col2:
+        dettaglio_trans = st.radio("Dettaglio", ["Macrocategoria", "Sottocategoria"])
+    with col3:
+        solo_cambi = st.checkbox("Flussi: solo cambi di categoria", value=True)
+        min_flusso = st.number_input("Flussi: giocatori minimi", min_value=1, value=5, step=1)
+
+    # Anni di partenza del tensore e passo: tutto il resto è una somma di celle
+    if confronto == "Anni consecutivi del periodo":
+        passo = 1
+        anni_partenza = [a for a in anni_selezionati[:-1] if a in transizioni['anni']]
+        etichetta_da, etichetta_a = "Anno N", "Anno N+1"
+    else:
+        anno_da, anno_a = st.select_slider(
+            "Anni confrontati", options=anni_selezionati,
+            value=(anni_selezionati[0], anni_selezionati[-1])
+        )
+        passo = anno_a - anno_da
+        anni_partenza = [anno_da] if passo > 0 else []
+        etichetta_da, etichetta_a = str(anno_da), str(anno_a)
+
+    st.caption("Filtri applicati: periodo, area geografica (regione nell'anno di partenza) e "
+               "macrocategoria (categoria di partenza). Età e tipo tessera non si applicano a questa vista.")
+
+    if not anni_partenza:
+        st.info("Seleziona un periodo di almeno due anni per vedere le transizioni.")
+    else:
+        tensore = tensore_passo(transizioni, passo)
+        if dettaglio_trans == "Macrocategoria":
+            tensore = aggrega_categorie(tensore, CATEGORIA_TO_MACRO, list(MACRO_CATEGORIE)[::-1])
+        conteggi = matrice(tensore, anno=anni_partenza, gruppo=regioni_selezionate)
+
+        # Macrocategoria della sidebar: solo le righe (categorie di partenza) selezionate
+        if macro_cat_sel != "Tutte":
+            ammesse = [macro_cat_sel] if dettaglio_trans == "Macrocategoria" else MACRO_CATEGORIE[macro_cat_sel]
+            conteggi = conteggi.loc[conteggi.index.isin(ammesse)]
+        conteggi = conteggi.loc[conteggi.sum(axis=1) > 0, conteggi.sum(axis=0) > 0]
+
+        if conteggi.empty:
+            st.warning("Nessuna transizione per i filtri selezionati.")
+        else:
+            totale_trans = int(conteggi.to_numpy().sum())
+            stabili = sum(int(conteggi.at[c, c]) for c in conteggi.index if c in conteggi.columns)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Transizioni", f"{totale_trans:,}")
+            with col2:
+                st.metric("Stessa categoria", f"{stabili / totale_trans * 100:.1f}%")
+            with col3:
+                st.metric("Cambio categoria", f"{(totale_trans - stabili) / totale_trans * 100:.1f}%")
+
+            st.markdown("---")
+
+            # Heatmap: quote per riga (dove finiscono i giocatori di ogni categoria)
+            st.subheader("📊 Matrice di transizione (% per categoria di partenza)")
+            quote = conteggi.div(conteggi.sum(axis=1), axis=0) * 100
+            fig = px.imshow(
+                quote.round(1), text_auto='.1f', aspect='auto', color_continuous_scale='YlOrRd',
+                labels={'x': f"Categoria {etichetta_a}", 'y': f"Categoria {etichetta_da}", 'color': '%'}
+            )
+            fig.update_layout(height=max(400, 28 * len(quote)))
+            st.plotly_chart(fig, use_container_width=True)
+
+            # Sankey: nodi a sinistra le categorie di partenza, a destra quelle di arrivo
+            st.subheader("🔀 Flussi tra categorie")
+            flussi = conteggi.stack().rename('Giocatori').reset_index()
+            if solo_cambi:
+                flussi = flussi[flussi['Da'] != flussi['A']]
+            flussi = flussi[flussi['Giocatori'] >= min_flusso]
+
+            if flussi.empty:
+                st.info("Nessun flusso sopra la soglia indicata.")
+            else:
+                origini = [c for c in conteggi.index if c in set(flussi['Da'])]
+                arrivi = [c for c in conteggi.columns if c in set(flussi['A'])]
+                fig = go.Figure(go.Sankey(
+                    node=dict(
+                        label=[f"{c} ({etichetta_da})" for c in origini] + [f"{c} ({etichetta_a})" for c in arrivi],
+                        pad=15, thickness=15
+                    ),
+                    link=dict(
+                        source=flussi['Da'].map({c: i for i, c in enumerate(origini)}).tolist(),
+                        target=flussi['A'].map({c: len(origini) + i for i, c in enumerate(arrivi)}).tolist(),
+                        value=flussi['Giocatori'].tolist()
+                    )
+                ))
+                fig.update_layout(height=max(400, 30 * max(len(origini), len(arrivi))))
+                st.plotly_chart(fig, use_container_width=True)
+
+            with st.expander("📋 Conteggi"):
+                st.dataframe(conteggi, use_container_width=True)
+
 # ============================================================================
 # PAGINA: ANALISI CIRCOLI
 # ============================================================================
@@ -2123,57 +2439,19 @@ elif pagina == "🏢 Analisi Associazioni":
     st.title("🏢 Analisi Associazioni")
 
     # Mostra filtri attivi
-    if len(regioni_selezionate) < len(df['GrpArea'].unique()) or anni_range != (anni_min, anni_max):
+    if len(regioni_selezionate) < len(cubo['etichette']['GrpArea']) or anni_range != (anni_min, anni_max):
         st.info(f"🔍 Filtri attivi: {len(regioni_selezionate)} regioni, anni {anni_range[0]}-{anni_range[1]}")
 
     # =========================================================================
     # CALCOLO METRICHE ASSOCIAZIONI DAI DATI FILTRATI
     # =========================================================================
-    col_assoc = 'Associazione' if 'Associazione' in df_filtered.columns else 'GrpName'
+    assoc_retention, associazioni_df = calcola_associazioni(
+        impronta, tuple(anni_selezionati), col_assoc, cubo, df, selezione
+    )
 
     # Calcola retention/churn per associazione
-    if len(df_filtered) > 0 and len(anni_selezionati) >= 2:
-        # Calcola retention anno su anno
-        retention_data = []
-        for anno in anni_selezionati[:-1]:
-            anno_succ = anno + 1
-            if anno_succ in anni_selezionati:
-                # Tesserati anno corrente per associazione
-                tess_anno = df_filtered[df_filtered['Anno'] == anno].groupby(col_assoc)['MmbCode'].apply(set).to_dict()
-                # Tesserati anno successivo
-                tess_succ = df_filtered[df_filtered['Anno'] == anno_succ].groupby(col_assoc)['MmbCode'].apply(set).to_dict()
-
-                for assoc in tess_anno:
-                    if assoc in tess_succ:
-                        ritesserati = len(tess_anno[assoc] & tess_succ[assoc])
-                        totale = len(tess_anno[assoc])
-                        if totale >= 5:
-                            retention_data.append({
-                                'Associazione': assoc,
-                                'Anno': anno,
-                                'Tesserati': totale,
-                                'Ritesserati': ritesserati,
-                                'TassoRetention': ritesserati / totale * 100
-                            })
-
-        if retention_data:
-            retention_df = pd.DataFrame(retention_data)
-
-            # Aggrega per associazione (media retention)
-            assoc_retention = retention_df.groupby('Associazione').agg({
-                'Tesserati': 'mean',
-                'TassoRetention': 'mean'
-            }).reset_index()
-            assoc_retention.columns = ['Associazione', 'TesseratiMedi', 'TassoRetention']
-            assoc_retention['TassoChurn'] = 100 - assoc_retention['TassoRetention']
-            assoc_retention['TassoRetention'] = assoc_retention['TassoRetention'].round(1)
-            assoc_retention['TassoChurn'] = assoc_retention['TassoChurn'].round(1)
-            assoc_retention['TesseratiMedi'] = assoc_retention['TesseratiMedi'].round(0).astype(int)
-
-            # Aggiungi regione
-            regione_map = df_filtered.groupby(col_assoc)['GrpArea'].first().to_dict()
-            assoc_retention['Regione'] = assoc_retention['Associazione'].map(regione_map)
-
+    if totali_filtro['Record'] > 0 and len(anni_selezionati) >= 2:
+        if assoc_retention is not None:
             # Filtra associazioni con almeno 10 tesserati medi
             assoc_retention_filt = assoc_retention[assoc_retention['TesseratiMedi'] >= 10]
 
@@ -2233,16 +2511,6 @@ elif pagina == "🏢 Analisi Associazioni":
     st.markdown("---")
     st.subheader("🔍 Esplora Associazioni")
 
-    associazioni_df = df_filtered.groupby([col_assoc, 'GrpArea']).agg({
-        'MmbCode': 'nunique',
-        'GareGiocate': 'mean',
-        'Anni': 'mean'
-    }).reset_index()
-    associazioni_df.columns = ['Associazione', 'Regione', 'Tesserati', 'Gare Medie', 'Età Media']
-    associazioni_df['Gare Medie'] = associazioni_df['Gare Medie'].round(1)
-    associazioni_df['Età Media'] = associazioni_df['Età Media'].round(1)
-    associazioni_df = associazioni_df.sort_values('Tesserati', ascending=False)
-
     # Filtro per nome associazione
     search = st.text_input("🔍 Cerca associazione:", "", key="search_assoc_main")
     if search:
@@ -2296,8 +2564,8 @@ elif pagina == "🎓 Bridge a Scuola":
 
         # Identifica chi è diventato tesserato regolare (in tutto il dataset, non filtrato)
         tessere_regolari = ['Ordinario Sportivo', 'Agonista', 'Ordinario Amatoriale', 'Non Agonista']
-        regolari_members = set(df[df['MbtDesc'].isin(tessere_regolari)]['MmbCode'].unique())
-        corsisti_maturi['Convertito'] = corsisti_maturi['MmbCode'].isin(regolari_members)
+        regolari_members = indice.insieme(MbtDesc=tessere_regolari)
+        corsisti_maturi['Convertito'] = indice.contiene(regolari_members, corsisti_maturi['MmbCode'])
 
         # Calcola metriche
         n_corsisti = len(corsisti_maturi)
@@ -2605,14 +2873,15 @@ elif pagina == "🎓 Bridge a Scuola":
             ]
 
             if len(studenti_filtered) > 0:
-                n_studenti = studenti_filtered['MmbCode'].nunique()
-                studenti_set = set(studenti_filtered['MmbCode'].unique())
+                # Insieme dalle righe filtrate: tessera e regione devono stare sulla stessa riga
+                studenti_set = indice.da_codici(studenti_filtered['MmbCode'])
+                n_studenti = conta(studenti_set)
                 conv_studenti = studenti_set & regolari_members
-                tasso_conv_stud = 100 * len(conv_studenti) / len(studenti_set) if len(studenti_set) > 0 else 0
+                tasso_conv_stud = 100 * conta(conv_studenti) / n_studenti if n_studenti > 0 else 0
 
                 # Trend per anno
-                trend_stud = studenti_filtered.groupby('Anno')['MmbCode'].nunique().reset_index()
-                trend_stud.columns = ['Anno', 'Iscritti']
+                trend_stud = studenti_filtered.groupby('Anno')['MmbCode'].nunique()
+                trend_stud = trend_stud.rename_axis('Anno').reset_index(name='Iscritti')
 
                 st.error(f"""
                 **🚨 PROGRAMMA SCOLASTICO**
@@ -2636,7 +2905,7 @@ elif pagina == "🎓 Bridge a Scuola":
 
                 with col2:
                     fig_conv_stud = go.Figure(go.Pie(
-                        values=[len(conv_studenti), n_studenti - len(conv_studenti)],
+                        values=[conta(conv_studenti), n_studenti - conta(conv_studenti)],
                         labels=['Convertiti', 'Non Convertiti'],
                         hole=0.6,
                         marker_colors=['#059669', '#e5e7eb']
@@ -2778,8 +3047,9 @@ elif pagina == "🎓 Bridge a Scuola":
 elif pagina == "⚠️ Giocatori a Rischio":
     st.title("⚠️ Giocatori a Rischio")
 
-    if 'rischio' in data:
-        rischio_df = data['rischio']
+    rischio_df = artefatto('rischio')
+    if rischio_df is not None:
+        rischio_df, _ = escludi_deceduti(rischio_df, registro_deceduti, col_codice='Codice')
 
         # Metriche
         col1, col2, col3, col4 = st.columns(4)
@@ -2886,18 +3156,38 @@ elif pagina == "🔄 Bridgisti Recuperabili":
     """)
 
     # Carica dati recuperabilità
-    RESULTS_REC = OUTPUT_DIR / 'results_recuperabilita'
-
     if not RESULTS_REC.exists():
         st.error("⚠️ Dati non trovati. Esegui prima `python 04_modello_recuperabilita.py`")
     else:
-        # Carica dati
-        df_rec = pd.read_csv(RESULTS_REC / 'bridgisti_recuperabili_completo.csv')
-        df_prov_rec = pd.read_csv(RESULTS_REC / 'recuperabili_per_provincia.csv')
-        df_reg_rec = pd.read_csv(RESULTS_REC / 'recuperabili_per_regione.csv')
+        # Carica componenti (una volta) e ricalcola con pesi/soglie correnti
+        rec = load_recuperabilita(mtime(ARTEFATTI['recuperabili']), mtime(DECEDUTI_FILE), versione_df)
+
+        with st.expander("⚙️ What-if: pesi e soglie del modello"):
+            st.caption("Lo score viene ricalcolato dalle componenti già in memoria, "
+                       "senza rieseguire 04_modello_recuperabilita.py")
+            col_pesi, col_soglie = st.columns(2)
+            with col_pesi:
+                st.markdown("**Pesi**")
+                pesi_rec = {
+                    nome: st.slider(nome.capitalize(), 0.0, 0.5, float(valore), 0.01, key=f"peso_{nome}")
+                    for nome, valore in PESI.items()
+                }
+            with col_soglie:
+                st.markdown("**Soglie priorità**")
+                soglie_rec = {
+                    'urgente': st.slider("Score URGENTE ≥", 0, 100, SOGLIE_PRIORITA['urgente']),
+                    'alta': st.slider("Score ALTA ≥", 0, 100, SOGLIE_PRIORITA['alta']),
+                    'media': st.slider("Score MEDIA ≥", 0, 100, SOGLIE_PRIORITA['media']),
+                    'salute_difficile': st.slider("Rischio salute DIFFICILE ≥", 0, 100,
+                                                  SOGLIE_PRIORITA['salute_difficile']),
+                    'salute_non_recuperabile': st.slider("Rischio salute NON RECUPERABILE ≥", 0, 100,
+                                                         SOGLIE_PRIORITA['salute_non_recuperabile']),
+                    'eta_difficile': st.slider("Età DIFFICILE ≥", 50, 120, SOGLIE_PRIORITA['eta_difficile']),
+                    'eta_non_recuperabile': st.slider("Età NON RECUPERABILE ≥", 50, 120,
+                                                      SOGLIE_PRIORITA['eta_non_recuperabile']),
+                }
 
-        with open(RESULTS_REC / 'summary_recuperabilita.json', 'r') as f:
-            summary_rec = json.load(f)
+        df_rec, df_prov_rec, df_reg_rec, summary_rec = ricalcola_recuperabilita(rec, pesi_rec, soglie_rec)
 
         # === METRICHE PRINCIPALI ===
         col1, col2, col3, col4, col5 = st.columns(5)
@@ -3086,37 +3376,39 @@ elif pagina == "🔄 Bridgisti Recuperabili":
             # Dettaglio province
             st.markdown("---")
             st.subheader("📍 Dettaglio per Provincia")
+            if df_prov_rec is None:
+                st.info("Provincia non disponibile: esegui prima `python 03_arricchisci_province.py`")
+            else:
+                # Top 20 province
+                top_prov = df_prov_rec.nlargest(20, 'NumRecuperabili')
 
-            # Top 20 province
-            top_prov = df_prov_rec.nlargest(20, 'NumRecuperabili')
-
-            col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
 
-            with col1:
-                st.markdown("##### Top 20 Province per Numero Recuperabili")
-                fig = px.bar(
-                    top_prov.sort_values('NumRecuperabili', ascending=True),
-                    x='NumRecuperabili', y='Provincia', orientation='h',
-                    color='ScoreMedio', color_continuous_scale='RdYlGn'
-                )
-                fig.update_layout(height=500)
-                st.plotly_chart(fig, use_container_width=True)
+                with col1:
+                    st.markdown("##### Top 20 Province per Numero Recuperabili")
+                    fig = px.bar(
+                        top_prov.sort_values('NumRecuperabili', ascending=True),
+                        x='NumRecuperabili', y='Provincia', orientation='h',
+                        color='ScoreMedio', color_continuous_scale='RdYlGn'
+                    )
+                    fig.update_layout(height=500)
+                    st.plotly_chart(fig, use_container_width=True)
 
-            with col2:
-                st.markdown("##### Tabella Province")
-                st.dataframe(
-                    df_prov_rec[['Provincia', 'NumRecuperabili', 'ScoreMedio', 'EtaMedia', 'RischioSaluteMedio']]
-                    .sort_values('NumRecuperabili', ascending=False)
-                    .head(30)
-                    .style.background_gradient(subset=['NumRecuperabili'], cmap='Blues')
-                    .format({
-                        'ScoreMedio': '{:.1f}',
-                        'EtaMedia': '{:.1f}',
-                        'RischioSaluteMedio': '{:.1f}'
-                    }),
-                    use_container_width=True,
-                    height=450
-                )
+                with col2:
+                    st.markdown("##### Tabella Province")
+                    st.dataframe(
+                        df_prov_rec[['Provincia', 'NumRecuperabili', 'ScoreMedio', 'EtaMedia', 'RischioSaluteMedio']]
+                        .sort_values('NumRecuperabili', ascending=False)
+                        .head(30)
+                        .style.background_gradient(subset=['NumRecuperabili'], cmap='Blues')
+                        .format({
+                            'ScoreMedio': '{:.1f}',
+                            'EtaMedia': '{:.1f}',
+                            'RischioSaluteMedio': '{:.1f}'
+                        }),
+                        use_container_width=True,
+                        height=450
+                    )
 
         # ========== TAB 3: ANALISI ==========
         with tab3:
@@ -3222,14 +3514,14 @@ elif pagina == "🔄 Bridgisti Recuperabili":
         with tab4:
             st.subheader("📈 Componenti dello Score di Recuperabilità")
 
-            st.markdown("""
+            st.markdown(f"""
             Il **RecoverabilityScore** (0-100) è calcolato combinando:
-            - **Engagement Score** (25%): Gare giocate, punti, agonismo
-            - **Loyalty Score** (20%): Anni di presenza, progressione categoria
-            - **Recency Score** (20%): Quanto recente è l'abbandono
-            - **Geographic Score** (10%): Retention storica della zona
-            - **Social Score** (10%): Connessioni nel circolo
-            - **Health Penalty** (15%): Rischio mortalità/malattia per età
+            - **Engagement Score** ({pesi_rec['engagement']:.0%}): Gare giocate, punti, agonismo
+            - **Loyalty Score** ({pesi_rec['loyalty']:.0%}): Anni di presenza, progressione categoria
+            - **Recency Score** ({pesi_rec['recency']:.0%}): Quanto recente è l'abbandono
+            - **Geographic Score** ({pesi_rec['geographic']:.0%}): Retention storica della zona
+            - **Social Score** ({pesi_rec['social']:.0%}): Connessioni nel circolo
+            - **Health Penalty** ({pesi_rec['health']:.0%}): Rischio mortalità/malattia per età
             """)
 
             # Medie componenti per priorità
@@ -3272,9 +3564,9 @@ elif pagina == "🔄 Bridgisti Recuperabili":
 elif pagina == "🔮 Modello Predittivo":
     st.title("🔮 Modello Predittivo 2025-2035")
 
-    if 'proiezioni' in data:
-        proiezioni = data['proiezioni']
-        rischi_pred = data['rischi_pred']
+    proiezioni = artefatto('proiezioni')
+    if proiezioni is not None:
+        rischi_pred = artefatto('rischi_pred')
 
         # Metriche
         col1, col2, col3, col4 = st.columns(4)
@@ -3309,30 +3601,40 @@ elif pagina == "🔮 Modello Predittivo":
 
         fig = go.Figure()
 
-        # Area range
-        fig.add_trace(go.Scatter(
-            x=proiezioni['Anno'],
-            y=proiezioni['Tesserati'] * 1.1,
-            mode='lines',
-            line=dict(width=0),
-            showlegend=False
-        ))
-        fig.add_trace(go.Scatter(
-            x=proiezioni['Anno'],
-            y=proiezioni['Tesserati'] * 0.9,
-            mode='lines',
-            fill='tonexty',
-            fillcolor='rgba(74, 144, 217, 0.2)',
-            line=dict(width=0),
-            name='Range scenari'
-        ))
+        # Area range: percentili Monte Carlo se disponibili, altrimenti ±10%
+        if 'Tesserati_P5' in proiezioni.columns:
+            bande = [('Tesserati_P5', 'Tesserati_P95', 'Intervallo 5-95%', 'rgba(74, 144, 217, 0.2)'),
+                     ('Tesserati_P25', 'Tesserati_P75', 'Intervallo 25-75%', 'rgba(30, 58, 95, 0.25)')]
+            nome_base = 'Mediana simulazioni'
+        else:
+            proiezioni = proiezioni.assign(Basso=proiezioni['Tesserati'] * 0.9, Alto=proiezioni['Tesserati'] * 1.1)
+            bande = [('Basso', 'Alto', 'Range scenari', 'rgba(74, 144, 217, 0.2)')]
+            nome_base = 'Scenario base'
+
+        for basso, alto, nome, colore in bande:
+            fig.add_trace(go.Scatter(
+                x=proiezioni['Anno'],
+                y=proiezioni[alto],
+                mode='lines',
+                line=dict(width=0),
+                showlegend=False
+            ))
+            fig.add_trace(go.Scatter(
+                x=proiezioni['Anno'],
+                y=proiezioni[basso],
+                mode='lines',
+                fill='tonexty',
+                fillcolor=colore,
+                line=dict(width=0),
+                name=nome
+            ))
 
         # Linea principale
         fig.add_trace(go.Scatter(
             x=proiezioni['Anno'],
             y=proiezioni['Tesserati'],
             mode='lines+markers',
-            name='Scenario base',
+            name=nome_base,
             line=dict(color='#1E3A5F', width=3)
         ))
 
@@ -3416,36 +3718,20 @@ elif pagina == "🌱 Opportunità Crescita":
     categorizzate per facilità di "attacco".
     """)
 
-    RESULTS_OPP = OUTPUT_DIR / 'results_opportunita'
-
     if RESULTS_OPP.exists():
         # Carica dati
-        with open(RESULTS_OPP / 'summary_opportunita.json', 'r') as f:
-            summary_opp = json.load(f)
-
-        quasi_agganciati = pd.read_csv(RESULTS_OPP / 'quasi_agganciati.csv')
-        dormienti = pd.read_csv(RESULTS_OPP / 'dormienti.csv')
-        gap_demo = pd.read_csv(RESULTS_OPP / 'gap_demografico.csv')
-        opp_geo = pd.read_csv(RESULTS_OPP / 'opportunita_geografiche.csv')
-        persi_covid = pd.read_csv(RESULTS_OPP / 'persi_covid.csv')
-
-        # Carica deceduti e filtra dalle liste da ricontattare
-        deceduti_file = BASE_DIR / 'Deceduti.xlsx'
-        deceduti_codes = set()
-        n_deceduti_qa = 0
-        n_deceduti_covid = 0
-
-        if deceduti_file.exists():
-            deceduti_df = pd.read_excel(deceduti_file)
-            deceduti_codes = set(deceduti_df['MmbCode'].str.strip())
+        summary_opp = artefatto('summary_opportunita')
 
-            # Filtra quasi_agganciati
-            n_deceduti_qa = quasi_agganciati['MmbCode'].str.strip().isin(deceduti_codes).sum()
-            quasi_agganciati = quasi_agganciati[~quasi_agganciati['MmbCode'].str.strip().isin(deceduti_codes)]
+        quasi_agganciati = artefatto('quasi_agganciati')
+        dormienti = artefatto('dormienti')
+        gap_demo = artefatto('gap_demografico')
+        opp_geo = artefatto('opportunita_geografiche')
+        persi_covid = artefatto('persi_covid')
 
-            # Filtra persi_covid
-            n_deceduti_covid = persi_covid['MmbCode'].str.strip().isin(deceduti_codes).sum()
-            persi_covid = persi_covid[~persi_covid['MmbCode'].str.strip().isin(deceduti_codes)]
+        # Filtra i deceduti dalle liste da ricontattare
+        quasi_agganciati, n_deceduti_qa = escludi_deceduti(quasi_agganciati, registro_deceduti)
+        persi_covid, n_deceduti_covid = escludi_deceduti(persi_covid, registro_deceduti)
+        dormienti, n_deceduti_dorm = escludi_deceduti(dormienti, registro_deceduti)
 
         # Overview KPI
         st.markdown("### 📊 Riepilogo Opportunità")
@@ -3478,8 +3764,9 @@ elif pagina == "🌱 Opportunità Crescita":
             )
 
         # Nota discreta sui filtrati
-        if n_deceduti_qa > 0 or n_deceduti_covid > 0:
-            st.caption(f"ℹ️ Liste nettificate: esclusi {n_deceduti_qa + n_deceduti_covid} nominativi non più ricontattabili")
+        n_deceduti = n_deceduti_qa + n_deceduti_covid + n_deceduti_dorm
+        if n_deceduti > 0:
+            st.caption(f"ℹ️ Liste nettificate: esclusi {n_deceduti} nominativi non più ricontattabili")
 
         st.markdown("---")
 
@@ -3880,18 +4167,15 @@ elif pagina == "🔬 Analisi Avanzate":
     Analisi comportamentali e predittive per insight strategici.
     """)
 
-    RESULTS_AVZ = OUTPUT_DIR / 'results_avanzate'
-
     if RESULTS_AVZ.exists():
         # Carica dati
-        with open(RESULTS_AVZ / 'summary_avanzate.json', 'r') as f:
-            summary_avz = json.load(f)
+        summary_avz = artefatto('summary_avanzate')
 
-        curva = pd.read_csv(RESULTS_AVZ / 'curva_apprendimento.csv')
-        curva_confronto = pd.read_csv(RESULTS_AVZ / 'curva_confronto_attivi_persi.csv')
-        early_warning = pd.read_csv(RESULTS_AVZ / 'early_warning_circoli.csv')
-        effetto_maestro = pd.read_csv(RESULTS_AVZ / 'effetto_maestro.csv')
-        profilo_migrazione = pd.read_csv(RESULTS_AVZ / 'profilo_migrazione.csv')
+        curva = artefatto('curva_apprendimento')
+        curva_confronto = artefatto('curva_confronto')
+        early_warning = artefatto('early_warning')
+        effetto_maestro = artefatto('effetto_maestro')
+        profilo_migrazione = artefatto('profilo_migrazione')
 
         # Overview KPI
         st.markdown("### 📊 Insight Chiave")
@@ -4154,8 +4438,8 @@ elif pagina == "🔬 Analisi Avanzate":
 
             with col2:
                 # Gender gap per categoria
-                if (RESULTS_AVZ / 'gender_gap_categoria.csv').exists():
-                    gender_cat = pd.read_csv(RESULTS_AVZ / 'gender_gap_categoria.csv')
+                gender_cat = artefatto('gender_gap_categoria')
+                if gender_cat is not None:
 
                     # Pivot per visualizzazione
                     gender_pivot = gender_cat.pivot(index='Categoria', columns='Sesso', values='Retention')
@@ -4203,17 +4487,14 @@ elif pagina == "🎯 Attività per Età/Sesso":
     Analisi delle gare e campionati per fascia d'età e sesso.
     """)
 
-    RESULTS_ATT = OUTPUT_DIR / 'results_attivita'
-
     if RESULTS_ATT.exists():
         # Carica dati
-        with open(RESULTS_ATT / 'summary_attivita.json', 'r') as f:
-            summary_att = json.load(f)
+        summary_att = artefatto('summary_attivita')
 
-        gare_pivot = pd.read_csv(RESULTS_ATT / 'gare_pivot_eta_sesso.csv')
-        camp_pivot = pd.read_csv(RESULTS_ATT / 'campionati_pivot_eta_sesso.csv')
-        part_pivot = pd.read_csv(RESULTS_ATT / 'partecipazione_campionati.csv')
-        gare_eta_sesso = pd.read_csv(RESULTS_ATT / 'gare_per_eta_sesso.csv')
+        gare_pivot = artefatto('gare_pivot')
+        camp_pivot = artefatto('campionati_pivot')
+        part_pivot = artefatto('partecipazione_campionati')
+        gare_eta_sesso = artefatto('gare_eta_sesso')
 
         # KPI
         st.markdown("### 📊 Riepilogo")
@@ -4406,18 +4687,15 @@ elif pagina == "🧩 Cluster e Territori":
     Segmentazione giocatori per comportamento e analisi delle dinamiche territoriali.
     """)
 
-    RESULTS_COMP = OUTPUT_DIR / 'results_comportamentali'
-
     if RESULTS_COMP.exists():
         # Carica dati
-        with open(RESULTS_COMP / 'summary_comportamentali.json', 'r') as f:
-            summary_comp = json.load(f)
+        summary_comp = artefatto('summary_comportamentali')
 
-        cluster_stats = pd.read_csv(RESULTS_COMP / 'cluster_stats.csv')
-        retention_cluster = pd.read_csv(RESULTS_COMP / 'retention_cluster.csv')
-        confronto_metro = pd.read_csv(RESULTS_COMP / 'confronto_metro_provincia.csv')
-        stats_area = pd.read_csv(RESULTS_COMP / 'stats_per_area.csv')
-        evol_province = pd.read_csv(RESULTS_COMP / 'evoluzione_province.csv')
+        cluster_stats = artefatto('cluster_stats')
+        retention_cluster = artefatto('retention_cluster')
+        confronto_metro = artefatto('confronto_metro')
+        stats_area = artefatto('stats_area')
+        evol_province = artefatto('evoluzione_province')
 
         # KPI
         st.markdown("### 📊 Riepilogo")
@@ -4733,14 +5011,11 @@ elif pagina == "🎖️ Priorità Intervento":
     Ogni intervento è valutato per **impatto**, **difficoltà**, **tempo di ritorno** e **forza delle evidenze**.
     """)
 
-    RESULTS_PRIO = OUTPUT_DIR / 'results_priorita'
-
     if RESULTS_PRIO.exists():
         # Carica dati
-        with open(RESULTS_PRIO / 'summary_priorita.json', 'r') as f:
-            summary_prio = json.load(f)
+        summary_prio = artefatto('summary_priorita')
 
-        priorita_df = pd.read_csv(RESULTS_PRIO / 'priorita_interventi.csv')
+        priorita_df = artefatto('priorita_interventi')
 
         # KPI principali
         st.markdown("### 📊 Riepilogo Impatto")
@@ -4915,24 +5190,23 @@ elif pagina == "🔍 Esplora Dati":
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        st.metric("Record", f"{len(df_filtered):,}")
+        st.metric("Record", f"{totali_filtro['Record']:,}")
     with col2:
-        st.metric("Giocatori Unici", f"{df_filtered['MmbCode'].nunique():,}")
+        st.metric("Giocatori Unici", f"{totali_filtro['Giocatori']:,}")
     with col3:
-        col_assoc = 'Associazione' if 'Associazione' in df_filtered.columns else 'GrpName'
-        st.metric("Associazioni", f"{df_filtered[col_assoc].nunique():,}")
+        st.metric("Associazioni", f"{totali_filtro['Associazioni']:,}")
 
     st.markdown("---")
 
     # Analisi personalizzata
     st.subheader("📊 Crea il tuo grafico")
 
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
 
     with col1:
         x_axis = st.selectbox(
             "Asse X",
-            ['Anno', 'GrpArea', 'CatLabel', 'FasciaEta', 'Associazione']
+            ['Anno', 'GrpArea', 'CatLabel', 'FasciaEta', col_assoc, 'Anni']
         )
 
     with col2:
@@ -4947,21 +5221,16 @@ elif pagina == "🔍 Esplora Dati":
             [None, 'GrpArea', 'CatLabel', 'IsAgonista', 'MmbSex']
         )
 
-    # Genera grafico
-    if y_axis == 'Conteggio':
-        if color_by:
-            chart_data = df_filtered.groupby([x_axis, color_by]).size().reset_index(name='Conteggio')
-            fig = px.bar(chart_data, x=x_axis, y='Conteggio', color=color_by)
-        else:
-            chart_data = df_filtered.groupby(x_axis).size().reset_index(name='Conteggio')
-            fig = px.bar(chart_data, x=x_axis, y='Conteggio')
-    else:
-        if color_by:
-            chart_data = df_filtered.groupby([x_axis, color_by])[y_axis].mean().reset_index()
-            fig = px.bar(chart_data, x=x_axis, y=y_axis, color=color_by)
-        else:
-            chart_data = df_filtered.groupby(x_axis)[y_axis].mean().reset_index()
-            fig = px.bar(chart_data, x=x_axis, y=y_axis)
+    with col4:
+        max_x = st.slider("Max categorie X", 5, 50, MAX_CATEGORIE_X,
+                          help=f"Le categorie meno numerose sono unite in \"{ETICHETTA_ALTRI}\"")
+
+    # Genera grafico (aggregato e limitato lato server)
+    chart_data = calcola_grafico(impronta, x_axis, y_axis, color_by, max_x, df_filtered)
+    # Ultima colonna: il valore (rinominato se la metrica coincide con l'asse X)
+    fig = px.bar(chart_data, x=x_axis, y=chart_data.columns[-1], color=color_by)
+    if not pd.api.types.is_numeric_dtype(chart_data[x_axis]):
+        fig.update_xaxes(type='category')
 
     st.plotly_chart(fig, use_container_width=True)
 
@@ -4972,49 +5241,44 @@ elif pagina == "🔍 Esplora Dati":
     search_name = st.text_input("Nome giocatore:", "")
 
     if search_name and len(search_name) >= 3:
-        results = df_filtered[df_filtered['MmbName'].str.contains(search_name, case=False, na=False)]
-
-        if len(results) > 0:
-            # Aggrega per giocatore
-            giocatore_info = results.groupby('MmbCode').agg({
-                'MmbName': 'first',
-                'Anno': ['min', 'max', 'count'],
-                'GareGiocate': ['mean', 'sum'],
-                'Anni': 'last',
-                'CatLabel': 'last',
-                'Associazione': 'last'
-            }).reset_index()
-
-            giocatore_info.columns = ['Codice', 'Nome', 'Primo Anno', 'Ultimo Anno',
-                                      'Anni Presenza', 'Gare Medie', 'Gare Totali',
-                                      'Età', 'Categoria', 'Associazione']
+        # Indice sui giocatori distinti: solo quelli con righe nei filtri globali
+        ricerca = load_ricerca(col_assoc, versione_df)
+        giocatore_info = ricerca.cerca(search_name)
+        cella_riga = cubo['cella_riga']
+        giocatore_info = giocatore_info[
+            ricerca.presenti(giocatore_info['Id'], lambda posizioni: selezione[cella_riga[posizioni]])
+        ]
 
-            st.dataframe(giocatore_info, use_container_width=True)
+        if len(giocatore_info) > 0:
+            st.caption("Riepilogo sull'intera carriera, ordinato per pertinenza")
+            st.dataframe(giocatore_info.drop(columns='Id'), use_container_width=True, hide_index=True)
 
             # Dettaglio singolo giocatore
-            if len(giocatore_info) > 0:
-                selected = st.selectbox("Seleziona giocatore per dettaglio:",
-                                       giocatore_info['Nome'].tolist())
+            etichette = dict(zip(giocatore_info['Id'],
+                                 giocatore_info['Nome'].astype(str) + ' (' + giocatore_info['Codice'].astype(str) + ')'))
+            selected = st.selectbox("Seleziona giocatore per dettaglio:",
+                                    giocatore_info['Id'].tolist(), format_func=etichette.get)
 
-                if selected:
-                    player_data = results[results['MmbName'] == selected]
+            if selected is not None:
+                player_data = df.iloc[ricerca.righe(selected)]
+                nome_sel = etichette[selected]
 
-                    col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
 
-                    with col1:
-                        fig = px.line(player_data.sort_values('Anno'),
-                                     x='Anno', y='GareGiocate',
-                                     title=f"Gare per anno - {selected}",
-                                     markers=True)
-                        fig.update_xaxes(dtick=1)
-                        st.plotly_chart(fig, use_container_width=True)
+                with col1:
+                    fig = px.line(player_data,
+                                  x='Anno', y='GareGiocate',
+                                  title=f"Gare per anno - {nome_sel}",
+                                  markers=True)
+                    fig.update_xaxes(dtick=1)
+                    st.plotly_chart(fig, use_container_width=True)
 
-                    with col2:
-                        fig = px.bar(player_data.sort_values('Anno'),
-                                    x='Anno', y='PuntiTotali',
-                                    title=f"Punti per anno - {selected}")
-                        fig.update_xaxes(dtick=1)
-                        st.plotly_chart(fig, use_container_width=True)
+                with col2:
+                    fig = px.bar(player_data,
+                                 x='Anno', y='PuntiTotali',
+                                 title=f"Punti per anno - {nome_sel}")
+                    fig.update_xaxes(dtick=1)
+                    st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("Nessun giocatore trovato con questo nome")
 
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Registro degli artefatti della pipeline letti dalla dashboard e dall'API
+
+Ogni output (CSV o JSON) è dichiarato una volta sola con il suo percorso.
+La data di modifica dei file fa da versione: chi tiene una cache (Streamlit,
+api_dashboard) la usa come chiave, così un file rigenerato dalla pipeline
+viene riletto senza riavviare nulla.
+"""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from data_store import archivio_aggiornato, FILE_UNIFICATO_CSV, FILE_UNIFICATO_FEATHER
+
+# Paths
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / 'output'
+RESULTS_DIR = OUTPUT_DIR / 'results_v2'
+RESULTS_CHURN = OUTPUT_DIR / 'results_churn'
+RESULTS_INNOV = OUTPUT_DIR / 'results_innovativi'
+RESULTS_PRED = OUTPUT_DIR / 'results_predittivi'
+RESULTS_OPP = OUTPUT_DIR / 'results_opportunita'
+RESULTS_REC = OUTPUT_DIR / 'results_recuperabilita'
+RESULTS_AVZ = OUTPUT_DIR / 'results_avanzate'
+RESULTS_ATT = OUTPUT_DIR / 'results_attivita'
+RESULTS_COMP = OUTPUT_DIR / 'results_comportamentali'
+RESULTS_PRIO = OUTPUT_DIR / 'results_priorita'
+DECEDUTI_FILE = BASE_DIR / 'Deceduti.xlsx'
+
+# Artefatti delle analisi: nome -> file (CSV o JSON)
+ARTEFATTI = {
+    'metriche': RESULTS_DIR / 'metriche_complete_v2.json',
+    'regioni': RESULTS_DIR / 'regioni_summary.csv',
+    'cluster_churn': RESULTS_CHURN / 'cluster_churn_profili.csv',
+    'churn_macro': RESULTS_CHURN / 'churn_per_macroregione.csv',
+    'rischio': RESULTS_INNOV / 'giocatori_rischio_REALE.csv',
+    'proiezioni': RESULTS_PRED / 'proiezioni_2025_2035.csv',
+    'rischi_pred': RESULTS_PRED / 'rischi_strutturali.json',
+    'summary_opportunita': RESULTS_OPP / 'summary_opportunita.json',
+    'quasi_agganciati': RESULTS_OPP / 'quasi_agganciati.csv',
+    'dormienti': RESULTS_OPP / 'dormienti.csv',
+    'gap_demografico': RESULTS_OPP / 'gap_demografico.csv',
+    'opportunita_geografiche': RESULTS_OPP / 'opportunita_geografiche.csv',
+    'persi_covid': RESULTS_OPP / 'persi_covid.csv',
+    'recuperabili': RESULTS_REC / 'bridgisti_recuperabili_completo.csv',
+    'summary_avanzate': RESULTS_AVZ / 'summary_avanzate.json',
+    'curva_apprendimento': RESULTS_AVZ / 'curva_apprendimento.csv',
+    'curva_confronto': RESULTS_AVZ / 'curva_confronto_attivi_persi.csv',
+    'early_warning': RESULTS_AVZ / 'early_warning_circoli.csv',
+    'effetto_maestro': RESULTS_AVZ / 'effetto_maestro.csv',
+    'profilo_migrazione': RESULTS_AVZ / 'profilo_migrazione.csv',
+    'gender_gap_categoria': RESULTS_AVZ / 'gender_gap_categoria.csv',
+    'summary_attivita': RESULTS_ATT / 'summary_attivita.json',
+    'gare_pivot': RESULTS_ATT / 'gare_pivot_eta_sesso.csv',
+    'campionati_pivot': RESULTS_ATT / 'campionati_pivot_eta_sesso.csv',
+    'partecipazione_campionati': RESULTS_ATT / 'partecipazione_campionati.csv',
+    'gare_eta_sesso': RESULTS_ATT / 'gare_per_eta_sesso.csv',
+    'summary_comportamentali': RESULTS_COMP / 'summary_comportamentali.json',
+    'cluster_stats': RESULTS_COMP / 'cluster_stats.csv',
+    'retention_cluster': RESULTS_COMP / 'retention_cluster.csv',
+    'confronto_metro': RESULTS_COMP / 'confronto_metro_provincia.csv',
+    'stats_area': RESULTS_COMP / 'stats_per_area.csv',
+    'evoluzione_province': RESULTS_COMP / 'evoluzione_province.csv',
+    'summary_priorita': RESULTS_PRIO / 'summary_priorita.json',
+    'priorita_interventi': RESULTS_PRIO / 'priorita_interventi.csv',
+}
+
+
+def mtime(percorso):
+    """Data di modifica del file (None se non esiste)"""
+    return percorso.stat().st_mtime if percorso.exists() else None
+
+
+def leggi_artefatto(percorso):
+    """Legge un CSV (DataFrame) o un JSON (oggetto Python)"""
+    if percorso.suffix == '.json':
+        with open(percorso, 'r') as f:
+            return json.load(f)
+    return pd.read_csv(percorso)
+
+
+def versione_dataset():
+    """Data di modifica dell'archivio da cui carica_dati_unificati legge"""
+    return mtime(FILE_UNIFICATO_FEATHER if archivio_aggiornato() else FILE_UNIFICATO_CSV)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Tabella delle carriere dei giocatori (una riga per MmbCode)
+
+Materializzata una volta per esecuzione della pipeline accanto al dataset
+unificato (output/carriere_giocatori.feather) e letta da 04, 08, 09, 10 e
+Script/analisi_churn_profonda al posto dei rispettivi groupby('MmbCode').
+
+Le righe sono ordinate per (giocatore, anno): "inizio"/"fine" sono il primo
+e l'ultimo valore non mancante, come first/last di pandas sul dataset in
+ordine di anno. Ogni aggregazione è un bincount (o un reduceat) sui codici
+interi dei giocatori, senza funzioni Python per gruppo.
+
+I circoli frequentati sono salvati come lista di id interi (ordine di prima
+frequenza); i nomi corrispondenti sono in carriere.attrs['circoli'].
+
+    carriere = carica_carriere()
+    regolari = carriere_regolari(carriere)     # solo tessere regolari (08)
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import (
+    OUTPUT_DIR, FILE_UNIFICATO_CSV, FILE_UNIFICATO_FEATHER, PYARROW_AVAILABLE,
+    archivio_aggiornato, carica_dati_unificati,
+)
+
+if PYARROW_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+FILE_CARRIERE = OUTPUT_DIR / 'carriere_giocatori.feather'
+
+TESSERE_REGOLARI = ['Ordinario Sportivo', 'Agonista', 'Ordinario Amatoriale', 'Non Agonista']
+
+# Ordine gerarchico delle categorie (CatInizio/CatFine/CatMax)
+CATEGORIA_ORDINE = {
+    'NC': 0,
+    '4F': 1, '4Q': 2, '4C': 3, '4P': 4,
+    '3F': 5, '3Q': 6, '3C': 7, '3P': 8,
+    '2F': 9, '2Q': 10, '2C': 11, '2P': 12,
+    '1F': 13, '1Q': 14, '1C': 15, '1P': 16,
+    'HJ': 17, 'HQ': 18, 'HK': 19, 'HA': 20,
+    'MS': 21, 'LM': 22, 'GM': 23
+}
+
+# Colonna di output -> (colonna del dataset, aggregazione).
+# 'Associazione' indica la colonna dei circoli (Associazione o GrpName).
+CARRIERA = {
+    'Nome': ('MmbName', 'last'),
+    'AnnoInizio': ('Anno', 'min'),
+    'AnnoFine': ('Anno', 'max'),
+    'AnniPresenza': ('Anno', 'count'),
+    'GareMedie': ('GareGiocate', 'mean'),
+    'GareTotali': ('GareGiocate', 'sum'),
+    'GareStd': ('GareGiocate', 'std'),
+    'PuntiCampMedi': ('PuntiCampionati', 'mean'),
+    'PuntiCampTot': ('PuntiCampionati', 'sum'),
+    'PuntiTotMedi': ('PuntiTotali', 'mean'),
+    'PuntiTotTot': ('PuntiTotali', 'sum'),
+    'EtaUltima': ('Anni', 'last'),
+    'Sesso': ('MmbSex', 'first'),
+    'CatLabelInizio': ('CatLabel', 'first'),
+    'CatLabelFine': ('CatLabel', 'last'),
+    'CatInizio': ('CatOrdine', 'first'),
+    'CatFine': ('CatOrdine', 'last'),
+    'CatMax': ('CatOrdine', 'max'),
+    'EraScuolaBridge': ('IsScuolaBridge', 'any'),
+    'EraAgonista': ('IsAgonista', 'any'),
+    'Regione': ('GrpArea', 'last'),
+    'Circolo': ('GrpName', 'last'),
+    'Associazione': ('Associazione', 'last'),
+    'NumCircoli': ('Associazione', 'nunique'),
+    'Provincia': ('Provincia', 'last'),
+    'NumProvince': ('Provincia', 'nunique'),
+    'Citta': ('AdmCity', 'last'),
+    'TipoTessera': ('MbtDesc', 'last'),
+}
+
+# Stessa carriera ristretta alle tessere regolari (colonne con suffisso Regolari)
+CARRIERA_REGOLARI = {
+    'AnnoInizio': ('Anno', 'min'),
+    'AnnoFine': ('Anno', 'max'),
+    'AnniPresenza': ('Anno', 'count'),
+    'GareTotali': ('GareGiocate', 'sum'),
+    'AssociazioneInizio': ('Associazione', 'first'),
+    'RegioneInizio': ('GrpArea', 'first'),
+    'EtaUltima': ('Anni', 'last'),
+    'Sesso': ('MmbSex', 'first'),
+    'NomeInizio': ('MmbName', 'first'),
+}
+SUFFISSO_REGOLARI = 'Regolari'
+
+
+def _aggrega(valori, membri, n_membri, funzione):
+    """
+    Aggregazione per giocatore di una colonna già ordinata per (giocatore, anno).
+    I mancanti sono ignorati come in pandas (sum = 0, mean/std/first = NaN).
+    """
+    serie = pd.Series(valori)
+    validi = serie.notna().to_numpy()
+    gruppi = membri[validi]
+    n = np.bincount(gruppi, minlength=n_membri)
+
+    if funzione == 'count':
+        return n
+    if funzione == 'nunique':
+        codici, distinti = pd.factorize(serie[validi])
+        base = max(len(distinti), 1)
+        coppie = np.unique(gruppi.astype(np.int64) * base + codici)
+        return np.bincount(coppie // base, minlength=n_membri)
+    if funzione == 'any':
+        return np.bincount(gruppi, weights=serie[validi].astype(bool).to_numpy(), minlength=n_membri) > 0
+
+    presenti = n > 0
+    if funzione in ('first', 'last', 'min', 'max'):
+        dati = serie[validi].to_numpy()
+        inizi = np.searchsorted(gruppi, np.arange(n_membri))
+        if funzione == 'first':
+            scelti = dati[inizi[presenti]]
+        elif funzione == 'last':
+            scelti = dati[inizi[presenti] + n[presenti] - 1]
+        else:
+            riduzione = np.minimum if funzione == 'min' else np.maximum
+            scelti = riduzione.reduceat(dati, inizi[presenti])
+        if presenti.all():
+            return scelti
+        numerico = pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+        risultato = np.full(n_membri, np.nan, dtype=float if numerico else object)
+        risultato[presenti] = scelti
+        return risultato
+
+    dati = serie[validi].to_numpy(dtype=float)
+    somma = np.bincount(gruppi, weights=dati, minlength=n_membri)
+    if funzione == 'sum':
+        return somma
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(presenti, somma / np.maximum(n, 1), np.nan)
+        if funzione == 'mean':
+            return media
+        # std campionaria (ddof=1) a due passate, NaN con meno di due valori
+        scarti = np.bincount(gruppi, weights=(dati - media[gruppi]) ** 2, minlength=n_membri)
+        return np.where(n > 1, np.sqrt(scarti / np.maximum(n - 1, 1)), np.nan)
+
+
+def _tabella(df, membri, n_membri, schema, col_assoc, suffisso=''):
+    """Colonne dello schema (quelle con la colonna sorgente presente nel dataset)"""
+    colonne = {}
+    for nome, (sorgente, funzione) in schema.items():
+        sorgente = col_assoc if sorgente == 'Associazione' else sorgente
+        if sorgente not in df.columns:
+            continue
+        colonne[nome + suffisso] = _aggrega(df[sorgente].to_numpy(), membri, n_membri, funzione)
+    return colonne
+
+
+def _circoli(valori, membri, n_membri):
+    """
+    Circoli distinti di ogni giocatore come id interi, in ordine di prima
+    frequenza: (puntatori CSR, id, nomi dei circoli).
+    """
+    id_circolo, nomi = pd.factorize(pd.Series(valori), sort=True)
+    validi = id_circolo >= 0
+    chiavi = membri[validi].astype(np.int64) * max(len(nomi), 1) + id_circolo[validi]
+    _, prime = np.unique(chiavi, return_index=True)
+    prime = np.sort(prime)
+    ids = id_circolo[validi][prime].astype(np.int32)
+    puntatori = np.searchsorted(membri[validi][prime], np.arange(n_membri + 1))
+    return puntatori, ids, np.asarray(nomi, dtype=object)
+
+
+def calcola_carriere(df):
+    """
+    Tabella delle carriere dal dataset unificato: colonne di CARRIERA,
+    colonne di CARRIERA_REGOLARI con suffisso Regolari, lista Circoli (id).
+    """
+    col_assoc = 'Associazione' if 'Associazione' in df.columns else 'GrpName'
+    membri, elenco = pd.factorize(df['MmbCode'], sort=True)
+    n_membri = len(elenco)
+
+    # Righe ordinate per (giocatore, anno); a parità, ordine del dataset
+    ordine = np.lexsort((df['Anno'].to_numpy(), membri))
+    ordine = ordine[membri[ordine] >= 0]
+    righe = df.iloc[ordine].reset_index(drop=True)
+    membri = membri[ordine]
+    if 'CatLabel' in righe.columns:
+        righe['CatOrdine'] = righe['CatLabel'].map(CATEGORIA_ORDINE)
+
+    carriere = pd.DataFrame({'MmbCode': np.asarray(elenco, dtype=object)})
+    carriere = carriere.assign(**_tabella(righe, membri, n_membri, CARRIERA, col_assoc))
+
+    regolari = righe['MbtDesc'].isin(TESSERE_REGOLARI).to_numpy()
+    carriere = carriere.assign(**_tabella(righe[regolari], membri[regolari], n_membri,
+                                          CARRIERA_REGOLARI, col_assoc, SUFFISSO_REGOLARI))
+
+    puntatori, ids, nomi = _circoli(righe[col_assoc].to_numpy(), membri, n_membri)
+    carriere['Circoli'] = np.split(ids, puntatori[1:-1]) if n_membri else []
+    carriere.attrs['circoli'] = tuple(nomi)
+    return carriere
+
+
+def salva_carriere(carriere):
+    """Scrive la tabella nel Feather (id dei circoli come list<int32>, nomi nei metadati)"""
+    if not PYARROW_AVAILABLE:
+        return
+    lunghezze = carriere['Circoli'].map(len).to_numpy()
+    puntatori = np.concatenate([[0], np.cumsum(lunghezze)]).astype(np.int32)
+    valori = np.concatenate(list(carriere['Circoli'])) if len(carriere) else np.empty(0)
+    tabella = pa.Table.from_pandas(carriere.drop(columns='Circoli'), preserve_index=False)
+    tabella = tabella.append_column(
+        'Circoli', pa.ListArray.from_arrays(pa.array(puntatori), pa.array(valori.astype(np.int32))))
+    metadati = dict(tabella.schema.metadata or {})
+    metadati[b'circoli'] = json.dumps([str(n) for n in carriere.attrs['circoli']]).encode()
+    tabella = tabella.replace_schema_metadata(metadati)
+
+    # Scrittura atomica: le fasi in parallelo non leggono mai un file parziale
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    temporaneo = FILE_CARRIERE.with_suffix('.tmp')
+    feather.write_feather(tabella, temporaneo, compression='uncompressed')
+    os.replace(temporaneo, FILE_CARRIERE)
+
+
+def carriere_aggiornate():
+    """True se il Feather delle carriere non è più vecchio del dataset unificato"""
+    if not PYARROW_AVAILABLE or not FILE_CARRIERE.exists():
+        return False
+    sorgente = FILE_UNIFICATO_FEATHER if archivio_aggiornato() else FILE_UNIFICATO_CSV
+    return not sorgente.exists() or FILE_CARRIERE.stat().st_mtime >= sorgente.stat().st_mtime
+
+
+def carica_carriere(df=None):
+    """
+    Legge la tabella delle carriere. Se manca o è più vecchia del dataset la
+    ricalcola (da df se passato, altrimenti dall'archivio) e la salva.
+    """
+    if carriere_aggiornate():
+        tabella = feather.read_table(FILE_CARRIERE, memory_map=True)
+        carriere = tabella.to_pandas()
+        carriere.attrs['circoli'] = tuple(json.loads(tabella.schema.metadata[b'circoli']))
+        return carriere
+
+    carriere = calcola_carriere(carica_dati_unificati() if df is None else df)
+    salva_carriere(carriere)
+    return carriere
+
+
+def carriere_regolari(carriere):
+    """
+    Giocatori con almeno una tessera regolare e le loro colonne Regolari
+    (suffisso rimosso); anni, conteggi ed età tornano interi.
+    """
+    colonne = [c + SUFFISSO_REGOLARI for c in CARRIERA_REGOLARI if c + SUFFISSO_REGOLARI in carriere.columns]
+    regolari = carriere.loc[carriere['AnniPresenza' + SUFFISSO_REGOLARI] > 0, ['MmbCode'] + colonne]
+    regolari.columns = ['MmbCode'] + [c[:-len(SUFFISSO_REGOLARI)] for c in colonne]
+    for col in ['AnnoInizio', 'AnnoFine', 'EtaUltima']:
+        if col in regolari.columns and regolari[col].notna().all():
+            regolari[col] = regolari[col].astype(np.int64)
+    return regolari.reset_index(drop=True)
+
+
+def nomi_circoli(carriere):
+    """Lista dei nomi dei circoli frequentati da ogni giocatore"""
+    nomi = np.asarray(carriere.attrs['circoli'], dtype=object)
+    return carriere['Circoli'].map(lambda ids: list(nomi[ids]))
+
+
+def main():
+    print("=" * 70)
+    print("TABELLA CARRIERE GIOCATORI")
+    print("=" * 70)
+
+    df = carica_dati_unificati()
+    print(f"   Record totali: {len(df):,}")
+    carriere = calcola_carriere(df)
+    salva_carriere(carriere)
+    print(f"   Giocatori: {len(carriere):,}")
+    print(f"   Salvato {FILE_CARRIERE.name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Clustering dei giocatori churned con modello in cache
+
+Scaler e centroidi sono salvati in output/modelli/ insieme all'impronta dei
+dati (features + MmbCode) usati per adattarli. A ogni esecuzione:
+- stessi dati: il modello salvato è riusato così com'è
+- pochi giocatori nuovi (quota <= QUOTA_NUOVI_MAX rispetto all'ultimo
+  adattamento): tutti sono assegnati al centroide più vicino del modello
+  esistente, senza riadattare
+- altrimenti (o con forza=True) il modello è riadattato e salvato
+
+Sotto SOGLIA_MINIBATCH giocatori si usa KMeans (n_init=10, come in origine),
+sopra MiniBatchKMeans. sweep_k() confronta inerzia e silhouette per più
+valori di k in parallelo (un thread per valore: sklearn e NumPy rilasciano
+il GIL durante il calcolo).
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+# Paths
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / 'output'
+MODELLI_DIR = OUTPUT_DIR / 'modelli'
+
+FEATURES_CHURN = ['AnniPresenza', 'GareMedie', 'PuntiTotMedi', 'RatioChamp',
+                  'Progressione', 'EtaUltima', 'AnniDaChurn']
+N_CLUSTER = 5
+RANDOM_STATE = 42
+SOGLIA_MINIBATCH = 100_000
+BATCH_SIZE = 4096
+QUOTA_NUOVI_MAX = 0.2
+K_SWEEP = range(2, 11)
+CAMPIONE_SILHOUETTE = 10_000
+
+
+def file_modello(k):
+    """Percorso del modello salvato per k cluster"""
+    return MODELLI_DIR / f'cluster_churn_k{k}.npz'
+
+
+def impronta(X, codici, features):
+    """Impronta di features, valori e codici dei giocatori"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(list(features)).encode())
+    h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update('\n'.join(codici).encode())
+    return h.hexdigest()
+
+
+def _modello(k, n):
+    """KMeans sotto SOGLIA_MINIBATCH righe, MiniBatchKMeans sopra"""
+    if n >= SOGLIA_MINIBATCH:
+        return MiniBatchKMeans(n_clusters=k, random_state=RANDOM_STATE, batch_size=BATCH_SIZE, n_init=3)
+    return KMeans(n_clusters=k, random_state=RANDOM_STATE, n_init=10)
+
+
+def assegna(X_scaled, centroidi):
+    """Indice del centroide più vicino per ogni riga"""
+    distanze = ((X_scaled[:, None, :] - centroidi[None, :, :]) ** 2).sum(axis=2)
+    return distanze.argmin(axis=1)
+
+
+def adatta(X, codici, features, k=N_CLUSTER):
+    """Adatta scaler e centroidi; restituisce il modello come dizionario"""
+    scaler = StandardScaler().fit(X)
+    stimatore = _modello(k, len(X)).fit(scaler.transform(X))
+    return {
+        'media': scaler.mean_,
+        'scala': scaler.scale_,
+        'centroidi': stimatore.cluster_centers_,
+        'codici': np.asarray(codici, dtype=str),
+        'features': list(features),
+        'impronta': impronta(X, codici, features),
+        'metodo': type(stimatore).__name__,
+    }
+
+
+def salva_modello(modello, k):
+    """Scrive il modello (array NumPy + metadati JSON, senza pickle)"""
+    MODELLI_DIR.mkdir(parents=True, exist_ok=True)
+    meta = {c: modello[c] for c in ('features', 'impronta', 'metodo')}
+    np.savez(file_modello(k), media=modello['media'], scala=modello['scala'],
+             centroidi=modello['centroidi'], codici=modello['codici'], meta=np.array(json.dumps(meta)))
+
+
+def carica_modello(k):
+    """Modello salvato per k cluster (None se assente)"""
+    if not file_modello(k).exists():
+        return None
+    with np.load(file_modello(k), allow_pickle=False) as dati:
+        modello = {c: dati[c] for c in ('media', 'scala', 'centroidi', 'codici')}
+        modello.update(json.loads(str(dati['meta'])))
+    return modello
+
+
+def clusterizza(df, features=FEATURES_CHURN, k=N_CLUSTER, col_codice='MmbCode', forza=False):
+    """
+    Cluster dei giocatori di df (righe senza mancanti nelle features).
+    Restituisce (etichette, X standardizzata, info) con info['esito'] in
+    'cache' | 'incrementale' | 'adattato' e info['nuovi'] = giocatori non
+    presenti all'ultimo adattamento.
+    """
+    X = df[features].to_numpy(dtype=np.float64)
+    codici = df[col_codice].astype(str).tolist()
+    modello = None if forza else carica_modello(k)
+    esito, nuovi = 'adattato', len(codici)
+
+    if modello is not None and modello['features'] == list(features):
+        nuovi = int((~np.isin(codici, modello['codici'])).sum())
+        if modello['impronta'] == impronta(X, codici, features):
+            esito = 'cache'
+        elif nuovi <= QUOTA_NUOVI_MAX * len(modello['codici']):
+            esito = 'incrementale'
+
+    if esito == 'adattato':
+        modello = adatta(X, codici, features, k)
+        salva_modello(modello, k)
+
+    X_scaled = (X - modello['media']) / modello['scala']
+    info = {'esito': esito, 'nuovi': nuovi, 'metodo': modello['metodo']}
+    return assegna(X_scaled, modello['centroidi']), X_scaled, info
+
+
+def _valuta_k(X_scaled, k):
+    """Inerzia e silhouette (su campione) per k cluster"""
+    stimatore = _modello(k, len(X_scaled)).fit(X_scaled)
+    campione = min(CAMPIONE_SILHOUETTE, len(X_scaled))
+    silhouette = silhouette_score(X_scaled, stimatore.labels_, sample_size=campione,
+                                  random_state=RANDOM_STATE)
+    return {'k': k, 'Inerzia': stimatore.inertia_, 'Silhouette': silhouette,
+            'Metodo': type(stimatore).__name__}
+
+
+def sweep_k(X_scaled, valori_k=K_SWEEP, max_workers=None):
+    """Confronto tra valori di k, un thread per valore"""
+    valori_k = list(valori_k)
+    max_workers = max_workers or min(len(valori_k), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_valuta_k, X_scaled, k) for k in valori_k]
+        return pd.DataFrame([f.result() for f in futures])
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Cubo di aggregazione dietro i filtri globali della dashboard
+
+Il dataset unificato è ridotto una volta sola a celle (Anno, GrpArea, Anni,
+MacroCategoria, TipoTessera, MmbSex): per ogni cella numero di record, somme
+e conteggi non nulli delle misure, e gli elenchi ordinati (CSR) dei giocatori
+e delle associazioni distinti. I filtri della sidebar diventano una maschera
+sulle celle, gli aggregati standard bincount sulle celle selezionate e i
+distinti l'unione degli elenchi: nessuna passata sulle righe grezze, che si
+ricostruiscono (con un solo gather sul codice di cella) solo per le pagine
+che ne hanno bisogno.
+
+L'età è tenuta all'anno (non alla FasciaEta) perché lo slider della sidebar
+filtra su Anni esatti; le fasce si ottengono aggregando per Anni.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Filtri della sidebar: etichetta -> valori di CatLabel / MbtDesc
+MACRO_CATEGORIE = {
+    'Master/GM': ['GM', 'LM', 'MS'],
+    'Honor': ['HK', 'HA', 'HQ', 'HJ'],
+    '1a Categoria': ['1P', '1F', '1C', '1Q'],
+    '2a Categoria': ['2P', '2F', '2C', '2Q'],
+    '3a Categoria': ['3P', '3F', '3C', '3Q'],
+    '4a Categoria': ['4P', '4F', '4C', '4Q'],
+    'NC': ['NC', 'Ordinario Sportivo']
+}
+
+TIPI_TESSERA = {
+    'Agonista': ['Agonista'],
+    'Scuola Bridge': ['Scuola Bridge'],
+    'BAS (Bridge a Scuola)': ['Ist.Scolastici', 'Studente CAS', 'CAS Giovanile'],
+    'Ordinario Sportivo': ['Ordinario Sportivo'],
+    'Ordinario Amatoriale': ['Ordinario Amatoriale'],
+    'Non Agonista': ['Non Agonista'],
+    'Altro': ['Aderente', 'Normale', 'Promozionale', 'Estero']
+}
+
+CATEGORIA_TO_MACRO = {c: macro for macro, cats in MACRO_CATEGORIE.items() for c in cats}
+TESSERA_TO_TIPO = {t: tipo for tipo, tipi in TIPI_TESSERA.items() for t in tipi}
+
+# Dimensioni del cubo: nome -> (colonna sorgente, mapping, ordine etichette)
+DIMENSIONI = {
+    'Anno': ('Anno', None, None),
+    'GrpArea': ('GrpArea', None, None),
+    'Anni': ('Anni', None, None),
+    'MacroCategoria': ('CatLabel', CATEGORIA_TO_MACRO, list(MACRO_CATEGORIE)),
+    'TipoTessera': ('MbtDesc', TESSERA_TO_TIPO, list(TIPI_TESSERA)),
+    'MmbSex': ('MmbSex', None, None),
+}
+
+# Misure sommate per cella (con il numero di valori non nulli, per le medie)
+MISURE = ['GareGiocate', 'PuntiTotali', 'PuntiCampionati', 'Anni']
+
+# Oltre questa dimensione (gruppi x codici) i distinti si contano ordinando
+MAX_BITMAP = 1 << 26
+
+
+def _codifica(serie, mapping=None, ordine=None):
+    """Codici interi (-1 = mancante) ed etichette di una dimensione"""
+    if mapping is not None:
+        serie = serie.map(mapping)
+    if ordine is not None:
+        codici = pd.Categorical(serie, categories=ordine).codes.astype(np.int64)
+        return codici, np.array(ordine, dtype=object)
+    codici, etichette = pd.factorize(serie, sort=True)
+    return codici.astype(np.int64), np.asarray(etichette)
+
+
+def _elenchi_distinti(cella, valori, n_celle):
+    """
+    Valori distinti (codici >= 0) per cella in formato CSR:
+    restituisce (puntatori, codici) con i codici di ogni cella ordinati.
+    """
+    validi = valori >= 0
+    n_valori = int(valori.max()) + 1 if validi.any() else 1
+    coppie = np.unique(cella[validi] * n_valori + valori[validi])
+    celle_coppie = coppie // n_valori
+    puntatori = np.searchsorted(celle_coppie, np.arange(n_celle + 1))
+    return puntatori, (coppie % n_valori).astype(np.int32), n_valori
+
+
+def costruisci_cubo(df, col_assoc='Associazione'):
+    """
+    Costruisce il cubo dal dataset unificato.
+    col_assoc: colonna delle associazioni per il conteggio dei distinti
+    """
+    codici_righe = {}
+    etichette = {}
+    for dim, (colonna, mapping, ordine) in DIMENSIONI.items():
+        codici_righe[dim], etichette[dim] = _codifica(df[colonna], mapping, ordine)
+
+    # Chiave mista delle celle (codici spostati di 1 per includere i mancanti)
+    chiave = np.zeros(len(df), dtype=np.int64)
+    for dim in DIMENSIONI:
+        chiave = chiave * (len(etichette[dim]) + 1) + codici_righe[dim] + 1
+    _, prima_riga, cella = np.unique(chiave, return_index=True, return_inverse=True)
+    cella = cella.ravel()
+    n_celle = len(prima_riga)
+
+    cubo = {
+        'etichette': etichette,
+        'codici': {dim: codici_righe[dim][prima_riga] for dim in DIMENSIONI},
+        'record': np.bincount(cella, minlength=n_celle),
+        'somme': {},
+        'non_nulli': {},
+        'cella_riga': cella.astype(np.int32),
+    }
+
+    for misura in MISURE:
+        valori = pd.to_numeric(df[misura], errors='coerce').to_numpy(dtype=float)
+        presenti = ~np.isnan(valori)
+        cubo['somme'][misura] = np.bincount(cella[presenti], weights=valori[presenti], minlength=n_celle)
+        cubo['non_nulli'][misura] = np.bincount(cella[presenti], minlength=n_celle)
+
+    for nome, colonna in [('Giocatori', 'MmbCode'), ('Associazioni', col_assoc)]:
+        codici, _ = pd.factorize(df[colonna])
+        cubo[nome] = _elenchi_distinti(cella, codici.astype(np.int64), n_celle)
+
+    return cubo
+
+
+def _maschera_dim(cubo, dim, condizione):
+    """Maschera sulle celle da una condizione vettoriale sulle etichette (mancanti esclusi)"""
+    ok = np.append(np.asarray(condizione(cubo['etichette'][dim]), dtype=bool), False)
+    return ok[cubo['codici'][dim]]
+
+
+def seleziona(cubo, anni=None, regioni=None, eta=None, macro_categoria=None, tipo_tessera=None):
+    """
+    Maschera booleana sulle celle per i filtri globali (None = filtro non attivo).
+    eta: (minimo, massimo) inclusi; macro_categoria / tipo_tessera: chiavi di
+    MACRO_CATEGORIE / TIPI_TESSERA.
+    """
+    selezione = np.ones(len(cubo['record']), dtype=bool)
+    if anni is not None:
+        selezione &= _maschera_dim(cubo, 'Anno', lambda e: np.isin(e, list(anni)))
+    if regioni is not None:
+        selezione &= _maschera_dim(cubo, 'GrpArea', lambda e: np.isin(e, list(regioni)))
+    if eta is not None:
+        selezione &= _maschera_dim(cubo, 'Anni', lambda e: (e >= eta[0]) & (e <= eta[1]))
+    if macro_categoria is not None:
+        selezione &= _maschera_dim(cubo, 'MacroCategoria', lambda e: e == macro_categoria)
+    if tipo_tessera is not None:
+        selezione &= _maschera_dim(cubo, 'TipoTessera', lambda e: e == tipo_tessera)
+    return selezione
+
+
+def impronta_filtri(anni=None, regioni=None, eta=None, macro_categoria=None, tipo_tessera=None):
+    """
+    Impronta compatta (16 caratteri esadecimali) dello stato dei filtri globali,
+    usata come chiave delle cache di pagina. Stessi argomenti di seleziona.
+    """
+    stato = (
+        None if anni is None else tuple(sorted(int(a) for a in anni)),
+        None if regioni is None else tuple(sorted(regioni)),
+        None if eta is None else (float(eta[0]), float(eta[1])),
+        macro_categoria,
+        tipo_tessera,
+    )
+    return hashlib.blake2b(repr(stato).encode(), digest_size=8).hexdigest()
+
+
+def _conta_distinti(elenchi, celle, gruppi, n_gruppi):
+    """Numero di codici distinti per gruppo, unendo gli elenchi delle celle"""
+    puntatori, codici, n_valori = elenchi
+    lunghezze = puntatori[celle + 1] - puntatori[celle]
+    totale = int(lunghezze.sum())
+    if totale == 0:
+        return np.zeros(n_gruppi, dtype=np.int64)
+    # Indici di tutte le posizioni dei segmenti selezionati, senza cicli
+    partenze = np.repeat(puntatori[celle] - (np.cumsum(lunghezze) - lunghezze), lunghezze)
+    valori = codici[partenze + np.arange(totale)]
+    chiavi = np.repeat(gruppi, lunghezze) * n_valori + valori
+    if n_gruppi * n_valori <= MAX_BITMAP:
+        # Bitmap gruppi x valori: lineare nel numero di codici selezionati
+        visti = np.zeros(n_gruppi * n_valori, dtype=bool)
+        visti[chiavi] = True
+        return np.count_nonzero(visti.reshape(n_gruppi, n_valori), axis=1)
+    return np.bincount(np.unique(chiavi) // n_valori, minlength=n_gruppi)
+
+
+def aggrega(cubo, selezione, per=()):
+    """
+    Aggregati delle celle selezionate, raggruppati per le dimensioni in per.
+    Colonne: dimensioni, Record, Giocatori, Associazioni (distinti) e
+    Media<misura> per ogni misura (media sui valori non nulli, come pandas).
+    Come groupby(dropna=False), le dimensioni mancanti hanno etichetta NaN.
+    Senza dimensioni restituisce sempre una riga (anche a selezione vuota).
+    """
+    per = list(per)
+    celle = np.flatnonzero(selezione)
+    if per:
+        # Chiave mista delle dimensioni richieste (codici spostati di 1: le
+        # celle con una dimensione mancante formano un gruppo con etichetta NaN)
+        chiave = np.zeros(len(celle), dtype=np.int64)
+        for dim in per:
+            chiave = chiave * (len(cubo['etichette'][dim]) + 1) + cubo['codici'][dim][celle] + 1
+        chiavi, gruppi = np.unique(chiave, return_inverse=True)
+        gruppi = gruppi.ravel()
+        n_gruppi = len(chiavi)
+        risultato = pd.DataFrame(index=range(n_gruppi))
+        for dim in reversed(per):
+            etichette = np.concatenate([[np.nan], cubo['etichette'][dim].astype(object)])
+            risultato[dim] = etichette[chiavi % len(etichette)]
+            chiavi = chiavi // len(etichette)
+        risultato = risultato[per].infer_objects()
+    else:
+        gruppi = np.zeros(len(celle), dtype=np.int64)
+        n_gruppi = 1
+        risultato = pd.DataFrame(index=[0])
+
+    risultato['Record'] = np.bincount(gruppi, weights=cubo['record'][celle], minlength=n_gruppi).astype(np.int64)
+    for nome in ['Giocatori', 'Associazioni']:
+        risultato[nome] = _conta_distinti(cubo[nome], celle, gruppi, n_gruppi)
+    for misura in MISURE:
+        somma = np.bincount(gruppi, weights=cubo['somme'][misura][celle], minlength=n_gruppi)
+        n = np.bincount(gruppi, weights=cubo['non_nulli'][misura][celle], minlength=n_gruppi)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            risultato[f'Media{misura}'] = np.where(n > 0, somma / np.maximum(n, 1), np.nan)
+    return risultato
+
+
+def totali(cubo, selezione):
+    """Aggregati complessivi della selezione come dizionario"""
+    riga = aggrega(cubo, selezione)
+    return {col: riga[col].iat[0] for col in riga.columns}
+
+
+def righe_filtrate(df, cubo, selezione):
+    """Righe grezze della selezione (per le pagine con dettaglio per giocatore)"""
+    return df[selezione[cubo['cella_riga']]]
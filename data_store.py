@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Archivio colonnare tipizzato del dataset unificato FIGB 2017-2025
+
+Il CSV dati_unificati_2017_2025.csv resta il formato di scambio, ma ogni
+scrittura produce anche un file Feather (Arrow IPC non compresso) con schema
+esplicito: codici già ripuliti dagli spazi, Anno/Anni in int16, colonne a
+bassa cardinalità dictionary-encoded. La lettura è un memory-map del file,
+senza parsing del testo né inferenza dei tipi.
+"""
+
+import hashlib
+import json
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    feather = None
+    PYARROW_AVAILABLE = False
+
+# Paths
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / 'output'
+FILE_UNIFICATO_CSV = OUTPUT_DIR / 'dati_unificati_2017_2025.csv'
+FILE_UNIFICATO_FEATHER = OUTPUT_DIR / 'dati_unificati_2017_2025.feather'
+
+# Schema
+COLONNE_CODICE = ['MmbCode', 'MmbName']
+COLONNE_CATEGORICHE = ['GrpArea', 'CatLabel', 'MbtDesc', 'FasciaEta', 'FasciaPunti', 'MmbSex', 'Provincia']
+COLONNE_INT16 = ['Anno', 'Anni']
+COLONNE_INT32 = ['AssociazioneId']
+COLONNE_NUMERICHE = ['GareGiocate', 'PuntiTotali', 'PuntiCampionati']
+COLONNE_BOOL = ['IsScuolaBridge', 'IsAgonista', 'IsCittaMetropolitana']
+
+FASCE_ETA_LABELS = ['<18', '18-30', '30-40', '40-50', '50-60', '60-70', '70-80', '80-90', '90+']
+FASCE_PUNTI_LABELS = ['0', '1-500', '501-2000', '2001-5000', '5001-10000', '10001-20000', '20001-50000', '50000+']
+CATEGORIE_ORDINATE = {
+    'FasciaEta': FASCE_ETA_LABELS,
+    'FasciaPunti': FASCE_PUNTI_LABELS,
+}
+
+
+def _a_stringa(serie):
+    """Converte in str i valori non nulli (risolve le colonne a tipi misti)"""
+    serie = serie.astype(object)
+    mask = serie.notna()
+    serie[mask] = serie[mask].astype(str)
+    return serie
+
+
+def normalizza_schema(df):
+    """
+    Porta il DataFrame unificato allo schema dell'archivio.
+    Le colonne object con valori misti (int/str letti da Excel) diventano str,
+    ed è questo che in passato impediva la scrittura colonnare.
+    """
+    df = df.reset_index(drop=True)
+
+    for col in COLONNE_CODICE:
+        if col in df.columns:
+            df[col] = _a_stringa(df[col]).str.strip()
+
+    for colonne, dtype in [(COLONNE_INT16, np.int16), (COLONNE_INT32, np.int32)]:
+        for col in colonne:
+            if col in df.columns:
+                valori = pd.to_numeric(df[col], errors='coerce')
+                # intero solo se non ci sono mancanti (altrimenti resta float come nel CSV)
+                df[col] = valori.astype(dtype) if valori.notna().all() else valori
+
+    for col in COLONNE_NUMERICHE:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    for col in COLONNE_BOOL:
+        if col in df.columns and df[col].notna().all():
+            df[col] = df[col].astype(bool)
+
+    for col in COLONNE_CATEGORICHE:
+        if col not in df.columns:
+            continue
+        valori = _a_stringa(df[col])
+        if col in CATEGORIE_ORDINATE:
+            df[col] = pd.Categorical(valori, categories=CATEGORIE_ORDINATE[col], ordered=True)
+        else:
+            df[col] = valori.astype('category')
+
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = _a_stringa(df[col])
+
+    return df
+
+
+def _decodifica_categoriche(df):
+    """Riporta le categoriche a stringhe, con la stessa semantica del CSV"""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def archivio_aggiornato():
+    """True se il Feather esiste e non è più vecchio del CSV"""
+    if not PYARROW_AVAILABLE or not FILE_UNIFICATO_FEATHER.exists():
+        return False
+    if not FILE_UNIFICATO_CSV.exists():
+        return True
+    return FILE_UNIFICATO_FEATHER.stat().st_mtime >= FILE_UNIFICATO_CSV.stat().st_mtime
+
+
+def salva_dati_unificati(df):
+    """
+    Salva il dataset unificato: CSV (compatibilità) + Feather tipizzato.
+    Restituisce il DataFrame normalizzato.
+    """
+    df = normalizza_schema(df)
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    df.to_csv(FILE_UNIFICATO_CSV, index=False)
+    if PYARROW_AVAILABLE:
+        feather.write_feather(df, FILE_UNIFICATO_FEATHER, compression='uncompressed')
+    return df
+
+
+def carica_dati_unificati(colonne=None, categoriche=False):
+    """
+    Carica il dataset unificato dall'archivio colonnare (memory-map).
+    Se il Feather manca o è più vecchio del CSV, ripiega sul CSV normalizzato.
+
+    colonne: sottoinsieme di colonne da leggere (None = tutte)
+    categoriche: se False le colonne dictionary-encoded tornano stringhe,
+                 così groupby/concat si comportano come con il CSV
+    """
+    if archivio_aggiornato():
+        df = feather.read_feather(FILE_UNIFICATO_FEATHER, columns=colonne, memory_map=True)
+    else:
+        df = normalizza_schema(pd.read_csv(FILE_UNIFICATO_CSV, usecols=colonne, low_memory=False))
+
+    if not categoriche:
+        df = _decodifica_categoriche(df)
+    return df
+
+
+# ============================================================================
+# PARTIZIONI PER ANNO (ingestione incrementale)
+# ============================================================================
+PARTIZIONI_DIR = OUTPUT_DIR / 'partizioni'
+FILE_MANIFEST = PARTIZIONI_DIR / 'manifest.json'
+
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _parti_fogli(archivio):
+    """Mappa nome foglio -> parte XML dentro lo xlsx"""
+    workbook = ET.fromstring(archivio.read('xl/workbook.xml'))
+    rels = ET.fromstring(archivio.read('xl/_rels/workbook.xml.rels'))
+    target = {r.get('Id'): r.get('Target') for r in rels.iter(f'{_NS_PKG}Relationship')}
+
+    parti = {}
+    for sheet in workbook.iter(f'{_NS_MAIN}sheet'):
+        percorso = target[sheet.get(f'{_NS_REL}id')]
+        parti[sheet.get('name')] = percorso.lstrip('/') if percorso.startswith('/') else f'xl/{percorso}'
+    return parti
+
+
+def chiave_foglio(percorso, foglio):
+    """Chiave del manifest per un foglio di un file sorgente"""
+    return f'{Path(percorso).name}:{foglio}'
+
+
+def impronte_fogli(percorso, fogli, manifest=None):
+    """
+    Calcola l'impronta (sha256 + mtime) dei fogli richiesti di un file Excel.
+    L'hash copre l'XML del foglio e le shared strings, senza passare da openpyxl.
+    Se mtime e dimensione coincidono con il manifest, riusa gli hash salvati.
+    """
+    stat = Path(percorso).stat()
+    manifest = manifest or {}
+    impronte = {}
+
+    for foglio in fogli:
+        voce = manifest.get(chiave_foglio(percorso, foglio))
+        if voce and voce['mtime'] == stat.st_mtime and voce['size'] == stat.st_size:
+            impronte[foglio] = {k: voce[k] for k in ('hash', 'mtime', 'size')}
+    mancanti = [f for f in fogli if f not in impronte]
+    if not mancanti:
+        return impronte
+
+    with zipfile.ZipFile(percorso) as archivio:
+        parti = _parti_fogli(archivio)
+        nomi = set(archivio.namelist())
+        shared = archivio.read('xl/sharedStrings.xml') if 'xl/sharedStrings.xml' in nomi else b''
+        hash_shared = hashlib.sha256(shared).hexdigest()
+        for foglio in mancanti:
+            h = hashlib.sha256(archivio.read(parti[foglio]))
+            h.update(hash_shared.encode())
+            impronte[foglio] = {'hash': h.hexdigest(), 'mtime': stat.st_mtime, 'size': stat.st_size}
+    return impronte
+
+
+def carica_manifest():
+    """Legge il manifest delle partizioni (vuoto se assente)"""
+    if not FILE_MANIFEST.exists():
+        return {}
+    with open(FILE_MANIFEST, 'r') as f:
+        return json.load(f)
+
+
+def salva_manifest(manifest):
+    """Scrive il manifest delle partizioni"""
+    PARTIZIONI_DIR.mkdir(parents=True, exist_ok=True)
+    with open(FILE_MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def file_partizione(anno):
+    """Percorso della partizione di un anno"""
+    return PARTIZIONI_DIR / f'anno={anno}.feather'
+
+
+def partizione_valida(anno, chiave, impronta, manifest):
+    """True se la partizione dell'anno esiste ed è stata prodotta dalla stessa impronta"""
+    voce = manifest.get(chiave)
+    return (
+        PYARROW_AVAILABLE
+        and file_partizione(anno).exists()
+        and voce is not None
+        and voce.get('anno') == anno
+        and voce['hash'] == impronta['hash']
+    )
+
+
+def scrivi_partizione(anno, df):
+    """Sostituisce su disco la partizione dell'anno"""
+    PARTIZIONI_DIR.mkdir(parents=True, exist_ok=True)
+    feather.write_feather(normalizza_schema(df), file_partizione(anno), compression='uncompressed')
+
+
+def registra_partizione(anno, chiave, impronta, manifest):
+    """Associa nel manifest (in memoria) la partizione all'impronta del foglio"""
+    if PYARROW_AVAILABLE:
+        manifest[chiave] = dict(impronta, anno=anno)
+
+
+def leggi_partizione(anno):
+    """Legge la partizione di un anno (categoriche decodificate)"""
+    return _decodifica_categoriche(feather.read_feather(file_partizione(anno), memory_map=True))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Deduplicazione fuzzy dei nomi di associazione con blocking su n-grammi
+
+Invece di confrontare ogni nome con tutti gli altri, i candidati vengono
+generati dai trigrammi in comune (prodotto di una matrice sparsa nomi x
+trigrammi, equivalente a un indice invertito). Le coppie candidate passano per
+i limiti superiori di SequenceMatcher (lunghezze, multiinsieme dei caratteri,
+calcolati in blocco con numpy) prima del calcolo completo del rapporto, e i
+gruppi sono costruiti con union-find: transitivi e indipendenti dall'ordine
+dei nomi. I gruppi sono salvati in cache su disco, con chiave l'insieme dei nomi.
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+# Paths
+BASE_DIR = Path(__file__).parent
+CACHE_DIR = BASE_DIR / 'output' / '.cache'
+
+# Versione dell'algoritmo: va incrementata se cambia il criterio di raggruppamento
+VERSIONE = 2
+
+# Margine tra la soglia di SequenceMatcher e la Dice minima sui trigrammi
+# usata per il blocking (a soglia 0.80 il minimo osservato è ~0.40)
+MARGINE_BLOCKING = 0.5
+
+# Righe della matrice dei trigrammi moltiplicate per volta (limita la memoria)
+DIMENSIONE_BLOCCO = 2000
+
+
+class UnionFind:
+    """Insiemi disgiunti con compressione dei cammini e unione per rango"""
+
+    def __init__(self, n):
+        self.padre = list(range(n))
+        self.rango = [0] * n
+
+    def trova(self, i):
+        radice = i
+        while self.padre[radice] != radice:
+            radice = self.padre[radice]
+        while self.padre[i] != radice:
+            self.padre[i], i = radice, self.padre[i]
+        return radice
+
+    def unisci(self, i, j):
+        ri, rj = self.trova(i), self.trova(j)
+        if ri == rj:
+            return
+        if self.rango[ri] < self.rango[rj]:
+            ri, rj = rj, ri
+        self.padre[rj] = ri
+        if self.rango[ri] == self.rango[rj]:
+            self.rango[ri] += 1
+
+    def gruppi(self):
+        """Lista degli insiemi (come liste di indici) con più di un elemento"""
+        membri = defaultdict(list)
+        for i in range(len(self.padre)):
+            membri[self.trova(i)].append(i)
+        return [g for g in membri.values() if len(g) > 1]
+
+
+def trigrammi(testo):
+    """Trigrammi del testo con uno spazio di bordo (cattura anche i nomi corti)"""
+    testo = f' {testo} '
+    return {testo[i:i + 3] for i in range(len(testo) - 2)}
+
+
+def _matrici(normalizzati):
+    """Matrice sparsa binaria nomi x trigrammi e matrice dei conteggi dei caratteri"""
+    vocabolario = {}
+    righe, colonne = [], []
+    for i, s in enumerate(normalizzati):
+        for t in trigrammi(s):
+            righe.append(i)
+            colonne.append(vocabolario.setdefault(t, len(vocabolario)))
+    tri = sparse.csr_matrix(
+        (np.ones(len(righe), dtype=np.float32), (righe, colonne)),
+        shape=(len(normalizzati), len(vocabolario))
+    )
+
+    alfabeto = {}
+    for s in normalizzati:
+        for c in s:
+            alfabeto.setdefault(c, len(alfabeto))
+    caratteri = np.zeros((len(normalizzati), max(len(alfabeto), 1)), dtype=np.int32)
+    for i, s in enumerate(normalizzati):
+        for c in s:
+            caratteri[i, alfabeto[c]] += 1
+    return tri, caratteri
+
+
+def coppie_candidate(normalizzati, soglia, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Coppie (i, j) con i < j che possono superare la soglia di SequenceMatcher.
+
+    1. blocking: Dice sui trigrammi >= soglia - MARGINE_BLOCKING, dal prodotto
+       sparso della matrice dei trigrammi (a blocchi di righe);
+    2. real_quick_ratio e quick_ratio di difflib calcolati in modo vettoriale
+       (stesse formule, stessi float): limiti superiori del rapporto.
+    """
+    n = len(normalizzati)
+    if n < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    delta = max(soglia - MARGINE_BLOCKING, 0.0)
+    tri, caratteri = _matrici(normalizzati)
+    n_tri = np.asarray(tri.sum(axis=1)).ravel()
+    lunghezze = np.array([len(s) for s in normalizzati], dtype=np.int64)
+
+    coppie_i, coppie_j = [], []
+    for inizio in range(0, n, dimensione_blocco):
+        comuni = (tri[inizio:inizio + dimensione_blocco] @ tri.T).tocoo()
+        i = comuni.row.astype(np.int64) + inizio
+        j = comuni.col.astype(np.int64)
+        tieni = (j > i) & (2 * comuni.data >= delta * (n_tri[i] + n_tri[j]))
+        i, j = i[tieni], j[tieni]
+
+        # real_quick_ratio: solo lunghezze
+        totale = lunghezze[i] + lunghezze[j]
+        tieni = 2.0 * np.minimum(lunghezze[i], lunghezze[j]) / totale >= soglia
+        i, j, totale = i[tieni], j[tieni], totale[tieni]
+
+        # quick_ratio: intersezione dei multiinsiemi di caratteri
+        corrispondenze = np.minimum(caratteri[i], caratteri[j]).sum(axis=1)
+        tieni = 2.0 * corrispondenze / totale >= soglia
+        ordine = np.lexsort((j[tieni], i[tieni]))
+        coppie_i.append(i[tieni][ordine])
+        coppie_j.append(j[tieni][ordine])
+
+    return np.concatenate(coppie_i), np.concatenate(coppie_j)
+
+
+def _chiave_cache(nomi, normalizzati, soglia, chiave, lunghezza_minima=0):
+    h = hashlib.sha256(f'{VERSIONE}|{chiave}|{soglia!r}|{lunghezza_minima}'.encode())
+    for nome, norm in sorted(zip(map(str, nomi), normalizzati)):
+        h.update(f'{nome}\x1f{norm}\x1e'.encode())
+    return h.hexdigest()[:24]
+
+
+def raggruppa_simili(nomi, normalizza, soglia=0.80, compatibili=None, chiave=None, noti=(),
+                     lunghezza_minima=0):
+    """
+    Raggruppa i nomi simili.
+
+    nomi: lista di nomi originali (unici)
+    normalizza: funzione nome -> forma normalizzata ('' = escluso dal confronto)
+    soglia: rapporto minimo di SequenceMatcher tra le forme normalizzate
+    compatibili: funzione opzionale (nome1, nome2) -> bool che vieta le singole
+                 unioni (i gruppi restano transitivi)
+    chiave: nome della cache su disco (None = nessuna cache)
+    noti: nomi già risolti in precedenza; sono confrontati solo con i nuovi
+          (le coppie tra nomi noti non vengono rivalutate)
+    lunghezza_minima: le forme più corte entrano solo nei gruppi di forme
+                      identiche, non nel confronto fuzzy (rischio falsi positivi)
+
+    Restituisce una lista di gruppi (liste ordinate di nomi originali).
+    Con noti, solo i gruppi che contengono almeno un nome nuovo.
+    """
+    n_nuovi = len(nomi)
+    nomi = list(nomi) + list(noti)
+    normalizzati = [normalizza(n) for n in nomi]
+
+    def da_valutare(i, j):
+        return (i < n_nuovi or j < n_nuovi) and (compatibili is None or compatibili(nomi[i], nomi[j]))
+
+    file_cache = None
+    if chiave is not None:
+        file_cache = CACHE_DIR / f'dedup_{chiave}_{_chiave_cache(nomi, normalizzati, soglia, chiave, lunghezza_minima)}.json'
+        if file_cache.exists():
+            with open(file_cache, 'r') as f:
+                return json.load(f)
+
+    uf = UnionFind(len(nomi))
+
+    # Forme normalizzate identiche: stesso gruppo senza confronti di similarità,
+    # ma un nome entra solo se è compatibile con tutti i nomi già nel gruppo
+    per_forma = defaultdict(list)
+    for i, norm in enumerate(normalizzati):
+        if norm:
+            per_forma[norm].append(i)
+    rappresentanti = []
+    for indici in per_forma.values():
+        rappresentanti.append(indici[0])
+        gruppo = [indici[0]]
+        for j in indici[1:]:
+            if da_valutare(indici[0], j) and (
+                    compatibili is None or all(compatibili(nomi[m], nomi[j]) for m in gruppo[1:])):
+                uf.unisci(indici[0], j)
+                gruppo.append(j)
+
+    rappresentanti = [i for i in rappresentanti if len(normalizzati[i]) >= lunghezza_minima]
+    forme = [normalizzati[i] for i in rappresentanti]
+    coppie_i, coppie_j = coppie_candidate(forme, soglia)
+    if len(noti) and len(coppie_i):
+        rapp = np.array(rappresentanti, dtype=np.int64)
+        tieni = (rapp[coppie_i] < n_nuovi) | (rapp[coppie_j] < n_nuovi)
+        coppie_i, coppie_j = coppie_i[tieni], coppie_j[tieni]
+
+    matcher = SequenceMatcher(None)
+    corrente = None
+    for a, b in zip(coppie_i.tolist(), coppie_j.tolist()):
+        # Coppie ordinate per a: la tabella b2j è costruita una volta per nome
+        if a != corrente:
+            matcher.set_seq2(forme[a])
+            corrente = a
+        matcher.set_seq1(forme[b])
+        if matcher.ratio() < soglia:
+            continue
+        i, j = rappresentanti[a], rappresentanti[b]
+        if da_valutare(i, j):
+            uf.unisci(i, j)
+
+    gruppi = sorted(sorted(nomi[i] for i in g) for g in uf.gruppi() if min(g) < n_nuovi)
+
+    if file_cache is not None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(file_cache, 'w') as f:
+            json.dump(gruppi, f, ensure_ascii=False)
+    return gruppi
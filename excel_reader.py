@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Lettore Excel parallelo e in streaming per i fogli di tesseramento
+
+Ogni foglio viene letto da un processo separato: il workbook è aperto una
+sola volta per processo in modalità read-only, le righe sono lette in
+streaming a blocchi, tipizzate con lo schema dell'archivio e scritte
+direttamente nella partizione dell'anno. Al processo principale torna solo
+il riepilogo dei tempi (i dati li rilegge in memory-map dalla partizione).
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data_store import normalizza_schema, scrivi_partizione, PYARROW_AVAILABLE
+
+DIMENSIONE_BLOCCO = 20000
+
+
+def _intestazione(riga):
+    """Nomi colonna come li produce pd.read_excel"""
+    return [str(c) if c is not None else f'Unnamed: {i}' for i, c in enumerate(riga)]
+
+
+def leggi_foglio(percorso, foglio, anno, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Legge un foglio in streaming e ne scrive la partizione.
+    Restituisce (tempi, df): df è None se la partizione è stata scritta su disco.
+    """
+    from openpyxl import load_workbook
+
+    tempi = {'anno': anno, 'foglio': foglio, 'file': os.path.basename(str(percorso))}
+    t0 = time.perf_counter()
+    wb = load_workbook(percorso, read_only=True, data_only=True)
+    tempi['apertura'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    righe = wb[foglio].iter_rows(values_only=True)
+    intestazione = next(righe, None)  # None: foglio vuoto, frame vuoto come pd.read_excel
+    colonne = _intestazione(intestazione) if intestazione is not None else []
+    blocchi = []
+    blocco = []
+    for riga in righe:
+        if all(v is None for v in riga):
+            continue
+        blocco.append(riga)
+        if len(blocco) >= dimensione_blocco:
+            blocchi.append(pd.DataFrame.from_records(blocco, columns=colonne))
+            blocco = []
+    if blocco or not blocchi:
+        blocchi.append(pd.DataFrame.from_records(blocco, columns=colonne))
+    wb.close()
+    tempi['lettura'] = time.perf_counter() - t0
+
+    # Tipizzazione unica sul foglio intero: stessi dtype di pd.read_excel
+    t0 = time.perf_counter()
+    df = pd.concat(blocchi, ignore_index=True)
+    df['Anno'] = anno
+    df = normalizza_schema(df)
+    tempi['righe'] = len(df)
+    if PYARROW_AVAILABLE:
+        scrivi_partizione(anno, df)
+        df = None
+    tempi['scrittura'] = time.perf_counter() - t0
+    return tempi, df
+
+
+def leggi_fogli_parallelo(richieste, max_workers=None):
+    """
+    Legge più fogli in parallelo.
+    richieste: lista di (percorso, foglio, anno)
+    Restituisce (lista tempi, {anno: df}) con i df solo se le partizioni non sono disponibili.
+    """
+    if not richieste:
+        return [], {}
+
+    max_workers = max_workers or min(len(richieste), os.cpu_count() or 1)
+    tempi = []
+    dati = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(leggi_foglio, str(p), foglio, anno) for p, foglio, anno in richieste]
+        for future in futures:
+            t, df = future.result()
+            tempi.append(t)
+            if df is not None:
+                dati[t['anno']] = df
+    return tempi, dati
+
+
+def stampa_tempi(tempi):
+    """Stampa il dettaglio dei tempi per foglio"""
+    if not tempi:
+        print("   Nessun foglio riletto da Excel")
+        return
+    print(f"   {'Anno':<6}{'Foglio':<10}{'Righe':>10}{'Apertura':>11}{'Lettura':>10}{'Scrittura':>11}{'Totale':>9}")
+    for t in sorted(tempi, key=lambda x: x['anno']):
+        totale = t['apertura'] + t['lettura'] + t['scrittura']
+        print(f"   {t['anno']:<6}{t['foglio']:<10}{t['righe']:>10,}"
+              f"{t['apertura']:>10.2f}s{t['lettura']:>9.2f}s{t['scrittura']:>10.2f}s{totale:>8.2f}s")
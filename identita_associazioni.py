@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Identità delle associazioni: normalizzazione dei nomi e ID canonici
+
+Unico punto di risoluzione dei nomi di associazione, usato da
+05_fuzzy_match_associazioni.py e da Script/pulizia_associazioni.py.
+Le regole di normalizzazione sono compilate una volta sola e memoizzate per
+nome; il raggruppamento usa dedup_associazioni. Il risultato è una tabella
+persistente (MmbGroup, Nome) -> AssociazioneId / Associazione: le
+esecuzioni successive risolvono solo i nomi non ancora presenti, e gli ID
+già assegnati non cambiano.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dedup_associazioni import raggruppa_simili
+
+# Paths
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / 'output'
+
+# =============================================================================
+# REGOLE DI NORMALIZZAZIONE
+# =============================================================================
+
+# Abbreviazioni comuni da espandere
+ABBREVIAZIONI = {
+    'C.LO': 'CIRCOLO',
+    'CLO': 'CIRCOLO',
+    'BR.': 'BRIDGE',
+    'BR': 'BRIDGE',
+    'ASS.': 'ASSOCIAZIONE',
+    'ASSOC.': 'ASSOCIAZIONE',
+    'S.': 'SAN',
+    'SS.': 'SANTI',
+    'SPORT.': 'SPORTIVA',
+    'DILETT.': 'DILETTANTISTICA',
+    'RM': 'ROMA',
+    'MI': 'MILANO',
+    'TO': 'TORINO',
+    'NA': 'NAPOLI',
+    'BO': 'BOLOGNA',
+    'FI': 'FIRENZE',
+    'GE': 'GENOVA',
+    'VE': 'VENEZIA',
+    'PD': 'PADOVA',
+    'BA': 'BARI',
+    'PA': 'PALERMO',
+    'CT': 'CATANIA',
+    'CA': 'CAGLIARI',
+    'TS': 'TRIESTE',
+    'PG': 'PERUGIA',
+    'AN': 'ANCONA',
+    'RI': 'RIETI',
+    'SR': 'SIRACUSA',
+}
+
+# Forme giuridiche e parole generiche ignorate nel confronto
+PAROLE_GENERICHE = [
+    'ASD', 'SSD', 'ARL', 'SRL', 'APD', 'APSD', 'ACSD',
+    'ASSOCIAZIONE', 'CIRCOLO', 'CLUB', 'SPORTIVA', 'DILETTANTISTICA',
+]
+
+# Suffissi di forma giuridica rimossi dalla normalizzazione conservativa
+SUFFISSI = [
+    ' - ASD', ' -ASD', ' ASD', ' A.S.D.', ' A.S.D',
+    ' - APS', ' -APS', ' APS', ' A.P.S.', ' A.P.S',
+    ' - APD', ' -APD', ' APD', ' A.P.D.', ' A.P.D',
+    ' ONLUS', ' ODV', ' ETS', ' - SOMS', ' SOMS',
+    ' - ', '- '
+]
+
+# Mapping manuale per casi noti
+MAPPING_MANUALE = {
+    'A.B.SAN GIORGIO DEL SANNIO': 'BRIDGE SAN GIORGIO DEL SANNIO',
+    'A.B.S.GIORGIO SANNIO': 'BRIDGE SAN GIORGIO DEL SANNIO',
+    'ANKON BRIDGE': 'ANKON BRIDGE ANCONA',
+    'ANKON BRIDGE – RIVIERA DEL CONERO': 'ANKON BRIDGE ANCONA',
+    'A.S.D.ALESSANDRIA BRIDGE': 'ALESSANDRIA BRIDGE',
+    'ALESSANDRIA BRIDGE A.S.D.': 'ALESSANDRIA BRIDGE',
+    'ASD C.LO CITTADINO FROSINONE': 'CIRCOLO CITTADINO FROSINONE',
+    'ASD CIRCOLO CITTADINO FROSINONE': 'CIRCOLO CITTADINO FROSINONE',
+    'A.BRIDGE CIRCOLO 1871': 'CIRCOLO 1871 CATANZARO',
+    'A.BR.CIRCOLO 1871 CATANZARO': 'CIRCOLO 1871 CATANZARO',
+    'ALPI APUANE': 'ALPI APUANE BRIDGE',
+    'ALPI APUANE CASTELLO DI SAN GIORGIO': 'ALPI APUANE BRIDGE',
+}
+
+# Città italiane (per evitare merge tra associazioni di città diverse)
+CITTA_ITALIANE = {
+    'ROMA', 'MILANO', 'NAPOLI', 'TORINO', 'PALERMO', 'GENOVA', 'BOLOGNA',
+    'FIRENZE', 'BARI', 'CATANIA', 'CATANZARO', 'VENEZIA', 'VERONA', 'MESSINA',
+    'PADOVA', 'TRIESTE', 'TARANTO', 'BRESCIA', 'PARMA', 'MODENA', 'REGGIO',
+    'PERUGIA', 'LIVORNO', 'RAVENNA', 'CAGLIARI', 'FOGGIA', 'RIMINI', 'SALERNO',
+    'FERRARA', 'SASSARI', 'LATINA', 'GIUGLIANO', 'MONZA', 'SIRACUSA', 'PESCARA',
+    'BERGAMO', 'FORLÌ', 'TRENTO', 'VICENZA', 'TERNI', 'BOLZANO', 'NOVARA',
+    'PIACENZA', 'ANCONA', 'ANDRIA', 'AREZZO', 'UDINE', 'CESENA', 'LECCE',
+    'PESARO', 'BARLETTA', 'ALESSANDRIA', 'PISA', 'PISTOIA', 'LUCCA', 'COMO',
+    'CASERTA', 'BRINDISI', 'COSENZA', 'RAGUSA', 'TRAPANI', 'JESI', 'PORDENONE',
+    'DESIO', 'SORRENTO', 'BRENO', 'ORISTANO', 'IVREA', 'SORA', 'FROSINONE',
+    'AVELLINO', 'BAVENO', 'MANTOVA', 'BIELLA', 'CREMONA', 'CREMA', 'PAVIA', 'VARESE',
+    'SANNIO', 'GARDA', 'SELARGIUS', 'CONEGLIANO', 'SASSUOLO', 'CAGLI'
+}
+
+# Abbreviazioni province in coda al nome (es. "RI", "- CT")
+ABBREV_PROVINCE = {
+    'RI': 'RIETI', 'RN': 'RIMINI', 'RM': 'ROMA', 'MI': 'MILANO', 'TO': 'TORINO',
+    'NA': 'NAPOLI', 'FI': 'FIRENZE', 'BO': 'BOLOGNA', 'GE': 'GENOVA', 'PA': 'PALERMO',
+    'VE': 'VENEZIA', 'VR': 'VERONA', 'PD': 'PADOVA', 'TS': 'TRIESTE', 'BA': 'BARI',
+    'CT': 'CATANIA', 'CZ': 'CATANZARO', 'CA': 'CAGLIARI', 'PE': 'PESCARA'
+}
+
+# Regex precompilate
+_RE_TRATTINI = re.compile(r'[–—]')
+_RE_PUNTEGGIATURA = re.compile(r'[^\w\s]')
+_RE_SPAZI = re.compile(r'\s+')
+_RE_GENERICHE = re.compile(r'\b(?:' + '|'.join(PAROLE_GENERICHE) + r')\b')
+_RE_NUMERI = re.compile(r'\d+')
+_RE_PROVINCIA_FINALE = re.compile(r'[ -](' + '|'.join(ABBREV_PROVINCE) + r')$')
+# Città più lunghe prima: a parità di posizione vince il nome completo (CAGLIARI, non CAGLI)
+_RE_CITTA = re.compile('|'.join(sorted(map(re.escape, CITTA_ITALIANE), key=len, reverse=True)))
+
+
+@lru_cache(maxsize=None)
+def normalizza_confronto(nome):
+    """
+    Forma per il confronto fuzzy: maiuscolo, senza punteggiatura,
+    abbreviazioni espanse e parole generiche rimosse.
+    """
+    s = str(nome).upper().strip()
+    s = _RE_TRATTINI.sub(' ', s)
+    s = _RE_PUNTEGGIATURA.sub(' ', s)
+    s = ' '.join(ABBREVIAZIONI.get(w, w) for w in s.split())
+    s = _RE_GENERICHE.sub('', s)
+    return _RE_SPAZI.sub(' ', s).strip()
+
+
+@lru_cache(maxsize=None)
+def normalizza_nome(nome):
+    """Forma conservativa: maiuscolo, senza suffissi di forma giuridica"""
+    nome = str(nome).upper().strip()
+    for suff in SUFFISSI:
+        if nome.endswith(suff):
+            nome = nome[:-len(suff)]
+    return ' '.join(nome.split()).strip()
+
+
+@lru_cache(maxsize=None)
+def estrai_citta(nome):
+    """Estrae la città dal nome se presente (sigla provincia finale o nome città)"""
+    nome_upper = str(nome).upper()
+    trovata = _RE_PROVINCIA_FINALE.search(nome_upper)
+    if trovata:
+        return ABBREV_PROVINCE[trovata.group(1)]
+    trovata = _RE_CITTA.search(nome_upper)
+    return trovata.group(0) if trovata else None
+
+
+@lru_cache(maxsize=None)
+def estrai_numeri(nome):
+    """Estrae i numeri dal nome (per evitare merge di 'nr. 3' con 'nr. 6')"""
+    numeri = _RE_NUMERI.findall(str(nome))
+    return tuple(numeri) if numeri else None
+
+
+def sono_stesso_posto(n1, n2):
+    """False se i due nomi indicano città diverse o numeri diversi"""
+    citta1, citta2 = estrai_citta(n1), estrai_citta(n2)
+    if citta1 and citta2 and citta1 != citta2:
+        return False
+    num1, num2 = estrai_numeri(n1), estrai_numeri(n2)
+    if num1 and num2 and num1 != num2:
+        return False
+    return True
+
+
+def nome_canonico(varianti):
+    """Nome canonico di un gruppo: il più lungo, poi quello con CIRCOLO/BRIDGE esplicito"""
+    return max(varianti, key=lambda x: (len(x), x.count('CIRCOLO'), x.count('BRIDGE'), x))
+
+
+# =============================================================================
+# PROFILI DI RISOLUZIONE
+# =============================================================================
+# fuzzy: regole di 05_fuzzy_match_associazioni (soglia 0.80, mapping manuale)
+# conservativo: regole di Script/pulizia_associazioni (duplicati esatti di
+#               qualsiasi lunghezza; fuzzy con soglia 0.92, stessa città e
+#               stessi numeri, nomi di almeno 10 caratteri; niente mapping manuale)
+PROFILI = {
+    'fuzzy': {
+        'normalizza': normalizza_confronto,
+        'soglia': 0.80,
+        'compatibili': None,
+        'lunghezza_minima': 0,
+        'manuale': True,
+        'tabella': OUTPUT_DIR / 'associazioni_id.csv',
+    },
+    'conservativo': {
+        'normalizza': normalizza_nome,
+        'soglia': 0.92,
+        'compatibili': sono_stesso_posto,
+        'lunghezza_minima': 10,
+        'manuale': False,
+        'tabella': OUTPUT_DIR / 'associazioni_id_conservativo.csv',
+    },
+}
+
+COLONNE_TABELLA = ['MmbGroup', 'Nome', 'AssociazioneId', 'Associazione']
+
+
+def carica_tabella(profilo='fuzzy'):
+    """Tabella degli ID canonici (vuota se non ancora creata)"""
+    percorso = PROFILI[profilo]['tabella']
+    if not percorso.exists():
+        return pd.DataFrame(columns=COLONNE_TABELLA)
+    return pd.read_csv(percorso, dtype={'MmbGroup': str, 'Nome': str, 'Associazione': str})
+
+
+def salva_tabella(tabella, profilo='fuzzy'):
+    """Scrive la tabella degli ID canonici"""
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    tabella.to_csv(PROFILI[profilo]['tabella'], index=False)
+
+
+def _gruppi_manuali(nomi):
+    """Nomi con mapping manuale, raggruppati per nome di destinazione"""
+    gruppi = {}
+    for nome in nomi:
+        destinazione = MAPPING_MANUALE.get(str(nome).upper().strip())
+        if destinazione:
+            gruppi.setdefault(destinazione, []).append(nome)
+    return gruppi
+
+
+def risolvi_associazioni(df, col_nome='GrpName', profilo='fuzzy', incrementale=True):
+    """
+    Assegna a ogni (MmbGroup, nome) l'ID canonico dell'associazione.
+
+    In modalità incrementale i nomi già presenti nella tabella non vengono
+    rivalutati: i nomi nuovi entrano nel gruppo di un nome noto simile (prendendo
+    il suo ID e il suo nome canonico) oppure formano nuovi gruppi con nuovi ID.
+    Restituisce la tabella completa (salvata anche su disco).
+    """
+    config = PROFILI[profilo]
+    tabella = carica_tabella(profilo) if incrementale else pd.DataFrame(columns=COLONNE_TABELLA)
+
+    colonne = [col_nome] + (['MmbGroup'] if 'MmbGroup' in df.columns else [])
+    coppie = df[colonne].dropna(subset=[col_nome]).drop_duplicates()
+    coppie = coppie.rename(columns={col_nome: 'Nome'})
+    coppie['Nome'] = coppie['Nome'].astype(str)
+    if 'MmbGroup' in coppie.columns:
+        coppie['MmbGroup'] = coppie['MmbGroup'].astype(str)
+    else:
+        coppie['MmbGroup'] = np.nan
+
+    id_noti = dict(zip(tabella['Nome'], tabella['AssociazioneId']))
+    canonico_id = dict(zip(tabella['AssociazioneId'], tabella['Associazione']))
+    id_canonico = {canonico: i for i, canonico in canonico_id.items()}
+    nomi_nuovi = sorted(set(coppie['Nome']) - set(id_noti))
+    prossimo_id = int(tabella['AssociazioneId'].max()) + 1 if len(tabella) else 1
+
+    def assegna(gruppo, canonico):
+        """ID di un nome noto del gruppo (il più basso), altrimenti un ID nuovo"""
+        nonlocal prossimo_id
+        esistenti = [id_noti[n] for n in gruppo if n in id_noti]
+        if canonico in id_canonico:
+            esistenti.append(id_canonico[canonico])
+        if esistenti:
+            id_gruppo = min(esistenti)
+        else:
+            id_gruppo = prossimo_id
+            prossimo_id += 1
+            canonico_id[id_gruppo] = canonico
+            id_canonico[canonico] = id_gruppo
+        for nome in gruppo:
+            id_noti.setdefault(nome, id_gruppo)
+
+    # 1. mapping manuale (esclude i nomi dal confronto fuzzy)
+    if config['manuale']:
+        for destinazione, nomi in _gruppi_manuali(nomi_nuovi).items():
+            assegna(nomi, destinazione)
+    restanti = [n for n in nomi_nuovi if n not in id_noti]
+
+    # 2. raggruppamento fuzzy dei restanti, confrontati anche con i nomi noti
+    if restanti:
+        # Senza nomi noti (prima esecuzione o --completo) il risultato va in cache
+        gruppi = raggruppa_simili(restanti, config['normalizza'], config['soglia'], config['compatibili'],
+                                  chiave=None if id_noti else profilo, noti=list(id_noti),
+                                  lunghezza_minima=config['lunghezza_minima'])
+        for gruppo in gruppi:
+            assegna(gruppo, nome_canonico(gruppo))
+
+    # 3. nomi isolati
+    for nome in restanti:
+        if nome not in id_noti:
+            assegna([nome], nome)
+
+    nuove = coppie.assign(
+        AssociazioneId=coppie['Nome'].map(id_noti).astype(int),
+    )
+    nuove['Associazione'] = nuove['AssociazioneId'].map(canonico_id)
+    tabella = pd.concat([tabella, nuove[COLONNE_TABELLA]], ignore_index=True)
+    tabella = tabella.drop_duplicates(subset=['MmbGroup', 'Nome'], keep='first')
+    tabella['AssociazioneId'] = tabella['AssociazioneId'].astype(int)
+    tabella = tabella.sort_values(['AssociazioneId', 'Nome'], kind='stable').reset_index(drop=True)
+
+    salva_tabella(tabella, profilo)
+    return tabella
+
+
+def mappa_canonici(tabella):
+    """Dizionari nome -> nome canonico e nome -> AssociazioneId"""
+    per_nome = tabella.drop_duplicates(subset=['Nome'])
+    return (
+        dict(zip(per_nome['Nome'], per_nome['Associazione'])),
+        dict(zip(per_nome['Nome'], per_nome['AssociazioneId'])),
+    )
+
+
+def gruppi_varianti(tabella):
+    """{nome_canonico: set(varianti)} per i gruppi con più di un nome"""
+    per_nome = tabella.drop_duplicates(subset=['Nome'])
+    gruppi = per_nome.groupby('Associazione')['Nome'].agg(set)
+    return {canonico: varianti for canonico, varianti in gruppi.items() if len(varianti) > 1}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Indice bitmap dei tesserati per anno e valore di dimensione
+
+Ogni MmbCode è codificato una volta sola come intero denso (0..n-1). Per ogni
+anno, e per ogni (anno, dimensione, valore), l'insieme dei tesserati è
+salvato compresso: bitmap di parole uint64 se la fetta è densa, array
+ordinato di id se è sparsa (la rappresentazione più piccola delle due).
+Le interrogazioni restituiscono sempre bitmap, così conteggi distinti, unioni
+e intersezioni tra anni e coorti sono operazioni bit a bit su poche migliaia
+di parole:
+
+    indice = IndiceTesserati(df, dimensioni=['MbtDesc'])
+    sb = indice.insieme(2018, MbtDesc='Scuola Bridge')
+    ritesserati = sb & indice.insieme(2019)
+    persi = sb & ~ritesserati          # ~ solo in intersezione con un insieme
+    conta(persi)
+"""
+
+import numpy as np
+import pandas as pd
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(parole):
+        return int(np.bitwise_count(parole).sum())
+else:
+    _BIT_PER_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(parole):
+        return int(_BIT_PER_BYTE[parole.view(np.uint8)].sum(dtype=np.int64))
+
+
+def conta(bitmap):
+    """Numero di tesserati nell'insieme"""
+    return _popcount(bitmap)
+
+
+class IndiceTesserati:
+    """Insiemi di tesserati per anno e per (anno, dimensione, valore)"""
+
+    def __init__(self, df, dimensioni=(), col_membro='MmbCode', col_anno='Anno'):
+        ids, self.codici = pd.factorize(df[col_membro])
+        self.n_membri = len(self.codici)
+        self.n_parole = max((self.n_membri + 63) // 64, 1)
+        self._posizioni = pd.Index(self.codici)
+
+        validi = ids >= 0
+        anni = df[col_anno].to_numpy()[validi]
+        ids = ids[validi].astype(np.int64)
+        self.anni = sorted(int(a) for a in pd.unique(anni))
+        self.fette = {}
+        self._aggiungi_fette(anni, ids, None, np.zeros(len(ids), dtype=np.int64), [None])
+        for dim in dimensioni:
+            valori, etichette = pd.factorize(df[dim].to_numpy()[validi])
+            tieni = valori >= 0
+            self._aggiungi_fette(anni[tieni], ids[tieni], dim, valori[tieni].astype(np.int64), list(etichette))
+
+    def _aggiungi_fette(self, anni, ids, dim, valori, etichette):
+        """Una fetta per ogni (anno, valore), con gli id distinti ordinati"""
+        indice_anno = np.searchsorted(self.anni, anni)
+        n_valori = len(etichette)
+        chiavi = np.unique((indice_anno * n_valori + valori) * self.n_membri + ids)
+        gruppi = chiavi // self.n_membri
+        confini = np.flatnonzero(np.diff(gruppi)) + 1
+        for segmento in np.split(chiavi, confini):
+            if len(segmento) == 0:
+                continue
+            gruppo = int(segmento[0] // self.n_membri)
+            anno = self.anni[gruppo // n_valori]
+            self.fette[(anno, dim, etichette[gruppo % n_valori])] = self._comprimi(segmento % self.n_membri)
+
+    def _comprimi(self, ids):
+        """Array ordinato int32 se occupa meno della bitmap, altrimenti bitmap"""
+        if len(ids) * 32 < self.n_parole * 64:
+            return ids.astype(np.int32)
+        return self.bitmap(ids)
+
+    def bitmap(self, ids):
+        """Bitmap (parole uint64) da un array di id"""
+        bit = np.zeros(self.n_parole * 64, dtype=bool)
+        bit[ids] = True
+        return np.packbits(bit, bitorder='little').view(np.uint64)
+
+    def vuoto(self):
+        return np.zeros(self.n_parole, dtype=np.uint64)
+
+    def _fetta(self, anno, dim=None, valore=None):
+        fetta = self.fette.get((anno, dim, valore))
+        if fetta is None:
+            return self.vuoto()
+        # copia: le bitmap salvate non devono essere modificate dagli operatori in place
+        return fetta.copy() if fetta.dtype == np.uint64 else self.bitmap(fetta)
+
+    def insieme(self, anno=None, **filtri):
+        """
+        Tesserati (bitmap) dell'anno indicato (int, lista di anni in unione o
+        None = tutti) che soddisfano i filtri dimensione=valore o
+        dimensione=[valori] (unione dei valori, intersezione tra dimensioni).
+        Le dimensioni sono intersecate per (tesserato, anno), non per riga: con
+        più righe nello stesso anno (es. due tessere o un trasferimento) un
+        filtro su più dimensioni va fatto sulle righe (da_codici).
+        """
+        if anno is None:
+            anni = self.anni
+        elif np.ndim(anno) == 0:
+            anni = [int(anno)]
+        else:
+            anni = [int(a) for a in anno]
+
+        risultato = self.vuoto()
+        for a in anni:
+            parziale = self._fetta(a)
+            for dim, valori in filtri.items():
+                valori = [valori] if np.ndim(valori) == 0 else valori
+                unione = self.vuoto()
+                for v in valori:
+                    unione |= self._fetta(a, dim, v)
+                parziale &= unione
+            risultato |= parziale
+        return risultato
+
+    def conta_per_anno(self, **filtri):
+        """Tesserati distinti per anno (Series indicizzata per anno)"""
+        return pd.Series({a: conta(self.insieme(a, **filtri)) for a in self.anni}, name='Tesserati')
+
+    def ids(self, codici):
+        """Id densi dei MmbCode (-1 se non presenti nell'indice)"""
+        return self._posizioni.get_indexer(pd.Index(codici))
+
+    def da_codici(self, codici):
+        """Bitmap dei MmbCode indicati (es. da righe già filtrate); gli sconosciuti sono ignorati"""
+        ids = self.ids(pd.unique(np.asarray(codici)))
+        return self.bitmap(ids[ids >= 0])
+
+    def contiene(self, bitmap, codici):
+        """Per ogni MmbCode indica se appartiene all'insieme (False se sconosciuto)"""
+        ids = self.ids(codici)
+        noti = ids >= 0
+        risultato = np.zeros(len(ids), dtype=bool)
+        ids = ids[noti]
+        risultato[noti] = ((bitmap[ids >> 6] >> (ids & 63).astype(np.uint64)) & np.uint64(1)) == 1
+        return risultato
+
+    def codici_di(self, bitmap):
+        """MmbCode dei tesserati nell'insieme"""
+        bit = np.unpackbits(bitmap.view(np.uint8), bitorder='little')[:self.n_membri]
+        return self.codici[np.flatnonzero(bit)]
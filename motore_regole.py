@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Motore di regole vettoriale per segmentazioni e punteggi a soglie
+
+Una tabella di regole è una lista ordinata di (etichetta, condizioni): vince
+la prima regola le cui condizioni sono tutte vere, altrimenti il default.
+Le condizioni sono triple (colonna, operatore, valore) valutate su colonne
+intere e la tabella è risolta con un solo np.select, come la catena di if
+che sostituisce (un confronto con NaN è falso anche qui).
+
+    REGOLE = [
+        ('Dormiente', [('GareMedie', '<', 1)]),
+        ('Sociale', [('GareMedie', '>=', 10), ('GareMedie', '<', 30)]),
+    ]
+    df['Cluster'] = classifica(df, REGOLE, default='Regolare')
+
+Un punteggio a soglie è una somma di tabelle con etichette numeriche:
+
+    df['Score'] = punteggio(df, [(FASCE_TREND, 0), (FASCE_ETA, 0)])
+"""
+
+import numpy as np
+
+OPERATORI = {
+    '<': lambda x, v: x < v,
+    '<=': lambda x, v: x <= v,
+    '>': lambda x, v: x > v,
+    '>=': lambda x, v: x >= v,
+    '==': lambda x, v: x == v,
+    'in': lambda x, v: x.isin(v),
+    'inizia': lambda x, v: x.astype(object).str.startswith(tuple(v), na=False),
+}
+
+
+def condizione(df, condizioni):
+    """Maschera booleana delle righe che soddisfano tutte le condizioni"""
+    maschera = np.ones(len(df), dtype=bool)
+    for colonna, operatore, valore in condizioni:
+        maschera &= np.asarray(OPERATORI[operatore](df[colonna], valore), dtype=bool)
+    return maschera
+
+
+def classifica(df, regole, default):
+    """Etichetta della prima regola soddisfatta per ogni riga (array)"""
+    return np.select([condizione(df, condizioni) for _, condizioni in regole],
+                     [etichetta for etichetta, _ in regole], default=default)
+
+
+def punteggio(df, tabelle):
+    """Somma dei punti assegnati da ogni (regole, default) della lista"""
+    totale = np.zeros(len(df), dtype=np.int64)
+    for regole, default in tabelle:
+        totale = totale + classifica(df, regole, default)
+    return totale
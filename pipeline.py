@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Pipeline di analisi FIGB: esecuzione degli script 01-10 secondo le dipendenze
+
+Ogni fase dichiara script, fasi a monte, input esterni e output. Una fase
+viene saltata se il suo timbro (output/.pipeline/<fase>.ok) è più recente di
+codice, input e timbri delle fasi a monte, e tutti gli output esistono.
+Le fasi indipendenti (04, 06-10 e il tensore delle transizioni dopo
+l'arricchimento e la tabella delle carriere) girano in parallelo, ognuna nel proprio processo.
+
+Uso:
+    python pipeline.py              # esegue solo le fasi non aggiornate
+    python pipeline.py --forza      # riesegue tutte le fasi
+    python pipeline.py 08 09        # forza le fasi indicate (e quelle a valle)
+    python pipeline.py --stato      # mostra lo stato senza eseguire nulla
+"""
+
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+# Paths
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / 'output'
+PIPELINE_DIR = OUTPUT_DIR / '.pipeline'
+LOG_DIR = PIPELINE_DIR / 'logs'
+
+DATI_UNIFICATI = OUTPUT_DIR / 'dati_unificati_2017_2025.csv'
+CODICE_COMUNE = [BASE_DIR / 'data_store.py']
+
+# ============================================================================
+# DEFINIZIONE FASI
+# ============================================================================
+# Il dataset unificato è riscritto in place da 03 e 05: le dipendenze sul
+# dataset sono quindi espresse tra fasi (timbri), non tra file.
+# 'carriere' materializza la tabella delle carriere letta da 04, 08, 09 e 10.
+# 'transizioni' precalcola il tensore delle transizioni letto dalla dashboard.
+FASI = {
+    '01': {
+        'script': 'Script/01_unifica_dati.py',
+        'dipende': [],
+        'codice': [BASE_DIR / 'excel_reader.py'],
+        'input': [BASE_DIR / 'Dati dal 17.xlsx', BASE_DIR / '2025 Dopo Natale.xlsx'],
+        'output': [DATI_UNIFICATI],
+    },
+    '03': {
+        'script': '03_arricchisci_province.py',
+        'dipende': ['01'],
+        'codice': [BASE_DIR / 'province_mapping.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_v2' / 'province_summary.csv',
+                   OUTPUT_DIR / 'results_v2' / 'regioni_popolazione.csv',
+                   OUTPUT_DIR / 'results_v2' / 'citta_non_mappate.csv'],
+    },
+    '05': {
+        'script': '05_fuzzy_match_associazioni.py',
+        'dipende': ['03'],
+        'codice': [BASE_DIR / 'dedup_associazioni.py', BASE_DIR / 'identita_associazioni.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'mapping_associazioni.csv'],
+    },
+    'carriere': {
+        'script': 'carriere_giocatori.py',
+        'dipende': ['05'],
+        'codice': [],
+        'input': [],
+        'output': [OUTPUT_DIR / 'carriere_giocatori.feather'],
+    },
+    'transizioni': {
+        'script': 'transizioni_categorie.py',
+        'dipende': ['05'],
+        'codice': [BASE_DIR / 'carriere_giocatori.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'transizioni_categorie.npz'],
+    },
+    '04': {
+        'script': '04_modello_recuperabilita.py',
+        'dipende': ['carriere'],
+        'codice': [BASE_DIR / 'carriere_giocatori.py', BASE_DIR / 'scoring_recuperabilita.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_recuperabilita' / 'summary_recuperabilita.json'],
+    },
+    '06': {
+        'script': '06_analisi_bridge_scuola.py',
+        'dipende': ['05'],
+        'codice': [],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_scuola' / 'summary_scuola.json'],
+    },
+    '07': {
+        'script': '07_analisi_conversione_corsi.py',
+        'dipende': ['05'],
+        'codice': [],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_conversione' / 'summary_conversione.json'],
+    },
+    '08': {
+        'script': '08_analisi_opportunita_crescita.py',
+        'dipende': ['carriere'],
+        'codice': [BASE_DIR / 'carriere_giocatori.py', BASE_DIR / 'province_mapping.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_opportunita' / 'summary_opportunita.json'],
+    },
+    '09': {
+        'script': '09_analisi_avanzate_innovative.py',
+        'dipende': ['carriere'],
+        'codice': [BASE_DIR / 'carriere_giocatori.py', BASE_DIR / 'retention_associazioni.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_avanzate' / 'summary_avanzate.json'],
+    },
+    '10': {
+        'script': '10_analisi_comportamentali.py',
+        'dipende': ['carriere'],
+        'codice': [BASE_DIR / 'carriere_giocatori.py'],
+        'input': [],
+        'output': [OUTPUT_DIR / 'results_comportamentali' / 'summary_comportamentali.json'],
+    },
+}
+
+
+def file_timbro(id_fase):
+    """Timbro di completamento della fase"""
+    return PIPELINE_DIR / f'{id_fase}.ok'
+
+
+def a_valle(fasi_scelte):
+    """Fasi indicate più tutte quelle che ne dipendono (transitivamente)"""
+    risultato = set(fasi_scelte)
+    cambiato = True
+    while cambiato:
+        cambiato = False
+        for id_fase, fase in FASI.items():
+            if id_fase not in risultato and risultato.intersection(fase['dipende']):
+                risultato.add(id_fase)
+                cambiato = True
+    return risultato
+
+
+def motivo_esecuzione(id_fase):
+    """
+    Restituisce il motivo per cui la fase va eseguita, None se è aggiornata.
+    """
+    fase = FASI[id_fase]
+    timbro = file_timbro(id_fase)
+    if not timbro.exists():
+        return "mai eseguita"
+    mancanti = [p for p in fase['output'] if not p.exists()]
+    if mancanti:
+        return f"output mancante: {mancanti[0].name}"
+
+    t_timbro = timbro.stat().st_mtime
+    dipendenze = [BASE_DIR / fase['script']] + CODICE_COMUNE + fase['codice'] + fase['input']
+    for percorso in dipendenze:
+        if percorso.exists() and percorso.stat().st_mtime > t_timbro:
+            return f"modificato: {percorso.name}"
+    for dep in fase['dipende']:
+        t_dep = file_timbro(dep).stat().st_mtime if file_timbro(dep).exists() else float('inf')
+        if t_dep > t_timbro:
+            return f"fase {dep} più recente"
+    return None
+
+
+def esegui_fase(id_fase):
+    """Esegue lo script della fase in un processo separato, con log dedicato"""
+    fase = FASI[id_fase]
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    log_file = LOG_DIR / f'{id_fase}.log'
+
+    t0 = time.perf_counter()
+    with open(log_file, 'w') as log:
+        esito = subprocess.run(
+            [sys.executable, str(BASE_DIR / fase['script'])],
+            cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT
+        )
+    durata = time.perf_counter() - t0
+
+    if esito.returncode == 0:
+        file_timbro(id_fase).touch()
+    return esito.returncode, durata
+
+
+def esegui_pipeline(forzate=(), max_workers=None):
+    """
+    Esegue la pipeline rispettando le dipendenze.
+    forzate: fasi da rieseguire comunque (insieme a quelle a valle)
+    """
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    forzate = a_valle(forzate)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    completate, fallite, bloccate = set(), set(), set()
+    in_corso = {}
+    t_inizio = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            # Avvia le fasi con tutte le dipendenze completate
+            for id_fase, fase in FASI.items():
+                if id_fase in completate | fallite | bloccate or id_fase in in_corso.values():
+                    continue
+                if (fallite | bloccate).intersection(fase['dipende']):
+                    bloccate.add(id_fase)
+                    print(f"   ⏭️  {id_fase} non eseguita (fase a monte fallita)")
+                    continue
+                if not set(fase['dipende']) <= completate:
+                    continue
+
+                motivo = "forzata" if id_fase in forzate else motivo_esecuzione(id_fase)
+                if motivo is None:
+                    completate.add(id_fase)
+                    print(f"   ✓ {id_fase} aggiornata, saltata")
+                    continue
+                print(f"   ▶ {id_fase} avviata ({motivo})")
+                in_corso[pool.submit(esegui_fase, id_fase)] = id_fase
+
+            if not in_corso:
+                break
+
+            terminate, _ = wait(list(in_corso), return_when=FIRST_COMPLETED)
+            for future in terminate:
+                id_fase = in_corso.pop(future)
+                returncode, durata = future.result()
+                if returncode == 0:
+                    completate.add(id_fase)
+                    print(f"   ✅ {id_fase} completata in {durata:.1f}s")
+                else:
+                    fallite.add(id_fase)
+                    print(f"   ❌ {id_fase} fallita (codice {returncode}), log: {LOG_DIR / f'{id_fase}.log'}")
+
+    print(f"\n   Tempo totale: {time.perf_counter() - t_inizio:.1f}s")
+    return not fallite
+
+
+def main():
+    print("=" * 60)
+    print("PIPELINE ANALISI FIGB")
+    print("=" * 60)
+
+    argomenti = [a for a in sys.argv[1:] if not a.startswith('--')]
+    sconosciute = [a for a in argomenti if a not in FASI]
+    if sconosciute:
+        print(f"Fasi sconosciute: {', '.join(sconosciute)} (disponibili: {', '.join(FASI)})")
+        sys.exit(2)
+
+    if '--stato' in sys.argv:
+        da_eseguire = set()
+        for id_fase, fase in FASI.items():
+            motivo = motivo_esecuzione(id_fase)
+            monte = da_eseguire.intersection(fase['dipende'])
+            if motivo is None and monte:
+                motivo = f"a valle di {', '.join(sorted(monte))}"
+            if motivo is not None:
+                da_eseguire.add(id_fase)
+            print(f"   {id_fase} {fase['script']:<40} {'aggiornata' if motivo is None else motivo}")
+        return
+
+    forzate = list(FASI) if '--forza' in sys.argv else argomenti
+    ok = esegui_pipeline(forzate)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
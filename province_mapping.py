@@ -4,6 +4,9 @@ Mapping province italiane con popolazione (ISTAT 2024)
 Include città metropolitane, capoluoghi e popolazione per calcolare tassi di penetrazione
 """
 
+from functools import lru_cache
+from pathlib import Path
+
 # Popolazione province italiane (ISTAT 2024 - dati in migliaia arrotondati)
 PROVINCE_POPOLAZIONE = {
     # PIEMONTE
@@ -382,16 +385,13 @@ COMUNE_TO_PROVINCIA = {
 }
 
 
-def get_provincia_from_city(city_name):
-    """
-    Dato il nome di una città, restituisce la provincia di appartenenza.
-    Restituisce None se non trovata.
-    """
-    if pd.isna(city_name) or city_name == '':
-        return None
+# Indice dei nomi provincia in maiuscolo (fallback quando la città è il capoluogo)
+PROVINCIA_DA_NOME = {prov.upper(): prov for prov in PROVINCE_POPOLAZIONE}
 
-    city_upper = str(city_name).upper().strip()
 
+@lru_cache(maxsize=None)
+def _risolvi_citta(city_upper):
+    """Provincia di un nome città già in maiuscolo e senza spazi ai bordi"""
     # Cerca prima nel mapping diretto
     if city_upper in COMUNE_TO_PROVINCIA:
         return COMUNE_TO_PROVINCIA[city_upper]
@@ -402,11 +402,46 @@ def get_provincia_from_city(city_name):
         return COMUNE_TO_PROVINCIA[city_clean]
 
     # Se il nome città corrisponde a una provincia, usa quella
-    for prov in PROVINCE_POPOLAZIONE.keys():
-        if prov.upper() == city_upper:
-            return prov
+    return PROVINCIA_DA_NOME.get(city_upper)
+
+
+def get_provincia_from_city(city_name):
+    """
+    Dato il nome di una città, restituisce la provincia di appartenenza.
+    Restituisce None se non trovata.
+    """
+    if pd.isna(city_name) or city_name == '':
+        return None
+    return _risolvi_citta(str(city_name).upper().strip())
+
+
+def province_da_citta(citta, file_report=None):
+    """
+    Risolve in blocco una Series di città: ogni città distinta è risolta una
+    sola volta e il risultato torna sui record tramite i codici (Categorical).
+    Se file_report è indicato, vi salva le città non risolte con il numero di record.
+    """
+    codici, uniche = pd.factorize(citta)
+    province = [get_provincia_from_city(c) for c in uniche]
+
+    categorie = sorted({p for p in province if p is not None})
+    posizione = {p: i for i, p in enumerate(categorie)}
+    codice_provincia = np.array([posizione.get(p, -1) for p in province] + [-1], dtype=np.int32)
+    # codici = -1 (città mancante) punta all'ultimo elemento, cioè -1
+    risultato = pd.Series(
+        pd.Categorical.from_codes(codice_provincia[codici], categories=categorie),
+        index=citta.index, name='Provincia'
+    )
+
+    if file_report is not None:
+        record = np.bincount(codici[codici >= 0], minlength=len(uniche))
+        non_risolte = pd.DataFrame({'AdmCity': uniche, 'Record': record})
+        non_risolte = non_risolte[codice_provincia[:-1] < 0]
+        non_risolte = non_risolte.sort_values(['Record', 'AdmCity'], ascending=[False, True])
+        Path(file_report).parent.mkdir(parents=True, exist_ok=True)
+        non_risolte.to_csv(file_report, index=False)
 
-    return None
+    return risultato
 
 
 def get_regione_from_provincia(provincia):
@@ -438,6 +473,8 @@ def calcola_tasso_penetrazione(tesserati, popolazione):
 
 # Import pandas per type hints
 try:
+    import numpy as np
     import pandas as pd
 except ImportError:
+    np = None
     pd = None
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Retention anno su anno per associazione (o per qualunque raggruppamento)
+
+Tutte le coppie (gruppo, anno -> anno successivo) sono calcolate in una sola
+passata: le terne distinte (gruppo, anno, giocatore) diventano chiavi intere
+ordinate e la presenza dello stesso giocatore nello stesso gruppo l'anno dopo
+è un test di appartenenza per ricerca binaria (searchsorted), al posto di
+insiemi Python intersecati gruppo per gruppo.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _chiave(*componenti):
+    """Chiave intera mista da codici non negativi: [(codici, cardinalità), ...]"""
+    chiave = np.zeros(len(componenti[0][0]), dtype=np.int64)
+    for codici, cardinalita in componenti:
+        chiave = chiave * cardinalita + codici
+    return chiave
+
+
+def appartiene(chiavi, riferimento, ordinato=False):
+    """
+    Maschera: quali chiavi compaiono in riferimento (test su array ordinato).
+    ordinato: riferimento è già ordinato e senza duplicati
+    """
+    if not ordinato:
+        riferimento = np.unique(riferimento)
+    if len(riferimento) == 0:
+        return np.zeros(len(chiavi), dtype=bool)
+    pos = np.minimum(np.searchsorted(riferimento, chiavi), len(riferimento) - 1)
+    return riferimento[pos] == chiavi
+
+
+def presente_anno_successivo(codici, anni, codici_rif, anni_rif):
+    """
+    Per ogni coppia (codice, anno) indica se (codice, anno + 1) compare tra
+    le coppie di riferimento. I codici sono interi non negativi.
+    """
+    codici, anni = np.asarray(codici, dtype=np.int64), np.asarray(anni, dtype=np.int64)
+    codici_rif, anni_rif = np.asarray(codici_rif, dtype=np.int64), np.asarray(anni_rif, dtype=np.int64)
+    if len(codici) == 0 or len(codici_rif) == 0:
+        return np.zeros(len(codici), dtype=bool)
+    base = min(anni.min(), anni_rif.min())
+    n_anni = max(anni.max() + 1, anni_rif.max()) - base + 1
+    return appartiene(
+        _chiave((codici, 1), (anni + 1 - base, n_anni)),
+        _chiave((codici_rif, 1), (anni_rif - base, n_anni))
+    )
+
+
+def retention_annuale(df, col_gruppo, col_membro='MmbCode', col_anno='Anno', passo='anno'):
+    """
+    Tesserati e ritesserati per ogni gruppo e anno, in una sola passata.
+
+    passo='anno': confronta l'anno con anno + 1 (solo se il gruppo è presente
+                  anche l'anno dopo)
+    passo='consecutivo': confronta ogni anno con il successivo anno in cui il
+                  gruppo è presente (anche non contiguo)
+
+    Restituisce un DataFrame [col_gruppo, Anno, AnnoSuccessivo, Tesserati,
+    Ritesserati, TassoRetention] ordinato per gruppo e anno; i gruppi o i
+    giocatori mancanti sono esclusi, come in groupby.
+    """
+    colonne = [col_gruppo, col_anno, 'AnnoSuccessivo', 'Tesserati', 'Ritesserati', 'TassoRetention']
+    gruppi, etichette = pd.factorize(df[col_gruppo], sort=True)
+    membri, _ = pd.factorize(df[col_membro])
+    anni = df[col_anno].to_numpy()
+    validi = (gruppi >= 0) & (membri >= 0) & pd.notna(anni)
+    if not validi.any():
+        return pd.DataFrame(columns=colonne)
+
+    gruppi = gruppi[validi].astype(np.int64)
+    membri = membri[validi].astype(np.int64)
+    anni = anni[validi].astype(np.int64)
+    anno_min = anni.min()
+    n_anni = anni.max() - anno_min + 2
+    n_membri = membri.max() + 1
+
+    # Terne distinte (gruppo, anno, giocatore), ordinate per gruppo e anno
+    terne = np.unique(_chiave((gruppi, 1), (anni - anno_min, n_anni), (membri, n_membri)))
+    membri_t = terne % n_membri
+    gruppo_anno_t = terne // n_membri
+
+    # Coppie (gruppo, anno) distinte e tesserati di ciascuna
+    gruppo_anno, tesserati = np.unique(gruppo_anno_t, return_counts=True)
+    g = gruppo_anno // n_anni
+    a = gruppo_anno % n_anni
+
+    if passo == 'anno':
+        successivo = a + 1
+        ha_successivo = appartiene(g * n_anni + successivo, gruppo_anno, ordinato=True)
+    elif passo == 'consecutivo':
+        # Anno successivo dello stesso gruppo: coppia seguente nell'ordinamento
+        successivo = np.append(a[1:], 0)
+        ha_successivo = np.append(g[1:] == g[:-1], False)
+    else:
+        raise ValueError(f"passo non valido: {passo}")
+
+    # Ogni terna cerca (gruppo, anno successivo del suo gruppo-anno, giocatore)
+    indice_coppia = np.repeat(np.arange(len(gruppo_anno)), tesserati)
+    cercate = (g[indice_coppia] * n_anni + successivo[indice_coppia]) * n_membri + membri_t
+    ritesserati = np.bincount(indice_coppia, weights=appartiene(cercate, terne, ordinato=True), minlength=len(gruppo_anno))
+
+    risultato = pd.DataFrame({
+        col_gruppo: etichette[g],
+        col_anno: a + anno_min,
+        'AnnoSuccessivo': successivo + anno_min,
+        'Tesserati': tesserati,
+        'Ritesserati': ritesserati.astype(np.int64),
+    })[ha_successivo].reset_index(drop=True)
+    risultato['TassoRetention'] = risultato['Ritesserati'] / risultato['Tesserati'] * 100
+    return risultato
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Indice di ricerca dei giocatori per nome o MmbCode
+
+Costruito una volta sul dataset unificato, lavora sui giocatori distinti e
+non sulle righe giocatore-anno:
+- nomi normalizzati (minuscolo, senza accenti né punteggiatura) e, per ogni
+  trigramma, l'elenco ordinato dei nomi che lo contengono; una ricerca
+  interseca gli elenchi dei trigrammi del testo e verifica la sottostringa
+  solo sui pochi candidati rimasti
+- righe di ogni giocatore in formato CSR ordinate per anno (grafici di dettaglio)
+- riepilogo della carriera per giocatore, calcolato in una sola passata
+
+    indice = IndiceRicerca(df)
+    trovati = indice.cerca('rossi mar')     # riepilogo ordinato per pertinenza
+    righe = indice.righe(trovati['Id'].iat[0])
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+LUNGHEZZA_GRAMMA = 3
+
+_RE_NON_ALFANUMERICI = re.compile(r'[^0-9a-z]+')
+
+
+def normalizza(testo):
+    """Minuscolo, senza accenti, punteggiatura e spazi multipli"""
+    testo = unicodedata.normalize('NFKD', str(testo)).encode('ascii', 'ignore').decode()
+    return _RE_NON_ALFANUMERICI.sub(' ', testo.lower()).strip()
+
+
+def trigrammi(testo):
+    """Trigrammi distinti di un testo già normalizzato"""
+    return {testo[i:i + LUNGHEZZA_GRAMMA] for i in range(len(testo) - LUNGHEZZA_GRAMMA + 1)}
+
+
+class IndiceRicerca:
+    """Ricerca per nome (trigrammi) o codice sui giocatori distinti"""
+
+    def __init__(self, df, col_assoc='Associazione'):
+        membri, self.codici = pd.factorize(df['MmbCode'])
+        n_membri = len(self.codici)
+        self._posizioni = pd.Index(self.codici)
+
+        # Righe di ogni giocatore ordinate per anno (CSR): l'ultima è la più recente
+        anni = df['Anno'].to_numpy()
+        ordine = np.lexsort((anni, membri))
+        ordine = ordine[membri[ordine] >= 0]
+        self._righe = ordine
+        self._puntatori = np.searchsorted(membri[ordine], np.arange(n_membri + 1))
+        prima, ultima = ordine[self._puntatori[:-1]], ordine[self._puntatori[1:] - 1]
+
+        gare = pd.to_numeric(df['GareGiocate'], errors='coerce').to_numpy(dtype=float)
+        presenti = (membri >= 0) & ~np.isnan(gare)
+        gare_totali = np.bincount(membri[presenti], weights=gare[presenti], minlength=n_membri)
+        n_gare = np.bincount(membri[presenti], minlength=n_membri)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gare_medie = np.where(n_gare > 0, gare_totali / np.maximum(n_gare, 1), np.nan)
+
+        self.carriera = pd.DataFrame({
+            'Codice': self.codici,
+            'Nome': df['MmbName'].to_numpy()[ultima],
+            'Primo Anno': anni[prima],
+            'Ultimo Anno': anni[ultima],
+            'Anni Presenza': np.diff(self._puntatori),
+            'Gare Medie': gare_medie.round(1),
+            'Gare Totali': gare_totali,
+            'Età': df['Anni'].to_numpy()[ultima],
+            'Categoria': df['CatLabel'].to_numpy()[ultima],
+            'Associazione': df[col_assoc].to_numpy()[ultima],
+        })
+
+        # Nomi distinti normalizzati e giocatori che li hanno usati (CSR per nome)
+        nomi_righe = df['MmbName'].to_numpy()
+        validi = (membri >= 0) & pd.notna(nomi_righe)
+        nome_id, nomi = pd.factorize(pd.Series(nomi_righe[validi]).map(normalizza))
+        n_nomi = len(nomi)
+        coppie = np.unique(nome_id.astype(np.int64) * n_membri + membri[validi])
+        self._nomi = np.asarray(nomi, dtype=object)
+        self._membri_nome = (coppie % n_membri).astype(np.int32)
+        self._puntatori_nome = np.searchsorted(coppie // n_membri, np.arange(n_nomi + 1))
+
+        # Elenchi dei trigrammi: gramma -> id dei nomi (ordinati)
+        elenchi = {}
+        for i, nome in enumerate(self._nomi):
+            for gramma in trigrammi(nome):
+                elenchi.setdefault(gramma, []).append(i)
+        self._elenchi = {g: np.array(ids, dtype=np.int32) for g, ids in elenchi.items()}
+
+    def _nomi_con(self, testo):
+        """Id dei nomi normalizzati che contengono il testo"""
+        grammi = trigrammi(testo)
+        if not grammi:
+            # Testo più corto di un trigramma: scansione dei soli nomi distinti
+            return np.array([i for i, nome in enumerate(self._nomi) if testo in nome], dtype=np.int32)
+        elenchi = sorted((self._elenchi.get(g, np.empty(0, dtype=np.int32)) for g in grammi), key=len)
+        candidati = elenchi[0]
+        for elenco in elenchi[1:]:
+            if len(candidati) == 0:
+                break
+            candidati = np.intersect1d(candidati, elenco, assume_unique=True)
+        # I trigrammi non garantiscono l'ordine: verifica della sottostringa
+        return np.array([i for i in candidati if testo in self._nomi[i]], dtype=np.int32)
+
+    def cerca(self, testo, limite=None):
+        """
+        Giocatori il cui nome contiene il testo (o il cui MmbCode coincide),
+        con il riepilogo di carriera e una colonna Id (id interno del
+        giocatore). Ordine: codice, nome uguale, nome che inizia col testo,
+        parola che inizia col testo, altre occorrenze; a parità, i più
+        recenti e con più gare.
+        """
+        testo_norm = normalizza(testo)
+        pertinenza = {}
+
+        codice = self._posizioni.get_indexer([str(testo).strip()])[0]
+        if codice >= 0:
+            pertinenza[codice] = 0
+
+        if testo_norm:
+            for i in self._nomi_con(testo_norm):
+                nome = self._nomi[i]
+                if nome == testo_norm:
+                    livello = 1
+                elif nome.startswith(testo_norm):
+                    livello = 2
+                elif f' {testo_norm}' in f' {nome}':
+                    livello = 3
+                else:
+                    livello = 4
+                for membro in self._membri_nome[self._puntatori_nome[i]:self._puntatori_nome[i + 1]]:
+                    pertinenza[membro] = min(pertinenza.get(membro, livello), livello)
+
+        ids = np.fromiter(pertinenza, dtype=np.int64, count=len(pertinenza))
+        risultato = self.carriera.iloc[ids].copy()
+        risultato.insert(0, 'Id', ids)
+        risultato['Pertinenza'] = np.fromiter(pertinenza.values(), dtype=np.int64, count=len(pertinenza))
+        risultato = risultato.sort_values(['Pertinenza', 'Ultimo Anno', 'Gare Totali'],
+                                          ascending=[True, False, False])
+        risultato = risultato.drop(columns='Pertinenza').reset_index(drop=True)
+        return risultato if limite is None else risultato.head(limite)
+
+    def righe(self, membro):
+        """Posizioni (iloc) delle righe del giocatore, ordinate per anno"""
+        return self._righe[self._puntatori[membro]:self._puntatori[membro + 1]]
+
+    def presenti(self, membri, righe_ammesse):
+        """
+        Per ogni giocatore indica se ha almeno una riga ammessa
+        (righe_ammesse: funzione posizioni -> maschera, es. i filtri globali).
+        """
+        membri = np.asarray(membri, dtype=np.int64)
+        lunghezze = self._puntatori[membri + 1] - self._puntatori[membri]
+        totale = int(lunghezze.sum())
+        if totale == 0:
+            return np.zeros(len(membri), dtype=bool)
+        # Tutte le righe dei giocatori in un solo gather, poi conteggio per giocatore
+        partenze = np.repeat(self._puntatori[membri] - (np.cumsum(lunghezze) - lunghezze), lunghezze)
+        posizioni = self._righe[partenze + np.arange(totale)]
+        gruppo = np.repeat(np.arange(len(membri)), lunghezze)
+        ammesse = np.asarray(righe_ammesse(posizioni), dtype=bool)
+        return np.bincount(gruppo[ammesse], minlength=len(membri)) > 0
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Motore vettoriale dello score di recuperabilità dei bridgisti
+
+Tavole attuariali, pesi e regole del modello di 04_modello_recuperabilita,
+calcolati su colonne intere con NumPy invece che riga per riga.
+Le componenti (engagement, loyalty, recency, geographic, social, health)
+sono indipendenti dai pesi: cambiando PESI o le soglie di priorità basta
+rieseguire score_finale() e classifica_priorita().
+
+I risultati coincidono bit a bit con la versione riga per riga: le somme
+pesate seguono lo stesso ordine degli addendi e le potenze sono calcolate in
+Python sui pochi valori distinti (la pow vettoriale di NumPy può differire
+nell'ultima cifra).
+"""
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# TAVOLE ATTUARIALI ISTAT - RISCHIO MORTALITÀ E MALATTIA
+# =============================================================================
+# Dati basati su tavole di mortalità ISTAT 2023 e statistiche sanitarie
+
+# Probabilità di morte entro 1 anno per fascia d'età (per 1000)
+MORTALITA_PER_1000 = {
+    (0, 30): 0.3,      # Giovani: rischio bassissimo
+    (30, 40): 0.8,
+    (40, 50): 1.8,
+    (50, 55): 3.5,
+    (55, 60): 5.2,
+    (60, 65): 8.5,
+    (65, 70): 14.0,
+    (70, 75): 23.0,
+    (75, 80): 42.0,
+    (80, 85): 78.0,
+    (85, 90): 145.0,
+    (90, 95): 250.0,
+    (95, 120): 380.0
+}
+
+# Probabilità di malattia invalidante/limitante entro 1 anno (per 1000)
+# Include: problemi mobilità, vista, demenza iniziale, etc.
+MALATTIA_INVALIDANTE_PER_1000 = {
+    (0, 30): 2.0,
+    (30, 40): 5.0,
+    (40, 50): 12.0,
+    (50, 55): 20.0,
+    (55, 60): 32.0,
+    (60, 65): 48.0,
+    (65, 70): 72.0,
+    (70, 75): 105.0,
+    (75, 80): 155.0,
+    (80, 85): 220.0,
+    (85, 90): 310.0,
+    (90, 95): 420.0,
+    (95, 120): 550.0
+}
+
+# Fattore di rischio cumulativo per anni dall'abbandono
+# Dopo X anni, il rischio di non essere più recuperabili aumenta
+RISCHIO_CUMULATIVO_ANNI = {
+    1: 1.0,    # Primo anno: rischio base
+    2: 1.15,   # Secondo anno: +15%
+    3: 1.35,   # Terzo anno: +35%
+    4: 1.60,   # Quarto anno: +60%
+    5: 1.90,   # Quinto anno: +90%
+    6: 2.30,   # Sesto anno: +130%
+    7: 2.80,   # Settimo anno: +180%
+    8: 3.50,   # Ottavo anno: +250%
+}
+
+# =============================================================================
+# PESI DEL MODELLO
+# =============================================================================
+PESI = {
+    'engagement': 0.25,      # 25% - Quanto erano attivi
+    'loyalty': 0.20,         # 20% - Quanto erano fedeli
+    'recency': 0.20,         # 20% - Quanto recente l'abbandono
+    'health': 0.15,          # 15% - Rischio salute (penalità)
+    'geographic': 0.10,      # 10% - Zona geografica
+    'social': 0.10,          # 10% - Connessioni sociali nel circolo
+}
+
+# Soglie di classify_priority (health penalty, età, score)
+SOGLIE_PRIORITA = {
+    'salute_non_recuperabile': 70,
+    'eta_non_recuperabile': 90,
+    'salute_difficile': 50,
+    'eta_difficile': 85,
+    'urgente': 70,
+    'alta': 50,
+    'media': 30,
+}
+
+# Retention rate per macroregione (inverso del churn)
+RETENTION_MACROREGIONE = {
+    'Nord-Est': 0.495,       # Migliore
+    'Isole': 0.480,
+    'Sud': 0.448,
+    'Centro': 0.428,
+    'Nord-Ovest': 0.413,     # Peggiore tra le principali
+    'Altro': 0.096,
+    'Nazionale': 0.786,
+}
+
+# Mapping regione -> macroregione
+REGIONE_TO_MACRO = {
+    'PIE': 'Nord-Ovest', 'VDA': 'Nord-Ovest', 'LOM': 'Nord-Ovest', 'LIG': 'Nord-Ovest',
+    'TRT': 'Nord-Est', 'TRB': 'Nord-Est', 'FRI': 'Nord-Est', 'VEN': 'Nord-Est', 'EMI': 'Nord-Est',
+    'TOS': 'Centro', 'UMB': 'Centro', 'MAR': 'Centro', 'LAZ': 'Centro',
+    'ABR': 'Sud', 'MOL': 'Sud', 'CAM': 'Sud', 'PUG': 'Sud', 'BAS': 'Sud', 'CAB': 'Sud',
+    'SIC': 'Isole', 'SAR': 'Isole'
+}
+
+CATEGORIE_ALTE = ['GM', 'LM', 'MS', 'HK', 'HA', 'HQ', 'HJ']
+CATEGORIE_PRIME = ['1P', '1F', '1C', '1Q']
+CATEGORIE_SECONDE = ['2P', '2F', '2C', '2Q']
+
+# Componenti positive nell'ordine in cui vengono pesate
+COMPONENTI = ['engagement', 'loyalty', 'recency', 'geographic', 'social']
+COLONNE_COMPONENTI = {
+    'engagement': 'EngagementScore',
+    'loyalty': 'LoyaltyScore',
+    'recency': 'RecencyScore',
+    'geographic': 'GeographicScore',
+    'social': 'SocialScore',
+}
+
+
+def _tavola_ordinata(tavola):
+    """Tavola {(min, max): per_1000} -> (bordi ordinati, probabilità annue)"""
+    fasce = sorted(tavola)
+    bordi = np.array([fasce[0][0]] + [max_eta for _, max_eta in fasce], dtype=float)
+    prob = np.array([tavola[f] for f in fasce], dtype=float) / 1000
+    return bordi, prob
+
+
+MORTALITA_BORDI, MORTALITA_PROB = _tavola_ordinata(MORTALITA_PER_1000)
+MALATTIA_BORDI, MALATTIA_PROB = _tavola_ordinata(MALATTIA_INVALIDANTE_PER_1000)
+
+
+def _cerca_fascia(bordi, prob, eta, default):
+    """Probabilità della fascia che contiene eta (searchsorted), default fuori tavola"""
+    idx = np.searchsorted(bordi, eta, side='right') - 1
+    valido = (idx >= 0) & (idx < len(prob))
+    return np.where(valido, prob[np.clip(idx, 0, len(prob) - 1)], default)
+
+
+def _potenza(base, esponente):
+    """
+    base ** esponente elemento per elemento, calcolato in Python sulle coppie
+    distinte (sono poche: fasce d'età x anni di assenza).
+    """
+    # Coppia (base, esponente) codificata come complesso per np.unique monodimensionale
+    coppie, inverse = np.unique(np.asarray(base, dtype=float) + 1j * np.asarray(esponente, dtype=float),
+                                return_inverse=True)
+    valori = np.array([
+        c.real ** (int(c.imag) if c.imag.is_integer() else c.imag)
+        for c in coppie.tolist()
+    ])
+    return valori[inverse.ravel()]
+
+
+def _moltiplicatore_anni(anni):
+    """RISCHIO_CUMULATIVO_ANNI.get(min(anni, 8), 3.5) vettoriale"""
+    anni = np.minimum(anni, 8)
+    risultato = np.full(anni.shape, 3.5)
+    for k, v in RISCHIO_CUMULATIVO_ANNI.items():
+        risultato[anni == k] = v
+    return risultato
+
+
+def rischio_mortalita(eta, anni_da_churn):
+    """
+    Rischio di mortalità cumulativo (0-0.95), 0.5 se età sconosciuta.
+    Media tra probabilità annua all'età attuale e a quella proiettata,
+    cumulata sugli anni di assenza e moltiplicata per il fattore anni.
+    """
+    eta = np.asarray(eta, dtype=float)
+    anni = np.asarray(anni_da_churn, dtype=float)
+    eta_nota = np.where(np.isnan(eta), 0.0, eta)
+
+    prob_annua = _cerca_fascia(MORTALITA_BORDI, MORTALITA_PROB, eta_nota, 0.0)
+    prob_proiettata = _cerca_fascia(MORTALITA_BORDI, MORTALITA_PROB, eta_nota + anni, 0.38)
+    rischio_medio = (prob_annua + prob_proiettata) / 2
+    rischio_cumulativo = 1 - _potenza(1 - rischio_medio, anni)
+
+    rischio = np.minimum(rischio_cumulativo * _moltiplicatore_anni(anni), 0.95)
+    return np.where(np.isnan(eta), 0.5, rischio)
+
+
+def rischio_malattia(eta, anni_da_churn):
+    """Rischio di malattia invalidante cumulativo (0-0.90), 0.3 se età sconosciuta"""
+    eta = np.asarray(eta, dtype=float)
+    anni = np.minimum(np.asarray(anni_da_churn, dtype=float), 8)
+    eta_nota = np.where(np.isnan(eta), 0.0, eta)
+
+    prob_annua = _cerca_fascia(MALATTIA_BORDI, MALATTIA_PROB, eta_nota, 0.0)
+    rischio = np.minimum(1 - _potenza(1 - prob_annua, anni), 0.90)
+    return np.where(np.isnan(eta), 0.3, rischio)
+
+
+def rischio_salute(eta, anni_da_churn):
+    """Score combinato di rischio salute (0-1, 1 = alto rischio)"""
+    mortality = rischio_mortalita(eta, anni_da_churn)
+    illness = rischio_malattia(eta, anni_da_churn)
+    prob_disponibile = (1 - mortality) * (1 - illness * 0.7)  # Malattia pesa meno della morte
+    return 1 - prob_disponibile
+
+
+def _valori(df, col, default):
+    """Colonna come array float con il default se manca (come row.get)"""
+    if col not in df.columns:
+        return np.full(len(df), default, dtype=float)
+    return df[col].to_numpy(dtype=float, na_value=np.nan)
+
+
+def _o_zero(x, default=0):
+    """Equivalente vettoriale di `x or default` (NaN resta NaN, come in Python)"""
+    return np.where(x == 0, default, x)
+
+
+def _vero(df, col):
+    """Valutazione di verità Python di una colonna (NaN conta come vero)"""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return df[col].to_numpy(dtype=object).astype(bool)
+
+
+def score_engagement(df):
+    """Score di engagement basato sull'attività passata (0-100)"""
+    gare = _o_zero(_valori(df, 'GareMedie', 0))
+    punti = _o_zero(_valori(df, 'PuntiMedi', 0))
+    ratio = _valori(df, 'RatioChamp', 0)
+    ratio_champ = _o_zero(ratio)
+
+    score = np.select(
+        [gare >= 50, gare >= 30, gare >= 20, gare >= 10, gare >= 5],
+        [40, 35, 28, 18, 10], default=3
+    )
+    score = score + np.select(
+        [punti >= 5000, punti >= 2000, punti >= 1000, punti >= 500, punti >= 100],
+        [25, 20, 15, 10, 5], default=0
+    )
+    score = score + np.select([_vero(df, 'EraAgonista'), ratio > 0.1], [20, 12], default=0)
+    score = score + np.select(
+        [ratio_champ >= 0.3, ratio_champ >= 0.15, ratio_champ >= 0.05],
+        [15, 10, 5], default=0
+    )
+    return np.minimum(score, 100)
+
+
+def score_loyalty(df):
+    """Score di fedeltà storica (0-100)"""
+    anni = _o_zero(_valori(df, 'AnniPresenza', 0))
+    progressione = _o_zero(_valori(df, 'Progressione', 0))
+    anni_da_churn = _valori(df, 'AnniDaChurn', 1)
+
+    score = np.select(
+        [anni >= 7, anni >= 5, anni >= 4, anni >= 3, anni >= 2],
+        [50, 42, 35, 28, 18], default=8
+    )
+    score = score + np.select(
+        [progressione >= 3, progressione >= 2, progressione >= 1, progressione > 0],
+        [30, 25, 18, 10], default=0
+    )
+    # Costanza approssimata dalla densità di presenza
+    densita = anni / np.maximum(anni_da_churn + anni, 1)
+    score = score + (densita * 20).astype(np.int64)
+    return np.minimum(score, 100)
+
+
+def score_recency(df):
+    """Score basato su quanto recente è l'abbandono (0-100)"""
+    anni_da_churn = _o_zero(_valori(df, 'AnniDaChurn', 5), 5)
+    return np.select(
+        [anni_da_churn <= 1, anni_da_churn <= 2, anni_da_churn <= 3, anni_da_churn <= 4,
+         anni_da_churn <= 5, anni_da_churn <= 6, anni_da_churn <= 7],
+        [100, 85, 68, 50, 35, 22, 12], default=5
+    )
+
+
+def score_geographic(df):
+    """Score basato sulla retention della macroregione (0-100)"""
+    if 'Regione' in df.columns:
+        macro = df['Regione'].map(REGIONE_TO_MACRO).fillna('Altro')
+    else:
+        macro = pd.Series('Altro', index=df.index)
+    retention = macro.map(RETENTION_MACROREGIONE).fillna(0.4).to_numpy(dtype=float)
+
+    score = (retention - 0.1) / 0.7 * 100
+    # Bonus se ha provincia mappata (più facile contattare)
+    if 'Provincia' in df.columns:
+        score = np.where(df['Provincia'].notna().to_numpy(), score + 10, score)
+    return np.minimum(np.maximum(score, 0), 100)
+
+
+def score_social(df):
+    """Score basato sulle connessioni sociali nel circolo (0-100)"""
+    gare = _o_zero(_valori(df, 'GareMedie', 0))
+    if 'CategoriaFinale' in df.columns:
+        cat = df['CategoriaFinale']
+    else:
+        cat = pd.Series('NC', index=df.index)
+
+    score = 50 + np.where(_vero(df, 'CircoloAttivo'), 25, 0)
+    score = score + np.select([gare >= 30, gare >= 15], [15, 10], default=0)
+    score = score + np.select(
+        [cat.isin(CATEGORIE_ALTE).to_numpy(), cat.isin(CATEGORIE_PRIME).to_numpy(),
+         cat.isin(CATEGORIE_SECONDE).to_numpy()],
+        [15, 10, 5], default=0
+    )
+    return np.minimum(score, 100)
+
+
+def calcola_componenti(df):
+    """
+    Calcola le componenti dello score, indipendenti dai pesi.
+    Restituisce un DataFrame (stesso indice) con i sub-score, HealthPenalty
+    e i rischi specifici di morte/malattia in percentuale.
+    """
+    eta = _valori(df, 'EtaAttuale', 70)
+    anni_da_churn = _valori(df, 'AnniDaChurn', 1)
+
+    return pd.DataFrame({
+        'EngagementScore': score_engagement(df),
+        'LoyaltyScore': score_loyalty(df),
+        'RecencyScore': score_recency(df),
+        'GeographicScore': score_geographic(df),
+        'SocialScore': score_social(df),
+        'HealthPenalty': rischio_salute(eta, anni_da_churn) * 100,
+        'RischioMorte': rischio_mortalita(eta, anni_da_churn) * 100,
+        'RischioMalattia': rischio_malattia(eta, anni_da_churn) * 100,
+    }, index=df.index)
+
+
+def matrice_componenti(componenti):
+    """Componenti positive come matrice float (n_giocatori x 5) nell'ordine di COMPONENTI"""
+    return np.column_stack([
+        componenti[COLONNE_COMPONENTI[c]].to_numpy(dtype=float) for c in COMPONENTI
+    ])
+
+
+def score_finale(matrice, health_penalty, pesi=PESI):
+    """
+    Score finale di recuperabilità (0-100) da matrice componenti e pesi.
+    Il prodotto matrice x pesi accumula le colonne nell'ordine di COMPONENTI
+    (un matmul BLAS riordina le somme e cambierebbe l'ultima cifra).
+    """
+    positivo = matrice[:, 0] * pesi[COMPONENTI[0]]
+    for i, componente in enumerate(COMPONENTI[1:], start=1):
+        positivo = positivo + matrice[:, i] * pesi[componente]
+
+    # Formula: score_finale = score_positivo * (1 - health_penalty * peso_health)
+    health_factor = 1 - (np.asarray(health_penalty, dtype=float) / 100) * pesi['health'] * 2
+    return np.maximum(np.minimum(positivo * health_factor, 100), 0)
+
+
+def classifica_priorita(score, health_penalty, eta, soglie=SOGLIE_PRIORITA):
+    """Classifica la priorità di recupero (stesse regole di classify_priority)"""
+    score = np.asarray(score, dtype=float)
+    health_penalty = np.asarray(health_penalty, dtype=float)
+    eta = np.asarray(eta, dtype=float)
+    return np.select(
+        [
+            (health_penalty >= soglie['salute_non_recuperabile']) | (eta >= soglie['eta_non_recuperabile']),
+            (health_penalty >= soglie['salute_difficile']) | (eta >= soglie['eta_difficile']),
+            score >= soglie['urgente'],
+            score >= soglie['alta'],
+            score >= soglie['media'],
+        ],
+        ['5-NON_RECUPERABILE', '4-DIFFICILE', '1-URGENTE', '2-ALTA', '3-MEDIA'],
+        default='4-BASSA'
+    ).astype(object)
+
+
+def calcola_recuperabilita(df, pesi=PESI, soglie=SOGLIE_PRIORITA):
+    """
+    Aggiunge a df componenti, RecoverabilityScore, Priorita e rischi specifici.
+    """
+    componenti = calcola_componenti(df)
+    for col in ['EngagementScore', 'LoyaltyScore', 'RecencyScore',
+                'GeographicScore', 'SocialScore', 'HealthPenalty']:
+        df[col] = componenti[col]
+
+    df['RecoverabilityScore'] = score_finale(matrice_componenti(componenti), componenti['HealthPenalty'], pesi)
+    df['Priorita'] = classifica_priorita(df['RecoverabilityScore'], df['HealthPenalty'],
+                                         _valori(df, 'EtaAttuale', 70), soglie)
+    df['RischioMorte'] = componenti['RischioMorte']
+    df['RischioMalattia'] = componenti['RischioMalattia']
+    return df
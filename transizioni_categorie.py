@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Matrici di transizione tra categorie (anno N -> anno N+passo)
+
+Le categorie sono codificate in interi 0..K-1 e le coppie (record anno N,
+record anno N+passo) dello stesso giocatore sono trovate con un solo
+self-join su chiave intera (giocatore, anno) ordinata. I conteggi di tutti
+gli anni (ed eventualmente di tutti i gruppi, es. regioni) escono da un
+unico np.bincount su ((anno*G + gruppo)*K + da)*K + a:
+
+    tensore = tensore_transizioni(df, 'CatLabel', col_gruppo='GrpArea')
+    conteggi = matrice(tensore, anno=2024, gruppo='LOM')
+    percentuali = matrice(tensore, normalizza=True) * 100
+    tre_anni = transizioni_n_passi(matrice(tensore, normalizza=True), 3)
+
+Il tensore ha forma [anni, gruppi, K, K]; i record con categoria o gruppo
+mancante non sono contati (come in pd.crosstab). Si assume un record per
+giocatore per anno, come nel dataset unificato.
+
+Per la dashboard le transizioni di tutte le coppie di anni, per regione
+(GrpArea) e sottocategoria, sono precalcolate in
+output/transizioni_categorie.npz (solo le celle non nulle):
+
+    transizioni = carica_transizioni()
+    tensore = tensore_passo(transizioni, 2)      # anno N -> anno N+2
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from carriere_giocatori import CATEGORIA_ORDINE
+from data_store import (
+    OUTPUT_DIR, FILE_UNIFICATO_CSV, FILE_UNIFICATO_FEATHER,
+    archivio_aggiornato, carica_dati_unificati,
+)
+
+FILE_TRANSIZIONI = OUTPUT_DIR / 'transizioni_categorie.npz'
+
+
+def codifica(valori, categorie=None):
+    """
+    Codici interi (-1 per mancanti o fuori elenco) ed elenco delle etichette.
+    Senza elenco: prima le categorie note in ordine gerarchico, poi le altre
+    in ordine alfabetico.
+    """
+    if categorie is None:
+        presenti = pd.unique(valori.dropna())
+        noti = sorted((c for c in presenti if c in CATEGORIA_ORDINE), key=CATEGORIA_ORDINE.get)
+        categorie = noti + sorted(c for c in presenti if c not in CATEGORIA_ORDINE)
+    categorie = list(categorie)
+    codici = pd.Index(categorie).get_indexer(valori)
+    return codici.astype(np.int64), categorie
+
+
+def coppie(df, passo=1, col_codice='MmbCode'):
+    """
+    Posizioni (riga anno N, riga anno N+passo) dello stesso giocatore.
+    Equivale a un merge su MmbCode tra i due anni, per tutti gli anni insieme.
+    """
+    if df.empty:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    membri = pd.factorize(df[col_codice])[0].astype(np.int64)
+    anni = df['Anno'].to_numpy(dtype=np.int64)
+    anni = anni - anni.min()
+    ampiezza = int(anni.max()) + passo + 1
+    chiave = membri * ampiezza + anni
+
+    ordine = np.argsort(chiave, kind='stable')
+    ordinate = chiave[ordine]
+    cercate = chiave + passo
+    pos = np.minimum(np.searchsorted(ordinate, cercate), len(ordinate) - 1)
+    trovate = (ordinate[pos] == cercate) & (membri >= 0)
+    return np.flatnonzero(trovate), ordine[pos[trovate]]
+
+
+def tensore_transizioni(df, col='CatLabel', passo=1, col_gruppo=None, anni=None,
+                        categorie=None, col_codice='MmbCode'):
+    """
+    Conteggi delle transizioni col(anno) -> col(anno+passo).
+    Restituisce un dizionario con 'conteggi' [anni, gruppi, K, K], 'anni'
+    (anni di partenza), 'gruppi' ([None] senza col_gruppo), 'categorie' e
+    'passo'. Il gruppo è quello del record di partenza.
+    """
+    codici, categorie = codifica(df[col], categorie)
+    da, a = coppie(df, passo, col_codice)
+
+    anno_da = df['Anno'].to_numpy(dtype=np.int64)[da]
+    if anni is None:
+        anni = np.unique(anno_da)
+    anni = [int(x) for x in anni]
+    indice_anno = pd.Index(anni).get_indexer(anno_da)
+
+    if col_gruppo is None:
+        gruppi = [None]
+        indice_gruppo = np.zeros(len(da), dtype=np.int64)
+    else:
+        codici_gruppo, gruppi = pd.factorize(df[col_gruppo], sort=True)
+        gruppi = list(gruppi)
+        indice_gruppo = codici_gruppo[da]
+
+    n_anni, n_gruppi, k = len(anni), len(gruppi), len(categorie)
+    cat_da, cat_a = codici[da], codici[a]
+    validi = (indice_anno >= 0) & (indice_gruppo >= 0) & (cat_da >= 0) & (cat_a >= 0)
+    indice = ((indice_anno * n_gruppi + indice_gruppo) * k + cat_da) * k + cat_a
+
+    conteggi = np.bincount(indice[validi], minlength=n_anni * n_gruppi * k * k)
+    return {
+        'conteggi': conteggi.reshape(n_anni, n_gruppi, k, k),
+        'anni': anni,
+        'gruppi': gruppi,
+        'categorie': categorie,
+        'passo': passo,
+    }
+
+
+def _selezione(elenco, valori):
+    """Indici di valori (uno o una lista) in elenco; None = tutti"""
+    if valori is None:
+        return slice(None)
+    if np.ndim(valori) == 0:
+        valori = [valori]
+    return [elenco.index(v) for v in valori if v in elenco]
+
+
+def normalizza_righe(conteggi):
+    """Quote per riga (righe senza transizioni a 0)"""
+    conteggi = np.asarray(conteggi, dtype=np.float64)
+    totali = conteggi.sum(axis=-1, keepdims=True)
+    return np.divide(conteggi, totali, out=np.zeros_like(conteggi), where=totali > 0)
+
+
+def matrice(tensore, anno=None, gruppo=None, normalizza=False, solo_osservate=False):
+    """
+    Matrice Da x A sommata sugli anni e sui gruppi scelti (uno, una lista o
+    None per tutti). Con normalizza=True quote per riga come
+    pd.crosstab(normalize='index'); con solo_osservate=True sono tolte righe
+    e colonne senza transizioni.
+    """
+    conteggi = tensore['conteggi'][_selezione(tensore['anni'], anno)]
+    conteggi = conteggi[:, _selezione(tensore['gruppi'], gruppo)].sum(axis=(0, 1))
+    categorie = pd.Index(tensore['categorie'])
+
+    risultato = pd.DataFrame(normalizza_righe(conteggi) if normalizza else conteggi,
+                             index=categorie.rename('Da'), columns=categorie.rename('A'))
+    if solo_osservate:
+        risultato = risultato.loc[conteggi.sum(axis=1) > 0, conteggi.sum(axis=0) > 0]
+    return risultato
+
+
+def transizioni_n_passi(probabilita, n):
+    """
+    Transizioni a n passi come potenza n-esima della matrice (quadrata) di
+    quote per riga: stima a catena di Markov, non conteggio osservato.
+    """
+    potenza = np.linalg.matrix_power(probabilita.to_numpy(dtype=np.float64), n)
+    return pd.DataFrame(potenza, index=probabilita.index, columns=probabilita.columns)
+
+
+def transizione_anni(df, anno_da, anno_a, col='CatLabel', col_gruppo=None, gruppo=None,
+                     normalizza=False, categorie=None):
+    """Matrice osservata tra due anni qualsiasi (stessi giocatori nei due anni)"""
+    tensore = tensore_transizioni(df, col, passo=anno_a - anno_da, col_gruppo=col_gruppo,
+                                  anni=[anno_da], categorie=categorie)
+    return matrice(tensore, gruppo=gruppo, normalizza=normalizza, solo_osservate=True)
+
+
+def aggrega_categorie(tensore, mappa, ordine, altro='Altro'):
+    """
+    Tensore con le categorie raggruppate (es. sottocategoria -> macrocategoria);
+    le categorie assenti da mappa finiscono in altro.
+    """
+    etichette = [mappa.get(c, altro) for c in tensore['categorie']]
+    categorie = list(ordine) + ([altro] if altro in etichette and altro not in ordine else [])
+    appartenenza = np.zeros((len(tensore['categorie']), len(categorie)), dtype=np.int64)
+    appartenenza[np.arange(len(etichette)), [categorie.index(e) for e in etichette]] = 1
+    conteggi = np.einsum('kg,...kl,lh->...gh', appartenenza, tensore['conteggi'], appartenenza)
+    return {**tensore, 'conteggi': conteggi, 'categorie': categorie}
+
+
+def calcola_transizioni(df, col='CatLabel', col_gruppo='GrpArea'):
+    """
+    Conteggi per ogni passo 1..(ultimo anno - primo anno): 'conteggi' ha forma
+    [passi, anni, gruppi, K, K] con gli anni di partenza comuni a tutti i passi
+    (le coppie oltre l'ultimo anno restano a zero).
+    """
+    _, categorie = codifica(df[col])
+    anni = list(range(int(df['Anno'].min()), int(df['Anno'].max())))
+    passi = list(range(1, len(anni) + 1))
+    tensori = [tensore_transizioni(df, col, passo=p, col_gruppo=col_gruppo, anni=anni,
+                                   categorie=categorie) for p in passi]
+    return {
+        'conteggi': np.stack([t['conteggi'] for t in tensori]),
+        'passi': passi,
+        'anni': anni,
+        'gruppi': tensori[0]['gruppi'],
+        'categorie': categorie,
+    }
+
+
+def tensore_passo(transizioni, passo):
+    """Tensore [anni, gruppi, K, K] di un passo, nel formato di tensore_transizioni"""
+    conteggi = transizioni['conteggi'][transizioni['passi'].index(passo)]
+    return {
+        'conteggi': conteggi,
+        'anni': transizioni['anni'],
+        'gruppi': transizioni['gruppi'],
+        'categorie': transizioni['categorie'],
+        'passo': passo,
+    }
+
+
+def salva_transizioni(transizioni):
+    """Scrive indici e valori delle sole celle non nulle (npz compresso, senza pickle)"""
+    conteggi = transizioni['conteggi']
+    indici = np.flatnonzero(conteggi)
+    meta = {c: [str(x) for x in transizioni[c]] for c in ('gruppi', 'categorie')}
+    meta.update(passi=transizioni['passi'], anni=transizioni['anni'])
+
+    # Scrittura atomica, come per le carriere
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    temporaneo = FILE_TRANSIZIONI.with_suffix('.tmp')
+    with open(temporaneo, 'wb') as f:
+        np.savez_compressed(f, forma=np.array(conteggi.shape), indici=indici.astype(np.int64),
+                            valori=conteggi.ravel()[indici].astype(np.int32),
+                            meta=np.array(json.dumps(meta)))
+    os.replace(temporaneo, FILE_TRANSIZIONI)
+
+
+def transizioni_aggiornate():
+    """True se il tensore salvato non è più vecchio del dataset unificato"""
+    if not FILE_TRANSIZIONI.exists():
+        return False
+    sorgente = FILE_UNIFICATO_FEATHER if archivio_aggiornato() else FILE_UNIFICATO_CSV
+    return not sorgente.exists() or FILE_TRANSIZIONI.stat().st_mtime >= sorgente.stat().st_mtime
+
+
+def carica_transizioni(df=None):
+    """
+    Legge il tensore precalcolato. Se manca o è più vecchio del dataset lo
+    ricalcola (da df se passato, altrimenti dall'archivio) e lo salva.
+    """
+    if transizioni_aggiornate():
+        with np.load(FILE_TRANSIZIONI, allow_pickle=False) as dati:
+            conteggi = np.zeros(int(np.prod(dati['forma'])), dtype=np.int64)
+            conteggi[dati['indici']] = dati['valori']
+            transizioni = {'conteggi': conteggi.reshape(tuple(dati['forma']))}
+            transizioni.update(json.loads(str(dati['meta'])))
+        return transizioni
+
+    transizioni = calcola_transizioni(carica_dati_unificati() if df is None else df)
+    salva_transizioni(transizioni)
+    return transizioni
+
+
+def main():
+    print("=" * 70)
+    print("TENSORE TRANSIZIONI CATEGORIE")
+    print("=" * 70)
+
+    df = carica_dati_unificati()
+    print(f"   Record totali: {len(df):,}")
+    transizioni = calcola_transizioni(df)
+    salva_transizioni(transizioni)
+    forma = transizioni['conteggi'].shape
+    print(f"   Passi: {forma[0]}, anni: {forma[1]}, regioni: {forma[2]}, categorie: {forma[3]}")
+    print(f"   Celle non nulle: {np.count_nonzero(transizioni['conteggi']):,}")
+    print(f"   Salvato {FILE_TRANSIZIONI.name}")
+
+
+if __name__ == '__main__':
+    main()